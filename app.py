@@ -1,8 +1,15 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 import db_utils
+import federacion
+import informe
+import escenarios
+import galeria
+import instrumentacion
+import functools
 import os
+from datetime import date
 
 # --- Configuración de la Página ---
 st.set_page_config(
@@ -12,377 +19,598 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+# --- Instrumentación ---
+# Cada rerun registra sus secciones (tiempo, filas, figuras) en una Traza.
+# Con ?admin=1 (o SISCAR_ADMIN=1) se mide también el tamaño de las figuras, se
+# muestra el panel de tiempos y cada rerun se agrega al log JSON-lines
+# (SISCAR_LOG_TIEMPOS, que también activa el log por sí solo).
+modo_admin = st.query_params.get('admin') == '1' or os.environ.get('SISCAR_ADMIN') == '1'
+log_tiempos = os.environ.get('SISCAR_LOG_TIEMPOS') or ('siscar_tiempos.jsonl' if modo_admin else None)
+traza = instrumentacion.Traza(medir_figuras=modo_admin)
+perfilador = None
+if modo_admin and st.session_state.get('perfilar'):
+    # Perfil de un solo rerun, pedido desde el panel de administración
+    perfilador = instrumentacion.Perfilador(st.session_state.pop('perfilar'))
+    perfilador.iniciar()
+# Se apaga al final del script: un fragmento que corre después lo hace solo (rerun de fragmento)
+rerun_completo = True
+
+def registrar_traza(traza_rerun, **extra):
+    """Appends a finished rerun to the JSON-lines log and to the admin panel history."""
+    if log_tiempos:
+        instrumentacion.escribir_jsonl(log_tiempos, traza_rerun.registro(**extra))
+    if modo_admin:
+        historial = st.session_state.setdefault('tiempos_reruns', [])
+        historial.append(round(traza_rerun.total(), 3))
+        del historial[:-20]
+
+def fragmento(funcion):
+    """st.fragment whose standalone reruns are timed in their own Traza and logged."""
+    @st.fragment
+    @functools.wraps(funcion)
+    def seccion(*args, **kwargs):
+        global traza
+        if rerun_completo:
+            # Dentro del rerun completo las secciones van a la traza del script
+            return funcion(*args, **kwargs)
+        traza = instrumentacion.Traza(medir_figuras=modo_admin)
+        resultado = funcion(*args, **kwargs)
+        traza.terminar()
+        registrar_traza(traza, anio=selected_year, grados=len(selected_grades), fragmento=funcion.__name__)
+        return resultado
+    return seccion
+
 # --- Carga de Datos ---
-# --- Carga de Datos ---
-@st.cache_data
-def get_data_v3():
+# SQLite agrega los pagos al grano del dashboard (año/mes/grado/curso/rubro) y los cargos
+# y abonos por alumno del libro de cartera (libro_cartera.py); esos resúmenes se cargan una
+# vez por versión de datos (get_data_version) y al llegar pagos nuevos solo se consultan
+# los posteriores al último Num_pago visto.
+# Con ellos se arma un cubo por versión (cube.py): cada KPI y gráfico es un corte y una suma.
+# Los cortes, KPIs y figuras viven en informe.py, compartidos con el informe en lote (reporte.py).
+# Con SISCAR_DB_PATHS se consolidan varias bases (una por colegio) en paralelo (federacion.py).
+def get_data_version():
     try:
-        df_pagos = db_utils.load_data_pagos()
-        df_alumnos = db_utils.load_data_alumnos()
-        df_deudores = db_utils.load_data_deudores()
-        return df_pagos, df_alumnos, df_deudores
+        return federacion.get_data_version()
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
-        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
-
-df_pagos, df_alumnos, df_deudores = get_data_v3()
+        return None
 
-# --- Preprocesamiento Adicional ---
-if not df_pagos.empty:
-    df_pagos['Año'] = df_pagos['Fecha'].dt.year
-    df_pagos['Mes'] = df_pagos['Fecha'].dt.strftime('%Y-%m')
+@st.cache_data
+def get_filtros(version):
+    try:
+        nombres = [nombre for _, nombre in federacion.colegios()]
+        return federacion.query_anios(), federacion.query_grados(), nombres
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return [], [], []
+
+@st.cache_resource(max_entries=2)
+def get_cubos(version, hoy):
+    # hoy: fecha de corte de la edad de la cartera, así el cubo se rehace al cambiar el día
+    # Los spans solo aparecen en la traza del rerun que de verdad consulta y arma los cubos
+    with traza.span('consultas') as span:
+        # Consultas SQL (o snapshot) y cargas delta de data_cache
+        datos = federacion.cargar(version, hoy)
+        span.filas = sum(len(datos[clave]) for clave in ('pagos', 'cartera', 'alumnos_curso'))
+    with traza.span('cubos'):
+        return informe.cubos(datos)
+
+# Secciones: cada pestaña es un fragmento que recibe sus entradas de forma explícita
+# (filtros = versión, fecha de corte, año, grados y colegios). Mover un widget de una
+# sección vuelve a ejecutar solo ese fragmento, y solo se calcula la pestaña visible.
+# Resúmenes y figuras se cachean por filtros con cache_resource: el mismo objeto se
+# comparte entre sesiones con los mismos filtros (st.plotly_chart no modifica la figura).
+@st.cache_resource(max_entries=64)
+def _resumen(version, hoy, selected_year, selected_grades, selected_colegios):
+    cubos = get_cubos(version, hoy)
+    with traza.span('cortes'):
+        return informe.resumen(cubos, selected_year, selected_grades, selected_colegios)
+
+@st.cache_resource(max_entries=64)
+def get_figuras_ingresos(filtros):
+    res = _resumen(*filtros)
+    with traza.span('figuras'):
+        return informe.figuras_ingresos(res, filtros[2])
+
+@st.cache_resource(max_entries=64)
+def get_costos(filtros, num_docentes, salario_promedio, factor_prestacional):
+    costo = informe.costos(_resumen(*filtros), num_docentes, salario_promedio, factor_prestacional)
+    with traza.span('figuras'):
+        return costo, informe.figuras_costos(costo)
+
+@st.cache_resource(max_entries=64)
+def get_figuras_cartera(filtros):
+    res = _resumen(*filtros)
+    with traza.span('figuras'):
+        return informe.figuras_cartera(res)
+
+def get_resumen(filtros):
+    # Los errores se muestran sin cachearse: el próximo rerun vuelve a intentar la carga
+    try:
+        return _resumen(*filtros)
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        return {}
 
-# Merge pagos con información del alumno para tener Grado/Curso en pagos
-if not df_pagos.empty and not df_alumnos.empty:
-    df_pagos = df_pagos.merge(df_alumnos[['Cod_alumno', 'Nom_curso', 'Nom_grado']], on='Cod_alumno', how='left')
+traza.seccion('carga')
+data_version = get_data_version()
+unique_years, unique_grades, unique_colegios = get_filtros(data_version)
 
 # --- Barra Lateral ---
 st.sidebar.title("Filtros")
 
 # Filtro de Año
 selected_year = None
-if not df_pagos.empty:
-    unique_years = sorted(df_pagos['Año'].dropna().unique(), reverse=True)
+if unique_years:
     default_index = unique_years.index(2025) if 2025 in unique_years else 0
     selected_year = st.sidebar.selectbox("Seleccionar Año Lectivo", unique_years, index=default_index)
 
+# Filtro de Colegio (solo cuando hay varias bases federadas)
+selected_colegios = unique_colegios
+if len(unique_colegios) > 1:
+    selected_colegios = st.sidebar.multiselect("Seleccionar Colegio", unique_colegios, default=unique_colegios)
+
 # Filtro de Grado
 selected_grades = []
-if not df_alumnos.empty:
-    unique_grades = sorted(df_alumnos['Nom_grado'].dropna().unique())
+if unique_grades:
     selected_grades = st.sidebar.multiselect("Seleccionar Grado", unique_grades, default=unique_grades)
 
 # Aplicar Filtros
-df_pagos_filtered = df_pagos.copy()
-df_deudores_filtered = df_deudores.copy()
-
-if selected_year:
-    df_pagos_filtered = df_pagos_filtered[df_pagos_filtered['Año'] == selected_year]
-    # Nota: TBL_Alumnos_deudores no parece tener campo de fecha/año explícito fácil, asumimossnapshot actual o filtramos si es posible.
-    # Por ahora no filtramos deudores por año histórico ya que suele ser foto actual.
-
-if selected_grades:
-    df_pagos_filtered = df_pagos_filtered[df_pagos_filtered['Nom_grado'].isin(selected_grades)]
-    # Deudores tiene Nom_curso, necesitamos mapear Curso -> Grado si queremos filtrar por Grado exacto
-    # Hacemos un merge rápido para filtrar deudores
-    if not df_deudores_filtered.empty and not df_alumnos.empty:
-         # Asumimos que la tabla deudores tiene los alumnos actuales
-         # Creamos map curso -> grado
-         curso_grado_map = df_alumnos[['Nom_curso', 'Nom_grado']].drop_duplicates().set_index('Nom_curso')['Nom_grado'].to_dict()
-         df_deudores_filtered['Grado'] = df_deudores_filtered['Nom_curso'].map(curso_grado_map)
-         df_deudores_filtered = df_deudores_filtered[df_deudores_filtered['Grado'].isin(selected_grades)]
+# Nota: la cartera sale del libro por alumno (cargos de Cartera_alumnos menos abonos), que sí tiene año lectivo.
+hoy = date.today()
+filtros = (data_version, hoy, selected_year, tuple(selected_grades), tuple(selected_colegios))
+resumen = get_resumen(filtros)
+traza.filas(*resumen.values())
+
+# Carga parcial: las fuentes que fallaron o excedieron el límite de tiempo quedan vacías
+# (federacion.cargar_fuentes). El resultado parcial queda cacheado para no esperar el
+# límite en cada rerun; "Reintentar" lo descarta y vuelve a consultar solo lo que falta
+# (lo ya cargado sigue en data_cache).
+errores_carga = get_cubos(data_version, hoy)['errores'] if resumen else {}
+if errores_carga:
+    st.warning("Datos parciales, no se pudieron cargar algunas fuentes:\n\n" +
+               "\n".join(f"- {linea}" for linea in informe.textos_errores(errores_carga)))
+    if st.button("🔄 Reintentar la carga"):
+        for cacheada in (get_cubos, _resumen, get_figuras_ingresos, get_costos, get_figuras_cartera):
+            cacheada.clear()
+        st.rerun()
 
 
 # --- Dashboard Principal ---
 
 st.markdown("<h1 style='text-align: center;'>Informe de Gestión - Diciembre de 2025</h1>", unsafe_allow_html=True)
-st.markdown("<h3 style='text-align: center;'>📊 Dashboard Financiero - Colegio Gimnasio Palma Real</h3>", unsafe_allow_html=True)
+nombre_colegio = ", ".join(selected_colegios or unique_colegios) or "Gimnasio Palma Real"
+st.markdown(f"<h3 style='text-align: center;'>📊 Dashboard Financiero - Colegio {nombre_colegio}</h3>", unsafe_allow_html=True)
 
 
 # --- KPIs ---
-if not df_pagos_filtered.empty and not df_deudores_filtered.empty:
-    total_recaudado = df_pagos_filtered['Valor'].sum()
-    total_cartera = df_deudores_filtered['Total_Deuda'].sum()
-    pct_recuperacion = 0
-    if (total_recaudado + total_cartera) > 0:
-        pct_recuperacion = (total_recaudado / (total_recaudado + total_cartera)) * 100
-
-    col1, col2, col3 = st.columns(3)
-    col1.metric("💰 Total Recaudado", f"${total_recaudado:,.0f}")
-    col2.metric("📉 Total Cartera (Deuda)", f"${total_cartera:,.0f}")
-    col3.metric("📈 % Recuperación", f"{pct_recuperacion:.1f}%")
+traza.seccion('kpis')
+indicadores = informe.kpis(resumen)
+if indicadores:
+    for col, (etiqueta, valor) in zip(st.columns(3), informe.textos_kpis(indicadores)):
+        col.metric(etiqueta, valor)
 else:
     st.warning("No hay datos suficientes para mostrar KPIs.")
 
+if len(selected_colegios) > 1:
+    # Consolidado por colegio con los mismos filtros de año y grado
+    try:
+        por_colegio = informe.kpis_por_colegio(get_cubos(data_version, hoy), selected_year, selected_grades, selected_colegios)
+    except Exception as e:
+        st.error(f"Error cargando datos: {e}")
+        por_colegio = pd.DataFrame()
+    if not por_colegio.empty:
+        traza.filas(por_colegio)
+        st.dataframe(
+            por_colegio,
+            hide_index=True,
+            column_config={
+                'Total Recaudado': st.column_config.NumberColumn(format="dollar"),
+                'Total Cartera': st.column_config.NumberColumn(format="dollar"),
+                '% Recuperación': st.column_config.NumberColumn(format="%.1f%%"),
+            },
+        )
 
-# --- Análisis Temporal ---
-st.markdown("---")
-st.subheader("📅 Tendencia de Recaudo Mensual")
-if not df_pagos_filtered.empty:
-    # Agrupar por mes
-    recaudo_mensual = df_pagos_filtered.groupby('Mes')['Valor'].sum().reset_index()
-    fig_temporal = px.area(recaudo_mensual, x='Mes', y='Valor', 
-                           title=f"Recaudo Mensual - Año {selected_year}",
-                           labels={'Valor': 'Ingresos ($)', 'Mes': 'Mes'},
-                           markers=True)
-    fig_temporal.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_temporal, width='stretch')
-else:
-    st.info("No hay datos de recaudos para mostrar.")
-
-# --- Análisis por Nivel ---
-st.markdown("---")
-st.subheader("🎓 Ingresos por Grado")
-if not df_pagos_filtered.empty:
-    ingreso_grado = df_pagos_filtered.groupby('Nom_grado')['Valor'].sum().reset_index().sort_values('Valor', ascending=False)
-    fig_grado = px.bar(ingreso_grado, x='Nom_grado', y='Valor',
-                       color='Valor',
-                       title="Ranking de Ingresos por Grado",
-                       labels={'Valor': 'Total ($)', 'Nom_grado': 'Grado'})
-    fig_grado.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_grado, width='stretch')
 
-st.markdown("---")
-st.subheader("🏫 Ingresos por Curso")
-if not df_pagos_filtered.empty:
-    ingreso_curso = df_pagos_filtered.groupby('Nom_curso')['Valor'].sum().reset_index().sort_values('Valor', ascending=False).head(10) # Top 10
-    fig_curso = px.bar(ingreso_curso, x='Nom_curso', y='Valor',
-                       title="Top 10 Cursos con Mayores Ingresos",
-                       labels={'Valor': 'Total ($)', 'Nom_curso': 'Curso'})
-    fig_curso.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_curso, width='stretch')
+@st.dialog("📸 Visor de Imagen", width="large")
+def view_image(image_path, caption):
+    st.image(image_path, caption=caption, width='stretch')
+
+# --- Ingresos ---
+@fragmento
+def seccion_ingresos(filtros):
+    res = get_resumen(filtros)
+    if not res:
+        return
+
+    # --- Análisis Temporal ---
+    traza.seccion('tendencia')
+    figs = get_figuras_ingresos(filtros)
+    st.subheader("📅 Tendencia de Recaudo Mensual")
+    if 'recaudo_mensual' in figs:
+        traza.filas(res['recaudo_mensual'])
+        st.plotly_chart(traza.figura(figs['recaudo_mensual']), width='stretch')
+    else:
+        st.info("No hay datos de recaudos para mostrar.")
+
+    if 'comparativo_anual' in figs:
+        traza.seccion('comparativo')
+        st.markdown("---")
+        st.subheader("📈 Comparativo Anual")
+        # Todos los años salen de la misma serie (series.mensual), sin consultar por año
+        traza.filas(res['recaudo_series'])
+        st.plotly_chart(traza.figura(figs['comparativo_anual']), width='stretch')
+        if 'variacion_anual' in figs:
+            st.plotly_chart(traza.figura(figs['variacion_anual']), width='stretch')
+
+    # --- Análisis por Nivel ---
+    traza.seccion('grado')
+    st.markdown("---")
+    st.subheader("🎓 Ingresos por Grado")
+    if 'ingreso_grado' in figs:
+        traza.filas(res['ingreso_grado'])
+        st.plotly_chart(traza.figura(figs['ingreso_grado']), width='stretch')
 
-st.markdown("---")
-st.subheader("🪙 Ingresos por Concepto (Rubro)")
-if not df_pagos_filtered.empty and 'Nom_rubro' in df_pagos_filtered.columns:
-    # Agrupar rubros similares (ej. "Pensión 1", "Pensión 2" -> "Pensión")
-    def agrupar_rubro(nombre):
-        nombre = str(nombre).lower()
-        if 'pensión' in nombre or 'pension' in nombre:
-            return 'Pensión'
-        elif 'transporte' in nombre:
-            return 'Transporte'
-        elif 'matrícula' in nombre or 'matricula' in nombre:
-            return 'Matrícula'
-        elif 'seguro' in nombre:
-            return 'Seguro'
-        elif 'sistemas' in nombre:
-            return 'Sistemas'
-        else:
-            return nombre.title()
-
-    df_pagos_filtered['Categoria_Rubro'] = df_pagos_filtered['Nom_rubro'].apply(agrupar_rubro)
-    ingreso_rubro = df_pagos_filtered.groupby('Categoria_Rubro')['Valor'].sum().reset_index()
-    
-    fig_rubro = px.pie(ingreso_rubro, values='Valor', names='Categoria_Rubro', 
-                       title=f"Distribución de Ingresos por Concepto - Año {selected_year}",
-                       hole=0.4)
-    fig_rubro.update_traces(textposition='inside', textinfo='percent+label')
-    fig_rubro.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_rubro, width='stretch')
-else:
-    st.info("No hay información de rubros disponible.")
+    traza.seccion('curso')
+    st.markdown("---")
+    st.subheader("🏫 Ingresos por Curso")
+    if 'ingreso_curso' in figs:
+        traza.filas(res['ingreso_curso'])
+        st.plotly_chart(traza.figura(figs['ingreso_curso']), width='stretch')
 
-# --- Análisis de Costos y Rentabilidad ---
-st.markdown("---")
-st.subheader("💰 Análisis de Costos y Rentabilidad (Estimado)")
-
-# Inputs en Sidebar para Costos
-st.sidebar.markdown("---")
-st.sidebar.subheader("Parámetros de Costos")
-num_docentes = st.sidebar.number_input("Número de Docentes", min_value=1, value=25, step=1)
-salario_promedio = st.sidebar.number_input("Salario Promedio Base", min_value=0, value=1950000, step=50000)
-factor_prestacional = st.sidebar.slider("Factor Prestacional (Carga)", 1.0, 2.0, 1.5, 0.1)
-
-if not df_pagos_filtered.empty and not df_alumnos.empty:
-    # 1. Cálculo de Costos Globales
-    costo_nomina_mensual = num_docentes * salario_promedio * factor_prestacional
-    # Asumimos costo anual = mensual * 12 (o 10 meses lectivos? Usualmente se paga todo el año o 12 meses legalmente)
-    # Para simplificar y comparar con "Ingresos a la Fecha" (que suelen ser acumulados del año),
-    # deberíamos proyectar el costo al mismo periodo o usar un costo Anual Total estimado.
-    # El usuario pidió "Costo x Curso", asumiremos costo anual para comparar con ingresos anuales.
-    costo_nomina_anual = costo_nomina_mensual * 12 
-    
-    # 2. Contar Alumnos Activos Totales y por Curso
-    # Filtrar solo activos para el prorrateo de costos (quienes pagan)
-    # Nota: Si df_alumnos tiene históricos, filtrar por el año seleccionado si hubiera columna año en alumnos.
-    # Asumimos df_alumnos es la foto actual.
-    
-    # Convertir Activo a numérico si es necesario o filtrar strings 'True'/1
-    # Check data type of Activo first
-    total_alumnos_activos = df_alumnos[df_alumnos['Activo'] == 1].shape[0]
-    
-    if total_alumnos_activos > 0:
-        costo_por_estudiante = costo_nomina_anual / total_alumnos_activos
+    traza.seccion('rubro')
+    st.markdown("---")
+    st.subheader("🪙 Ingresos por Concepto (Rubro)")
+    if 'ingreso_categoria' in figs:
+        # Categoría por rubro (rubros.py) ya resuelta al cargar cada base: aquí solo se grafica
+        traza.filas(res['ingreso_categoria'])
+        st.plotly_chart(traza.figura(figs['ingreso_categoria']), width='stretch')
     else:
-        costo_por_estudiante = 0
-
-    # 3. Preparar Dataframe por Curso para el Análisis
-    # Ingresos por curso
-    ingresos_curso_df = df_pagos_filtered.groupby('Nom_curso')['Valor'].sum().reset_index()
-    ingresos_curso_df.rename(columns={'Valor': 'Ingresos'}, inplace=True)
-    
-    # Alumnos por curso (Activos)
-    alumnos_curso_df = df_alumnos[df_alumnos['Activo'] == 1].groupby('Nom_curso')['Cod_alumno'].count().reset_index()
-    alumnos_curso_df.rename(columns={'Cod_alumno': 'Num_Alumnos'}, inplace=True)
-    
-    # Merge
-    analisis_curso = pd.merge(ingresos_curso_df, alumnos_curso_df, on='Nom_curso', how='inner')
-    
-    # Cálculos Financieros por Curso
-    analisis_curso['Costo_Estimado'] = analisis_curso['Num_Alumnos'] * costo_por_estudiante
-    analisis_curso['Utilidad'] = analisis_curso['Ingresos'] - analisis_curso['Costo_Estimado']
-    analisis_curso['Margen'] = (analisis_curso['Utilidad'] / analisis_curso['Ingresos']) * 100
-    
-    # Ordenar por Utilidad
-    analisis_curso = analisis_curso.sort_values('Utilidad', ascending=False)
-
-    # --- Visualizaciones Costos ---
-    
-    # 1. KPIs Generales Costos
-    kpi_c1, kpi_c2, kpi_c3 = st.columns(3)
-    kpi_c1.metric("Costo Nómina Anual (Est.)", f"${costo_nomina_anual:,.0f}")
-    kpi_c2.metric("Costo Anual por Alumno", f"${costo_por_estudiante:,.0f}")
-    if num_docentes > 0:
-        alumnos_x_profe = total_alumnos_activos / num_docentes
-        kpi_c3.metric("Alumnos por Docente", f"{alumnos_x_profe:.1f}")
-
-    st.markdown("##### Rentabilidad por Curso (Ingresos vs Costos)")
-    
-    # 2. Gráfico Barras Agrupadas: Ingresos vs Costos
-    # Necesitamos "melt" para plotly grouped bar
-    analisis_melted = analisis_curso.melt(id_vars='Nom_curso', value_vars=['Ingresos', 'Costo_Estimado'], var_name='Tipo', value_name='Monto')
-    
-    fig_rent = px.bar(analisis_melted, x='Nom_curso', y='Monto', color='Tipo', barmode='group',
-                      title="Comparativa: Ingresos Reales vs Costos Operativos Estimados",
-                      labels={'Monto': 'Valor ($)', 'Nom_curso': 'Curso'},
-                      color_discrete_map={'Ingresos': '#00CC96', 'Costo_Estimado': '#EF553B'})
-    fig_rent.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_rent, width='stretch')
-    
-    # 3. Scatter Plot: Utilidad vs Volumen
-    st.markdown("##### Matriz de Eficiencia: Volumen de Alumnos vs Utilidad")
-    fig_scatter = px.scatter(analisis_curso, x='Num_Alumnos', y='Utilidad', 
-                             size='Ingresos', color='Utilidad',
-                             hover_name='Nom_curso',
-                             title="Eficiencia por Curso (Tamaño burbuja = Ingresos)",
-                             color_continuous_scale='RdYlGn',
-                             labels={'Num_Alumnos': 'Número de Estudiantes', 'Utilidad': 'Utilidad Neta Estimada ($)'})
-    # Add predicted break-even line if possible or just axis lines
-    fig_scatter.add_hline(y=0, line_dash="dash", line_color="gray", annotation_text="Punto de Equilibrio")
-    fig_scatter.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-    st.plotly_chart(fig_scatter, width='stretch')
+        st.info("No hay información de rubros disponible.")
+    traza.terminar()
 
-else:
-    st.info("Necesitamos datos de Pagos y Alumnos (con campo Activo) para calcular costos.")
+# --- Análisis de Costos y Rentabilidad ---
+@fragmento
+def seccion_costos(filtros):
+    res = get_resumen(filtros)
+    if not res:
+        return
+    traza.seccion('costos')
+    st.subheader("💰 Análisis de Costos y Rentabilidad (Estimado)")
+
+    # Parámetros dentro del fragmento (un fragmento no puede escribir en la barra lateral):
+    # cambiarlos solo vuelve a ejecutar esta sección
+    # (valores iniciales en COSTOS_DEFECTO, fijados en Session State antes de las pestañas)
+    par_c1, par_c2, par_c3 = st.columns(3)
+    num_docentes = par_c1.number_input("Número de Docentes", min_value=1, step=1, key='num_docentes')
+    salario_promedio = par_c2.number_input("Salario Promedio Base", min_value=0, step=50000, key='salario_promedio')
+    factor_prestacional = par_c3.slider("Factor Prestacional (Carga)", 1.0, 2.0, step=0.1, key='factor_prestacional')
+
+    costo, figs = get_costos(filtros, num_docentes, salario_promedio, factor_prestacional)
+    if costo:
+        traza.filas(costo['analisis_curso'])
+        # --- Visualizaciones Costos ---
+
+        # 1. KPIs Generales Costos
+        kpi_c1, kpi_c2, kpi_c3 = st.columns(3)
+        kpi_c1.metric("Costo Nómina Anual (Est.)", f"${costo['costo_nomina_anual']:,.0f}")
+        kpi_c2.metric("Costo Anual por Alumno", f"${costo['costo_por_estudiante']:,.0f}")
+        if costo['alumnos_x_profe'] is not None:
+            kpi_c3.metric("Alumnos por Docente", f"{costo['alumnos_x_profe']:.1f}")
+
+        st.markdown("##### Rentabilidad por Curso (Ingresos vs Costos)")
+
+        # 2. Gráfico Barras Agrupadas: Ingresos vs Costos
+        st.plotly_chart(traza.figura(figs['rentabilidad']), width='stretch')
+
+        # 3. Scatter Plot: Utilidad vs Volumen
+        st.markdown("##### Matriz de Eficiencia: Volumen de Alumnos vs Utilidad")
+        st.plotly_chart(traza.figura(figs['eficiencia']), width='stretch')
 
+    else:
+        st.info("Necesitamos datos de Pagos y Alumnos (con campo Activo) para calcular costos.")
+
+    # Escenarios what-if: la grilla completa se evalúa en un solo cálculo (escenarios.py),
+    # y solo mientras el expander está abierto
+    vectores_costos = escenarios.vectores(res)
+    if vectores_costos is not None:
+        expander = st.expander("🔬 Explorar Escenarios de Costos (What-If)", expanded=False, key='escenarios', on_change='rerun')
+        with expander:
+            if expander.open:
+                explorar_escenarios(vectores_costos, num_docentes, salario_promedio, factor_prestacional)
+    traza.terminar()
+
+def explorar_escenarios(vectores_costos, num_docentes, salario_promedio, factor_prestacional):
+    esc_c1, esc_c2, esc_c3 = st.columns(3)
+    rango_docentes = esc_c1.slider("Rango de Docentes", 1, 100, (min(max(1, num_docentes - 10), 100), min(num_docentes + 10, 100)))
+    rango_salario = esc_c2.slider("Rango de Salario Base", 500000, 6000000,
+                                  (min(max(500000, salario_promedio - 500000), 6000000), min(salario_promedio + 500000, 6000000)),
+                                  step=50000)
+    rango_factor = esc_c3.slider("Rango de Factor Prestacional", 1.0, 2.0, (1.3, 1.7), 0.05)
+    # Docentes asignados a cada curso (además de los compartidos, que se prorratean por alumno)
+    asignacion = st.data_editor(
+        pd.DataFrame({'Nom_curso': vectores_costos['cursos'], 'Docentes_Asignados': 0}),
+        hide_index=True, disabled=['Nom_curso'], key='docentes_por_curso',
+    )
+    docentes_curso = asignacion['Docentes_Asignados'].fillna(0).to_numpy()
+    docentes_rango = np.arange(rango_docentes[0], rango_docentes[1] + 1)
+    salarios_rango = np.linspace(rango_salario[0], rango_salario[1], 41)
+    factores_rango = np.round(np.arange(rango_factor[0], rango_factor[1] + 1e-9, 0.05), 2)
+    resultado = escenarios.evaluar(vectores_costos, docentes_rango, salarios_rango, factores_rango, docentes_curso)
+    traza.filas(asignacion)
+    st.caption(f"{resultado['utilidad_total'].size:,} escenarios x {len(vectores_costos['cursos'])} cursos evaluados.")
+
+    tabla = escenarios.sensibilidad(resultado, factores=factor_prestacional)
+    factor_tabla = factores_rango[np.abs(factores_rango - factor_prestacional).argmin()]
+    st.plotly_chart(traza.figura(informe.fig_sensibilidad(tabla, factor_tabla)), width='stretch')
+    # Frontera de equilibrio en los dos sentidos: salario máximo por docentes y docentes máximos por salario
+    col_salario, col_docentes = st.columns(2)
+    frontera = escenarios.salario_equilibrio(vectores_costos, docentes_rango, factores_rango, docentes_curso)
+    col_salario.plotly_chart(traza.figura(informe.fig_equilibrio(frontera)), width='stretch')
+    frontera_docentes = escenarios.docentes_equilibrio(vectores_costos, salarios_rango, factores_rango, docentes_curso)
+    col_docentes.plotly_chart(traza.figura(informe.fig_docentes_equilibrio(frontera_docentes)), width='stretch')
+    st.markdown("##### Cursos rentables en la grilla de escenarios")
+    st.dataframe(
+        escenarios.equilibrio_por_curso(vectores_costos, resultado),
+        hide_index=True,
+        column_config={
+            'Escenarios_Rentables': st.column_config.NumberColumn("% Escenarios Rentables", format="%.0f%%"),
+            'Margen_Min': st.column_config.NumberColumn("Margen Mínimo", format="%.1f%%"),
+            'Margen_Max': st.column_config.NumberColumn("Margen Máximo", format="%.1f%%"),
+        },
+    )
 
 # --- Semáforo de Cartera ---
-st.markdown("---")
-st.subheader("🚨 Semáforo de Cartera (Deudas)")
-
-if not df_deudores_filtered.empty:
-    st.subheader("Riesgo por Grado (Cartera Total)")
-    if 'Grado' in df_deudores_filtered.columns:
-        deuda_grado = df_deudores_filtered.groupby('Grado')['Total_Deuda'].sum().reset_index().sort_values('Total_Deuda', ascending=False)
-        fig_deuda = px.bar(deuda_grado, x='Grado', y='Total_Deuda',
-                           color='Total_Deuda',
-                           color_continuous_scale='Reds',
-                           title="Grados con Mayor Deuda Acumulada")
-        fig_deuda.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-        st.plotly_chart(fig_deuda, width='stretch')
-    else:
-         st.warning("No se pudo mapear grados para la cartera.")
-
-    # --- Analsis de Deuda detallado (Nuevo) ---
-    col_det1, col_det2 = st.columns(2)
-    
-    with col_det1:
-        st.markdown("**Composición de la Deuda por Concepto**")
-        # Sumar columnas de conceptos
-        conceptos = ['Matricula', 'Pension', 'Transporte', 'Sistemas', 'Asociacion', 'Otros', 'Ludicas', 'Mpruebas']
-        # Check existence of columns
-        valid_conceptos = [c for c in conceptos if c in df_deudores_filtered.columns]
-        
-        if valid_conceptos:
-            deuda_concepto = df_deudores_filtered[valid_conceptos].sum().reset_index()
-            deuda_concepto.columns = ['Concepto', 'Monto']
-            
-            # Filtrar montos en cero
-            deuda_concepto = deuda_concepto[deuda_concepto['Monto'] > 0]
-            
-            deuda_concepto = deuda_concepto.sort_values('Monto', ascending=False)
-            
-            fig_conc = px.bar(deuda_concepto, x='Concepto', y='Monto',
-                              color='Monto', color_continuous_scale='OrRd',
-                              title="¿Qué se debe más?",
-                              labels={'Monto': 'Deuda Total ($)'})
-            fig_conc.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-            st.plotly_chart(fig_conc, width='stretch')
-            
-    with col_det2:
-        st.markdown("**Antigüedad de Mora (Por Mes)**")
-        # Agrupar por Mes
-        if 'Mes' in df_deudores_filtered.columns:
-            # Ordenar Meses si son numeros
-            deuda_tiempo = df_deudores_filtered.groupby('Mes')['Total_Deuda'].sum().reset_index().sort_values('Mes')
-            
-            # Mapear mes numérico a nombre si es posible, o dejar como está
-            # Asumiendo Mes es int 1-12
-            import calendar
-            try:
-                # Si Mes es numérico 1-12
-                # deuda_tiempo['Nombre_Mes'] = deuda_tiempo['Mes'].apply(lambda x: calendar.month_name[int(x)] if 1<=x<=12 else str(x))
-                # Pero la user locale puede ser ES. Dejemoslo simple por ahora
-                pass
-            except:
-                pass
-
-            fig_antig = px.bar(deuda_tiempo, x='Mes', y='Total_Deuda',
-                               title="Evolución de la Deuda por Mes",
-                               labels={'Total_Deuda': 'Monto ($)', 'Mes': 'Mes de Deuda'})
-            fig_antig.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
-            st.plotly_chart(fig_antig, width='stretch')
+@fragmento
+def seccion_cartera(filtros):
+    res = get_resumen(filtros)
+    if not res:
+        return
+    traza.seccion('semaforo')
+    st.subheader("🚨 Semáforo de Cartera (Deudas)")
+
+    figs = get_figuras_cartera(filtros)
+    if not res['deuda_grado'].empty:
+        st.subheader("Riesgo por Grado (Cartera Total)")
+        if 'deuda_grado' in figs:
+            traza.filas(res['deuda_grado'])
+            st.plotly_chart(traza.figura(figs['deuda_grado']), width='stretch')
+        else:
+             st.warning("No se pudo mapear grados para la cartera.")
 
+        # --- Analsis de Deuda detallado (Nuevo) ---
+        col_det1, col_det2 = st.columns(2)
 
-else:
-    st.info("No hay datos de cartera para mostrar.")
+        with col_det1:
+            st.markdown("**Composición de la Deuda por Concepto**")
+            # Conceptos graficados con monto mayor a cero, de mayor a menor (informe.conceptos_con_deuda)
+            if 'deuda_concepto' in figs:
+                traza.filas(res['deuda_concepto'])
+                st.plotly_chart(traza.figura(figs['deuda_concepto']), width='stretch')
 
-# --- Galería de Actividades (Facebook / Web) ---
-st.markdown("---")
+        with col_det2:
+            st.markdown("**Antigüedad de Mora (Por Mes)**")
+            if 'deuda_mes' in figs:
+                traza.filas(res['deuda_mes'])
+                st.plotly_chart(traza.figura(figs['deuda_mes']), width='stretch')
 
-@st.dialog("📸 Visor de Imagen", width="large")
-def view_image(image_path, caption):
-    st.image(image_path, caption=caption, use_container_width=True)
+        # Edad de la deuda por tramos de días de mora, desde el vencimiento de cada cargo
+        if 'deuda_edad' in figs:
+            traza.filas(res['deuda_edad'])
+            st.plotly_chart(traza.figura(figs['deuda_edad']), width='stretch')
+
+    else:
+        st.info("No hay datos de cartera para mostrar.")
+    traza.terminar()
+
+# --- Ficha de Alumno ---
+def _historial(nombre, funcion, alumno):
+    """One page of a keyset-paginated history; the session keeps the cursors of the pages already seen."""
+    clave = f"historial_{nombre}"
+    estado = st.session_state.get(clave)
+    if estado is None or estado['alumno'] != alumno:
+        estado = st.session_state[clave] = {'alumno': alumno, 'cursores': [None]}
+    base, cod_alumno = alumno
+    pagina, siguiente = funcion(cod_alumno, estado['cursores'][-1], db_path=base)
+    traza.filas(pagina)
+    if pagina.empty:
+        st.info("Sin registros.")
+        return
+    st.dataframe(pagina, hide_index=True, width='stretch')
+    # Los botones mueven la pila de cursores en su callback, antes del rerun del fragmento
+    col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+    col_ant.button("◀ Anterior", key=f"{clave}_anterior", disabled=len(estado['cursores']) == 1,
+                   on_click=estado['cursores'].pop)
+    col_pag.caption(f"Página {len(estado['cursores'])}")
+    col_sig.button("Siguiente ▶", key=f"{clave}_siguiente", disabled=siguiente is None,
+                   on_click=estado['cursores'].append, args=(siguiente,))
+
+@fragmento
+def seccion_alumnos(hoy):
+    traza.seccion('alumnos')
+    st.subheader("🔎 Ficha de Alumno")
+    texto = st.text_input("Buscar por nombre o código", key='alumno_busqueda', placeholder="Ej.: rodr carv o 10051")
+    if not texto.strip():
+        st.info("Escribe el comienzo del nombre, los apellidos o el código del alumno.")
+        traza.terminar()
+        return
+    # Índice FTS5 de maintenance.py (prefijos, sin tildes); cada base se consulta en su hilo
+    encontrados, errores = federacion.buscar_alumnos(texto)
+    for colegio, error in errores.items():
+        st.warning(f"No se pudo buscar en {colegio}: {error}")
+    traza.filas(encontrados)
+    if encontrados.empty:
+        st.info("No hay alumnos que coincidan con la búsqueda.")
+        traza.terminar()
+        return
+
+    varios_colegios = encontrados['Colegio'].nunique() > 1
+    fichas = {(fila.Base, fila.Cod_alumno): fila for fila in encontrados.itertuples(index=False)}
+
+    def etiqueta(alumno):
+        fila = fichas[alumno]
+        nombre = f"{fila.Nombre} ({fila.Cod_alumno}) · {fila.Nom_curso or 'sin curso'}"
+        return f"{nombre} · {fila.Colegio}" if varios_colegios else nombre
+
+    alumno = st.selectbox("Alumno", list(fichas), format_func=etiqueta, key='alumno_elegido')
+    fila = fichas[alumno]
+    if not fila.Activo:
+        st.caption("Alumno inactivo")
+
+    traza.seccion('alumno_cartera')
+    try:
+        libro = federacion.libro_alumno(fila.Base, fila.Cod_alumno, hoy)
+    except Exception as e:
+        st.error(f"No se pudo armar la cartera del alumno: {e}")
+        libro = None
+    if libro is not None and not libro.empty:
+        estado = informe.estado_cuenta(libro)
+        traza.filas(estado)
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Cargos", f"${estado['Cargo'].sum():,.0f}")
+        m2.metric("Abonos", f"${estado['Abono'].sum():,.0f}")
+        m3.metric("Deuda vencida", f"${estado['Deuda'].sum():,.0f}")
+        st.dataframe(estado, hide_index=True, width='stretch')
+
+    traza.seccion('alumno_pagos')
+    st.markdown("**Historial de Pagos** (más recientes primero)")
+    _historial('pagos', db_utils.historial_pagos, alumno)
+
+    traza.seccion('alumno_cargos')
+    st.markdown("**Cargos por Mes**")
+    _historial('cargos', db_utils.historial_cargos, alumno)
+    traza.terminar()
 
-with st.expander("📸 Galería de Actividades y Eventos", expanded=True):
+# --- Galería de Actividades (Facebook / Web) ---
+@fragmento
+def seccion_galeria():
+    traza.seccion('galeria')
+    st.subheader("📸 Galería de Actividades y Eventos")
     image_folder = 'imagenes'
     if not os.path.exists(image_folder):
         os.makedirs(image_folder)
-        
-    # Buscar imágenes locales
-    local_images = [os.path.join(image_folder, f) for f in os.listdir(image_folder) if f.lower().endswith(('.png', '.jpg', '.jpeg', '.webp'))]
-    
+
+    # Miniaturas WebP cacheadas (galeria.py); la imagen completa solo se envía al ampliar
+    local_images = galeria.imagenes(image_folder)
+
     if local_images:
-        # Mostrar imágenes locales dinámicamente
+        # Se revelan de a una página para no enviar todas las miniaturas en cada rerun
         num_cols = 3
+        por_pagina = 6
+        visibles = st.session_state.setdefault('galeria_visibles', por_pagina)
         cols = st.columns(num_cols)
-        for i, img_path in enumerate(local_images):
+        traza.filas(local_images[:visibles])
+        for i, imagen in enumerate(local_images[:visibles]):
             with cols[i % num_cols]:
-                st.image(img_path, use_container_width=True)
-                if st.button("🔍 Ampliar", key=f"img_btn_{i}"):
-                    view_image(img_path, "Imagen de la Galería")
-                    
-        st.success(f"Mostrando {len(local_images)} imágenes de la carpeta '{image_folder}'.")
+                st.image(imagen['miniatura'], width='stretch')
+                if st.button("🔍 Ampliar", key=f"img_btn_{imagen['hash'][:16]}"):
+                    view_image(imagen['ruta'], "Imagen de la Galería")
+
+        if visibles < len(local_images):
+            if st.button(f"Mostrar más ({len(local_images) - visibles} restantes)", key="galeria_mas"):
+                st.session_state['galeria_visibles'] = visibles + por_pagina
+                st.rerun(scope='fragment')
+
+        st.success(f"Mostrando {min(visibles, len(local_images))} de {len(local_images)} imágenes de la carpeta '{image_folder}'.")
     else:
         # Fallback: URLs de ejemplo
         img_urls = [
-            "https://img.freepik.com/foto-gratis/estudiantes-corriendo-pasillo-universidad_23-2147763809.jpg", 
-            "https://img.freepik.com/foto-gratis/grupo-estudiantes-adolescentes-escuela_23-2148141443.jpg", 
+            "https://img.freepik.com/foto-gratis/estudiantes-corriendo-pasillo-universidad_23-2147763809.jpg",
+            "https://img.freepik.com/foto-gratis/grupo-estudiantes-adolescentes-escuela_23-2148141443.jpg",
             "https://img.freepik.com/foto-gratis/alumnos-felices-profesor-clase_1098-2598.jpg"
         ]
-        
+
         # Mostrar en columnas
         col_gal1, col_gal2, col_gal3 = st.columns(3)
         with col_gal1:
-            st.image(img_urls[0], caption="Actividades Deportivas", use_container_width=True)
+            st.image(img_urls[0], caption="Actividades Deportivas", width='stretch')
             if st.button("🔍 Ampliar", key="btn_gal1"):
                 view_image(img_urls[0], "Actividades Deportivas")
         with col_gal2:
-            st.image(img_urls[1], caption="Convivencia Escolar", use_container_width=True)
+            st.image(img_urls[1], caption="Convivencia Escolar", width='stretch')
             if st.button("🔍 Ampliar", key="btn_gal2"):
                 view_image(img_urls[1], "Convivencia Escolar")
         with col_gal3:
-            st.image(img_urls[2], caption="Excelencia Académica", use_container_width=True)
+            st.image(img_urls[2], caption="Excelencia Académica", width='stretch')
             if st.button("🔍 Ampliar", key="btn_gal3"):
                 view_image(img_urls[2], "Excelencia Académica")
-                
+
         st.info(f"💡 La carpeta '{image_folder}' está vacía. Agrega tus fotos ahí para que aparezcan aquí automáticamente.")
 
     st.markdown("---")
     st.markdown("##### 🌐 Conecta con nosotros")
     col_social1, col_social2 = st.columns(2)
     with col_social1:
-        st.link_button("📘 Visitar Facebook Oficial", "https://www.facebook.com/gim.palmareal", use_container_width=True)
+        st.link_button("📘 Visitar Facebook Oficial", "https://www.facebook.com/gim.palmareal", width='stretch')
     with col_social2:
-        st.link_button("📺 Ver Video Institucional (YouTube)", "https://www.youtube.com/watch?v=Ivhoj5tRttY", use_container_width=True)
+        st.link_button("📺 Ver Video Institucional (YouTube)", "https://www.youtube.com/watch?v=Ivhoj5tRttY", width='stretch')
+    traza.terminar()
+
+# Pestañas con estado: cambiar de pestaña hace un rerun y solo se ejecuta la visible.
+# Streamlit descarta el estado de los widgets que no se dibujan en un rerun; reasignar
+# los parámetros de costos los conserva mientras su pestaña está oculta.
+for clave, valor in informe.COSTOS_DEFECTO.items():
+    st.session_state[clave] = st.session_state.get(clave, valor)
+
+st.markdown("---")
+tab_ingresos, tab_costos, tab_cartera, tab_alumnos, tab_galeria = st.tabs(
+    ["📊 Ingresos", "💰 Costos y Rentabilidad", "🚨 Cartera", "🔎 Alumnos", "📸 Galería"], key='seccion', on_change='rerun',
+)
+with tab_ingresos:
+    if tab_ingresos.open:
+        seccion_ingresos(filtros)
+with tab_costos:
+    if tab_costos.open:
+        seccion_costos(filtros)
+with tab_cartera:
+    if tab_cartera.open:
+        seccion_cartera(filtros)
+with tab_alumnos:
+    if tab_alumnos.open:
+        seccion_alumnos(hoy)
+with tab_galeria:
+    if tab_galeria.open:
+        seccion_galeria()
+
+# --- Panel de Administración (tiempos por sección) ---
+traza.terminar()
+rerun_completo = False
+if perfilador is not None:
+    st.session_state['perfil_guardado'] = perfilador.guardar('perfiles')
+registrar_traza(traza, anio=selected_year, grados=len(selected_grades))
+if modo_admin:
+    with st.sidebar.expander("⏱️ Tiempos por sección (admin)", expanded=False):
+        st.caption(f"Rerun {traza.id}: {traza.total() * 1000:.0f} ms")
+        st.dataframe(pd.DataFrame([s.a_dict() for s in traza.secciones]), hide_index=True)
+        st.caption("Total de los últimos reruns (s)")
+        st.line_chart(st.session_state['tiempos_reruns'])
+        tipo_perfil = st.selectbox("Perfilador", instrumentacion.perfiladores_disponibles())
+        if st.button("Perfilar un rerun"):
+            st.session_state['perfilar'] = tipo_perfil
+            st.rerun()
+        if st.session_state.get('perfil_guardado'):
+            st.caption(f"Último perfil: {st.session_state['perfil_guardado']}")
+        # Promedio por sección (y sub-paso) de los últimos reruns guardados en el log
+        registros = instrumentacion.leer_jsonl(log_tiempos)
+        secciones = pd.DataFrame([s for registro in registros for s in registro['secciones']])
+        if not secciones.empty:
+            st.caption(f"Promedio de los últimos {len(registros)} reruns en {log_tiempos}")
+            st.dataframe(
+                secciones.groupby('seccion', sort=False, as_index=False)[['segundos', 'filas', 'bytes_figuras']].mean(),
+                hide_index=True,
+            )
+        # Versión de datos de cada base junto al pool de conexiones de lectura
+        pool = db_utils.pool_stats()
+        usos = pool['hits'] + pool['misses']
+        st.caption(
+            f"Pool SQLite: {pool['hits']} reusos / {pool['misses']} conexiones nuevas"
+            f" ({pool['hits'] / usos:.0%} de aciertos)" if usos else "Pool SQLite: sin uso todavía"
+        )
+        st.dataframe(
+            pd.DataFrame([
+                {'Base': os.path.basename(path), 'Conexiones ociosas': pool['idle'].get(os.path.abspath(path), 0),
+                 **{parte: str(valor) for parte, valor in version}}
+                for path, version in data_version
+            ]),
+            hide_index=True,
+        )
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # no existe en Windows: se omite el pico de RSS del proceso
+    resource = None
+
+import sintetico
+
+# Banco de pruebas de escala. Para cada factor de escala genera (o reutiliza)
+# una base sintética con sintetico.py y la mide en un subproceso propio, con
+# SISCAR_DB_PATH apuntando a ella: así cada escala parte de cachés vacías y el
+# pico de memoria del proceso es solo suyo. Cada paso se repite y se guarda el
+# mínimo y la mediana del tiempo, el pico de tracemalloc y las filas del resultado;
+# los pasos que devuelven frames guardan además su memoria (schema.bytes_por_frame).
+#
+#   python benchmark.py --escalas 1 10 100 --anios 10 --salida bench_resultados.json
+
+COLEGIO = 'bench'
+
+
+def _pasos():
+    """(name, function(state) -> result) in execution order; later steps read earlier results."""
+    import cube
+    import db_utils
+    import informe
+    import libro_cartera
+    import rubros
+    import schema
+    import series
+    import snapshot
+
+    def ultimo_anio(s):
+        return int(s['merge']['Año'].max())
+
+    def merge(s):
+        # Preprocesamiento y merge del dashboard original (pagos x alumnos)
+        df = s['load_data_pagos'].copy()
+        df['Año'] = df['Fecha'].dt.year
+        df['Mes'] = df['Fecha'].dt.strftime('%Y-%m')
+        return df.merge(s['load_data_alumnos'][['Cod_alumno', 'Nom_curso', 'Nom_grado']], on='Cod_alumno', how='left')
+
+    def filtrados(s):
+        return s['merge'][s['merge']['Año'] == ultimo_anio(s)]
+
+    def frames(s):
+        return {nombre: s[f'query_{nombre}'] for nombre in snapshot.DATASETS}
+
+    def deuda_por_grado(s):
+        alumnos, deudores = s['load_data_alumnos'], s['load_data_deudores'].copy()
+        mapa = alumnos[['Nom_curso', 'Nom_grado']].drop_duplicates().set_index('Nom_curso')['Nom_grado'].to_dict()
+        deudores['Grado'] = deudores['Nom_curso'].map(mapa)
+        return deudores.groupby('Grado')['Total_Deuda'].sum().reset_index()
+
+    return [
+        # Loaders de filas completas y las secciones con groupby en pandas
+        ('load_data_pagos', lambda s: db_utils.load_data_pagos()),
+        ('load_data_alumnos', lambda s: db_utils.load_data_alumnos()),
+        ('load_data_deudores', lambda s: db_utils.load_data_deudores()),
+        ('load_data_rubros', lambda s: db_utils.load_data_rubros()),
+        ('merge', merge),
+        ('groupby_recaudo_mensual', lambda s: filtrados(s).groupby('Mes')['Valor'].sum().reset_index()),
+        ('groupby_ingreso_grado', lambda s: filtrados(s).groupby('Nom_grado')['Valor'].sum().reset_index()),
+        ('groupby_ingreso_curso', lambda s: filtrados(s).groupby('Nom_curso')['Valor'].sum().reset_index()),
+        ('groupby_ingreso_categoria', lambda s: filtrados(s).groupby('Categoria_Rubro', observed=True)['Valor'].sum().reset_index()),
+        ('groupby_deuda_grado', deuda_por_grado),
+        ('groupby_recaudo_anio_mes', lambda s: s['merge'].groupby(['Año', 'Mes'])['Valor'].sum().reset_index()),
+        # Ruta actual del dashboard: agregados SQL -> cubo -> cortes
+        ('query_pagos_resumen', lambda s: db_utils.query_pagos_resumen()),
+        ('query_cargos_alumno', lambda s: db_utils.query_cargos_alumno()),
+        ('query_abonos_alumno', lambda s: db_utils.query_abonos_alumno()),
+        ('query_alumnos_curso', lambda s: db_utils.query_alumnos_activos_por_curso()),
+        # Arranque en frío: los mismos resúmenes tipados y leídos del snapshot columnar
+        ('aplicar_esquema', lambda s: schema.aplicar_esquema(frames(s))),
+        ('snapshot_exportar', lambda s: snapshot.exportar_snapshot(frames=frames(s))),
+        ('snapshot_load_data', lambda s: snapshot.load_data()),
+        ('cubo_pagos', lambda s: cube.cubo_pagos(s['query_pagos_resumen'].assign(
+            Colegio=COLEGIO, Categoria_Rubro=rubros.asignar_categoria(s['query_pagos_resumen'], db_utils.categorias_rubro())))),
+        ('series_mensual', lambda s: series.mensual(s['cubo_pagos'])),
+        ('libro_cartera', lambda s: libro_cartera.libro(s['query_cargos_alumno'], s['query_abonos_alumno'])),
+        ('cubo_cartera', lambda s: cube.cubo_cartera(s['libro_cartera'].assign(Colegio=COLEGIO))),
+        ('resumen_cubo', lambda s: informe.resumen(
+            {'pagos': s['cubo_pagos'], 'cartera': s['cubo_cartera'],
+             'alumnos_curso': s['query_alumnos_curso'].assign(Colegio=COLEGIO)},
+            ultimo_anio(s), [],
+        )),
+    ]
+
+
+def _filas(resultado):
+    if isinstance(resultado, pd.DataFrame):
+        return len(resultado)
+    if isinstance(resultado, dict):
+        return sum(len(v) for v in resultado.values() if isinstance(v, pd.DataFrame))
+    valores = getattr(resultado, 'valores', None)
+    return int(valores.size) if valores is not None else None
+
+
+def _bytes(resultado):
+    import schema
+
+    if isinstance(resultado, pd.DataFrame):
+        return schema.bytes_por_frame({'frame': resultado})['total']
+    if isinstance(resultado, dict) and resultado and all(isinstance(v, pd.DataFrame) for v in resultado.values()):
+        return schema.bytes_por_frame(resultado)
+    return None
+
+
+def medir(repeticiones=3):
+    """Times every step against the database in SISCAR_DB_PATH; returns the list of step results."""
+    estado, pasos = {}, []
+    for nombre, paso in _pasos():
+        tiempos = []
+        try:
+            for i in range(repeticiones):
+                if i == 0:
+                    tracemalloc.start()
+                inicio = time.perf_counter()
+                resultado = paso(estado)
+                tiempos.append(time.perf_counter() - inicio)
+                if i == 0:
+                    _, pico = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+        except (MemoryError, RuntimeError) as e:
+            # RuntimeError: snapshot sin pyarrow instalado
+            tracemalloc.stop()
+            pasos.append({'paso': nombre, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        estado[nombre] = resultado
+        pasos.append({
+            'paso': nombre,
+            'segundos_min': round(min(tiempos), 6),
+            'segundos_mediana': round(statistics.median(tiempos), 6),
+            'pico_bytes': pico,
+            'filas': _filas(resultado),
+            'bytes_frames': _bytes(resultado),
+        })
+    return pasos
+
+
+def _pico_rss():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KiB en Linux y en bytes en macOS
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def _medir_en_subproceso(db, repeticiones):
+    env = {**os.environ, 'SISCAR_DB_PATH': os.path.abspath(db)}
+    comando = [sys.executable, os.path.abspath(__file__), '--medir', '--repeticiones', str(repeticiones)]
+    proceso = subprocess.run(comando, env=env, capture_output=True, text=True)
+    if proceso.returncode != 0:
+        return {'error': proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else f"código {proceso.returncode}"}
+    return json.loads(proceso.stdout)
+
+
+def ejecutar(escalas, anios, directorio, repeticiones=3, regenerar=False):
+    """Generates (or reuses) one database per scale and measures it; returns the results document."""
+    os.makedirs(directorio, exist_ok=True)
+    resultados = []
+    for escala in escalas:
+        db = os.path.join(directorio, f"siscar_x{escala:g}_a{anios}.db")
+        entrada = {'escala': escala, 'anios': anios, 'db': db}
+        if regenerar or not os.path.exists(db):
+            inicio = time.perf_counter()
+            entrada['filas'] = sintetico.generar_base(db, escala, anios)
+            entrada['segundos_generacion'] = round(time.perf_counter() - inicio, 3)
+        entrada['bytes_db'] = os.path.getsize(db)
+        print(f"Midiendo escala {escala:g}x ({anios} años)...", file=sys.stderr)
+        entrada.update(_medir_en_subproceso(db, repeticiones))
+        resultados.append(entrada)
+    return {
+        'generado': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'repeticiones': repeticiones,
+        'resultados': resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide loaders, merge y secciones del dashboard sobre bases sintéticas.")
+    parser.add_argument('--escalas', type=float, nargs='+', default=[1, 10, 100], help="Factores de escala (1-1000)")
+    parser.add_argument('--anios', type=int, default=1, help="Años de historia de cada base")
+    parser.add_argument('--directorio', default='bench_bases', help="Carpeta de las bases generadas (por defecto %(default)s)")
+    parser.add_argument('--salida', default='bench_resultados.json', help="Archivo JSON de resultados (por defecto %(default)s)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--regenerar', action='store_true', help="Regenerar las bases aunque existan")
+    parser.add_argument('--medir', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.medir:
+        # Subproceso: mide la base de SISCAR_DB_PATH y escribe JSON en stdout
+        pasos = medir(args.repeticiones)
+        json.dump({'pasos': pasos, 'pico_rss_bytes': _pico_rss()}, sys.stdout)
+        return
+
+    documento = ejecutar(args.escalas, args.anios, args.directorio, args.repeticiones, args.regenerar)
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(documento, f, ensure_ascii=False, indent=2)
+    for r in documento['resultados']:
+        print(f"\nEscala {r['escala']:g}x, {r['anios']} años: {r.get('error', '')}")
+        for p in r.get('pasos', []):
+            if 'error' in p:
+                print(f"  {p['paso']:<28} {p['error']}")
+            else:
+                frames = p.get('bytes_frames')
+                total = frames['total'] if isinstance(frames, dict) else frames
+                memoria = f"{total / 2**20:>9.1f} MiB en frames" if total else ''
+                print(f"  {p['paso']:<28} {p['segundos_mediana'] * 1000:>10.1f} ms {p['pico_bytes'] / 2**20:>9.1f} MiB {p['filas'] or '':>10} {memoria}")
+        if r.get('pico_rss_bytes'):
+            print(f"  pico RSS del proceso: {r['pico_rss_bytes'] / 2**20:.0f} MiB")
+    print(f"\nResultados en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
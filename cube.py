@@ -0,0 +1,163 @@
+import numpy as np
+import pandas as pd
+
+import db_utils
+
+# Cubo OLAP en memoria para el dashboard. Se construye una vez por versión de
+# datos a partir de los resúmenes de db_utils y guarda, por cada celda, la suma
+# y el número de filas de origen en arreglos NumPy densos. Cada KPI o gráfico
+# es un corte (np.take por eje) seguido de una suma.
+#
+# Un eje puede llevar varios atributos anidados: colegio, grado y curso van en
+# un solo eje "Segmento" con las combinaciones observadas, porque un curso
+# pertenece a un solo grado (y colegio). Con ejes separados el cubo crecería
+# con grados x cursos x colegios aunque casi todas esas celdas fueran cero.
+#
+#   pagos:   Periodo(Periodo, Anio, Mes) x Segmento(Colegio, Nom_grado, Nom_curso) x Rubro(Cod_rubro, Categoria_Rubro)
+#   cartera: Periodo(Anio, Mes, Edad) x Segmento(Colegio, Grado) x Concepto
+#
+# La cartera sale del libro por alumno (libro_cartera.py): la edad de mora
+# depende solo del año y mes del cargo, así que va como atributo del periodo.
+
+EJES_PAGOS = {
+    # Periodo es la clave entera yyyymm: las etiquetas del eje quedan en orden cronológico
+    'Periodo': ['Periodo', 'Anio', 'Mes'],
+    'Segmento': ['Colegio', 'Nom_grado', 'Nom_curso'],
+    'Rubro': ['Cod_rubro', 'Categoria_Rubro'],
+}
+EJES_CARTERA = {
+    'Periodo': ['Anio', 'Mes', 'Edad'],
+    'Segmento': ['Colegio', 'Grado'],
+    'Concepto': ['Concepto'],
+}
+
+
+def _sin_filtro(seleccion):
+    return seleccion is None or (not np.isscalar(seleccion) and len(seleccion) == 0)
+
+
+class Cubo:
+    """Dense aggregate over named axes; each axis has one or more label attributes."""
+
+    def __init__(self, atributos, valores, conteo):
+        # atributos: {eje: DataFrame con una fila por posición del eje}
+        self.atributos = {eje: df.reset_index(drop=True) for eje, df in atributos.items()}
+        self.ejes = tuple(self.atributos)
+        self.eje_de = {}
+        for eje, df in self.atributos.items():
+            for columna in df.columns:
+                self.eje_de.setdefault(columna, eje)
+        self.valores = valores
+        self.conteo = conteo
+
+    @classmethod
+    def desde_frame(cls, df, ejes, valor):
+        """Builds the cube from a long frame; `ejes` maps each axis to its attribute columns."""
+        atributos, codigos = {}, []
+        for eje, columnas in ejes.items():
+            if len(columnas) == 1:
+                codes, uniques = pd.factorize(df[columnas[0]], sort=True, use_na_sentinel=False)
+                etiquetas = pd.DataFrame({columnas[0]: uniques})
+            else:
+                # Combinaciones observadas, ordenadas por sus atributos (nulos al final)
+                grupos = df.groupby(columnas, sort=True, dropna=False, observed=True)
+                codes = grupos.ngroup().to_numpy()
+                etiquetas = grupos.size().reset_index()[columnas]
+            atributos[eje] = etiquetas
+            codigos.append(codes)
+        forma = tuple(len(atributos[eje]) for eje in ejes)
+        tamano = int(np.prod(forma))
+        if tamano == 0:
+            return cls(atributos, np.zeros(forma, dtype=np.int64), np.zeros(forma, dtype=np.int64))
+        plano = np.ravel_multi_index(codigos, forma)
+        valores = np.bincount(plano, weights=df[valor].to_numpy(dtype=np.float64), minlength=tamano)
+        conteo = np.bincount(plano, minlength=tamano)
+        return cls(atributos, np.rint(valores).astype(np.int64).reshape(forma), conteo.reshape(forma))
+
+    def etiquetas(self, atributo):
+        """Distinct values of an attribute, in axis order."""
+        return self.atributos[self.eje_de[atributo]][atributo].drop_duplicates().tolist()
+
+    def _posiciones(self, eje, filtros):
+        """Positions of an axis matching every filter on its attributes, or None if unfiltered."""
+        mascara = None
+        for atributo, seleccion in filtros.items():
+            if _sin_filtro(seleccion) or atributo not in self.atributos[eje].columns:
+                continue
+            if np.isscalar(seleccion):
+                seleccion = [seleccion]
+            coincide = self.atributos[eje][atributo].isin(list(seleccion)).to_numpy()
+            mascara = coincide if mascara is None else mascara & coincide
+        return None if mascara is None else np.flatnonzero(mascara)
+
+    def _cortar(self, filtros):
+        desconocidos = [a for a in filtros if a not in self.eje_de]
+        if desconocidos:
+            raise KeyError(f"Atributos desconocidos en el cubo: {desconocidos}")
+        valores, conteo, posiciones = self.valores, self.conteo, {}
+        for i, eje in enumerate(self.ejes):
+            pos = self._posiciones(eje, filtros)
+            if pos is not None:
+                valores = np.take(valores, pos, axis=i)
+                conteo = np.take(conteo, pos, axis=i)
+            posiciones[eje] = pos
+        return valores, conteo, posiciones
+
+    def total(self, **filtros):
+        """Sum of the cells matching the filters (None or an empty list means no filter)."""
+        valores, _, _ = self._cortar(filtros)
+        return int(valores.sum())
+
+    def por_eje(self, eje, **filtros):
+        """Totals along one axis, summed over the others: (its label frame, values, row counts), every position kept."""
+        valores, conteo, posiciones = self._cortar(filtros)
+        otros = tuple(i for i, nombre in enumerate(self.ejes) if nombre != eje)
+        atributos = self.atributos[eje]
+        if posiciones[eje] is not None:
+            atributos = atributos.iloc[posiciones[eje]].reset_index(drop=True)
+        return atributos, valores.sum(axis=otros), conteo.sum(axis=otros)
+
+    def por(self, columnas, valor='Valor', **filtros):
+        """Sums by one or more attributes as a DataFrame, keeping only the groups with source rows.
+
+        Filters select attribute values (a scalar or a list). The result follows
+        the axis label order.
+        """
+        columnas = [columnas] if isinstance(columnas, str) else list(columnas)
+        valores, conteo, posiciones = self._cortar(filtros)
+        ejes = [eje for eje in self.ejes if any(self.eje_de[c] == eje for c in columnas)]
+        otros = tuple(i for i, eje in enumerate(self.ejes) if eje not in ejes)
+        valores, conteo = valores.sum(axis=otros), conteo.sum(axis=otros)
+        # Solo las celdas con filas de origen; np.nonzero recorre en orden C (orden de etiquetas)
+        celdas = np.nonzero(conteo > 0)
+        datos = {}
+        colapsar = False
+        for eje, pos in zip(ejes, celdas):
+            atributos = self.atributos[eje]
+            if posiciones[eje] is not None:
+                atributos = atributos.iloc[posiciones[eje]]
+            pedidos = [c for c in columnas if self.eje_de[c] == eje]
+            colapsar |= len(pedidos) < len(atributos.columns)
+            for c in pedidos:
+                datos[c] = atributos[c].to_numpy()[pos]
+        datos[valor] = valores[celdas]
+        resultado = pd.DataFrame(datos, columns=columnas + [valor])
+        if colapsar:
+            # Eje con atributos no pedidos (p. ej. grado dentro del segmento): se suman sus posiciones
+            resultado = resultado.groupby(columnas, sort=True, dropna=False, observed=True, as_index=False)[valor].sum()
+        return resultado
+
+
+def cubo_pagos(df_resumen):
+    """Payment cube from db_utils.query_pagos_resumen() rows tagged with Colegio and Categoria_Rubro."""
+    periodo = df_resumen['Periodo'].to_numpy(dtype=np.int64)
+    df = df_resumen.assign(Periodo=periodo, Anio=periodo // 100, Mes=periodo % 100)
+    return Cubo.desde_frame(df, EJES_PAGOS, 'Valor')
+
+
+def cubo_cartera(df_libro):
+    """Debt cube from libro_cartera.libro() rows tagged with Colegio; only charges with debt count."""
+    deuda = df_libro[df_libro['Deuda'] > 0]
+    # El eje de conceptos conserva el orden de CONCEPTOS_CARGO
+    deuda = deuda.assign(Concepto=pd.Categorical(deuda['Concepto'], categories=list(db_utils.CONCEPTOS_CARGO)))
+    return Cubo.desde_frame(deuda, EJES_CARTERA, 'Deuda')
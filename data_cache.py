@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+import db_utils
+import schema
+
+# Caché de agregados invalidada por db_utils.get_data_version().
+# Cada entrada guarda (versión, resultado); si entre versiones solo llegaron
+# pagos nuevos, se consultan únicamente las filas con Num_pago > watermark y
+# se suman al resultado anterior en lugar de recalcularlo completo.
+# Los resultados se guardan tipados (schema.tipar: categóricas e int32), que
+# es lo que queda en memoria entre reruns.
+
+MAX_ENTRADAS = 256
+
+_entradas = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'deltas': 0, 'cargas': 0}
+
+
+def _combinar(anterior, delta, claves, orden=None):
+    """Adds the delta aggregate to the previous one, matching rows by key columns."""
+    if delta.empty:
+        return anterior
+    combinado = (
+        pd.concat([anterior, delta], ignore_index=True)
+        .groupby(claves, sort=False, dropna=False, as_index=False)
+        .sum()
+    )
+    if orden is not None:
+        columna, ascendente = orden
+        combinado = combinado.sort_values(columna, ascending=ascendente, ignore_index=True)
+    return combinado
+
+
+def agregado(clave, cargar, version, claves=None, orden=None, db_path=None):
+    """Returns cargar() typed with schema.tipar for the given data version, reusing the previous result when possible.
+
+    `cargar(desde_num_pago=None)` must return an aggregate whose non-key columns
+    are additive. Pass `claves` (and the result `orden` as (column, ascending))
+    to enable delta loads; without them any version change reloads in full.
+    `db_path` is the database the version belongs to (DB_PATH by default).
+    """
+    with _lock:
+        entrada = _entradas.get(clave)
+        if entrada is not None:
+            _entradas.move_to_end(clave)
+            if entrada[0] == version:
+                _stats['hits'] += 1
+                return entrada[1]
+
+    desde = None
+    if entrada is not None and claves is not None:
+        desde = db_utils.pagos_nuevos_desde(entrada[0], version, db_path)
+
+    if desde is not None:
+        resultado = _combinar(entrada[1], cargar(desde_num_pago=desde), claves, orden)
+        tipo = 'deltas'
+    else:
+        resultado = cargar()
+        tipo = 'cargas'
+    resultado = schema.tipar(resultado)
+
+    with _lock:
+        _stats[tipo] += 1
+        _entradas[clave] = (version, resultado)
+        _entradas.move_to_end(clave)
+        while len(_entradas) > MAX_ENTRADAS:
+            _entradas.popitem(last=False)
+    return resultado
+
+
+def estadisticas():
+    """Hit / delta-load / full-load counters of the cache."""
+    with _lock:
+        return dict(_stats, entradas=len(_entradas))
+
+
+def limpiar():
+    """Drops every cached aggregate."""
+    with _lock:
+        _entradas.clear()
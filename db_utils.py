@@ -1,18 +1,175 @@
 import sqlite3
 import pandas as pd
+import contextlib
+import functools
+import hashlib
 import os
+import re
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+from urllib.request import pathname2url
+
+import rubros
 
 # Configuración de la base de datos
-DB_PATH = 'siscar_estadistica.db'
+# Ruta configurable con SISCAR_DB_PATH; por defecto el archivo junto a este módulo.
+DB_PATH = os.environ.get(
+    'SISCAR_DB_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'siscar_estadistica.db'),
+)
+# Federación: SISCAR_DB_PATHS lista varias bases (una por colegio/sede) separadas
+# por os.pathsep (";" en Windows, ":" en Linux); sin ella solo se usa DB_PATH.
+DB_PATHS = [p for p in os.environ.get('SISCAR_DB_PATHS', '').split(os.pathsep) if p] or [DB_PATH]
+# SISCAR_DB_IMMUTABLE=1 para copias (snapshots) que nunca cambian mientras la app corre
+DB_IMMUTABLE = os.environ.get('SISCAR_DB_IMMUTABLE', '0') == '1'
+
+# Pragmas de lectura: mmap y caché de páginas grandes, temporales en memoria
+_READ_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA query_only = ON",
+)
+
+POOL_MAX_IDLE = 8
+
+# Límite de tiempo por consulta: cada conexión de lectura revisa, cada
+# _PASOS_PROGRESO instrucciones de la VM de SQLite, el plazo que fijó el hilo que
+# la está usando (limite_tiempo) y, si venció, SQLite interrumpe la consulta.
+_PASOS_PROGRESO = 100000
+_plazo = threading.local()
+
+
+def _plazo_vencido():
+    limite = getattr(_plazo, 'limite', None)
+    return limite is not None and time.monotonic() > limite
+
+
+@contextlib.contextmanager
+def limite_tiempo(segundos):
+    """Interrupts the SQLite queries this thread runs in the block after `segundos` (None: no limit).
+
+    An interrupted query surfaces as TimeoutError.
+    """
+    anterior = getattr(_plazo, 'limite', None)
+    _plazo.limite = None if segundos is None else time.monotonic() + segundos
+    try:
+        yield
+    except Exception as e:
+        # pandas envuelve el "interrupted" de sqlite3 en su propio DatabaseError
+        if _plazo_vencido():
+            raise TimeoutError(f"la consulta superó el límite de {segundos:g} s") from e
+        raise
+    finally:
+        _plazo.limite = anterior
+
+# Pool de conexiones de solo lectura por archivo. Streamlit ejecuta cada rerun
+# en un hilo nuevo, así que un threading.local perdería la conexión (y su caché
+# de páginas) al terminar el hilo; en su lugar cada hilo toma una conexión
+# ociosa del pool mientras la usa y la devuelve al terminar.
+_pool = {}
+_pool_lock = threading.Lock()
+_pool_stats = {'hits': 0, 'misses': 0}
 
-def get_connection():
-    """Establishes a connection to the SQLite database."""
-    if not os.path.exists(DB_PATH):
-        raise FileNotFoundError(f"Database file not found at {os.path.abspath(DB_PATH)}")
-    conn = sqlite3.connect(DB_PATH)
+
+def _file_id(db_path):
+    st_ = os.stat(db_path)
+    return (st_.st_dev, st_.st_ino)
+
+
+def get_connection(db_path=None, readonly=True, immutable=None):
+    """Opens a new tuned connection to the SQLite database.
+
+    Read-only connections use URI mode=ro (plus immutable=1 for snapshot
+    files) and the read pragmas; the caller owns and closes the connection.
+    """
+    db_path = db_path or DB_PATH
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database file not found at {os.path.abspath(db_path)}")
+    if not readonly:
+        return sqlite3.connect(db_path)
+    immutable = DB_IMMUTABLE if immutable is None else immutable
+    uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    for pragma in _READ_PRAGMAS:
+        conn.execute(pragma)
+    conn.set_progress_handler(_plazo_vencido, _PASOS_PROGRESO)
+    # Plegado de tildes de la búsqueda sin índice (buscar_alumnos)
+    conn.create_function('plegar', 1, _plegar, deterministic=True)
     return conn
 
-def load_data_pagos():
+
+# Captura opcional de las sentencias que ejecuta un hilo (diagnostico.py)
+_captura = threading.local()
+
+
+@contextlib.contextmanager
+def capturar_sentencias():
+    """Collects the SQL text (with bound values) of every statement this thread runs on pooled connections."""
+    anterior = getattr(_captura, 'sentencias', None)
+    _captura.sentencias = sentencias = []
+    try:
+        yield sentencias
+    finally:
+        _captura.sentencias = anterior
+
+
+@contextlib.contextmanager
+def pooled_connection(db_path=None):
+    """Borrows a read-only connection from the pool for the duration of the block."""
+    db_path = os.path.abspath(db_path or DB_PATH)
+    file_id = _file_id(db_path) if os.path.exists(db_path) else None
+    conn = None
+    with _pool_lock:
+        idle = _pool.setdefault(db_path, [])
+        while idle:
+            candidate_id, candidate = idle.pop()
+            if candidate_id == file_id:
+                conn = candidate
+                _pool_stats['hits'] += 1
+                break
+            # El archivo fue reemplazado: la conexión apunta al inodo viejo
+            candidate.close()
+        else:
+            _pool_stats['misses'] += 1
+    if conn is None:
+        conn = get_connection(db_path)
+    sentencias = getattr(_captura, 'sentencias', None)
+    if sentencias is not None:
+        conn.set_trace_callback(sentencias.append)
+    try:
+        yield conn
+    finally:
+        if sentencias is not None:
+            conn.set_trace_callback(None)
+        with _pool_lock:
+            idle = _pool.setdefault(db_path, [])
+            if len(idle) < POOL_MAX_IDLE:
+                idle.append((file_id, conn))
+                conn = None
+        if conn is not None:
+            conn.close()
+
+
+def pool_stats():
+    """Returns pool hit/miss counters and the idle connections per file."""
+    with _pool_lock:
+        return dict(_pool_stats, idle={path: len(conns) for path, conns in _pool.items()})
+
+
+def close_pool():
+    """Closes every idle pooled connection."""
+    with _pool_lock:
+        for conns in _pool.values():
+            for _, conn in conns:
+                conn.close()
+        _pool.clear()
+
+def load_data_pagos(db_path=None):
     """Loads payment data joining Pago and Detalle_pago."""
     query = """
     SELECT 
@@ -26,20 +183,55 @@ def load_data_pagos():
     JOIN Detalle_pago d ON p.Num_pago = d.Num_pago
     LEFT JOIN Rubros r ON d.Cod_rubro = r.Cod_rubro
     """
-    conn = get_connection()
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with pooled_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn)
     
     # Convertir Fecha a datetime (Unix Timestamp en ms)
     df['Fecha'] = pd.to_datetime(df['Fecha'], unit='ms', errors='coerce')
+    # Categoría del rubro (Pensión, Transporte, ...) resuelta una vez por rubro
+    df['Categoria_Rubro'] = rubros.asignar_categoria(df, categorias_rubro(db_path))
     return df
 
-def load_data_alumnos():
+def load_data_rubros(db_path=None):
+    """Loads the Rubros catalog."""
+    query = "SELECT Cod_rubro, Nom_rubro, Valor_rubro FROM Rubros"
+    with pooled_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn)
+    return df
+
+_categorias_memo = {}
+
+def categorias_rubro(db_path=None):
+    """Cod_rubro -> Categoria_Rubro table, rebuilt only when the dimension tables change."""
+    firma = dict(get_data_version(db_path))['dimensiones']
+    clave = os.path.abspath(db_path or DB_PATH)
+    memo = _categorias_memo.get(clave)
+    if memo is None or memo[0] != firma:
+        memo = _categorias_memo[clave] = (firma, rubros.tabla_categorias(load_data_rubros(db_path)))
+    return memo[1]
+
+def nombre_colegio(db_path=None):
+    """School name from the Colegio table, or the file name when the table is empty or missing."""
+    db_path = db_path or DB_PATH
+    try:
+        fila = _run_query("SELECT nom_colegio FROM Colegio WHERE nom_colegio IS NOT NULL LIMIT 1", db_path=db_path)
+    except (sqlite3.Error, pd.errors.DatabaseError):
+        fila = pd.DataFrame()
+    if not fila.empty:
+        return str(fila.iloc[0, 0]).strip()
+    return os.path.splitext(os.path.basename(db_path))[0]
+
+# Apellidos y nombres en una sola cadena; un campo vacío o NULL no anula el nombre completo
+_NOMBRE_ALUMNO_SQL = "TRIM(REPLACE(REPLACE({}, '  ', ' '), '  ', ' '))".format(
+    " || ' ' || ".join(f"COALESCE(a.{col}, '')" for col in ('P_apellido_alu', 'S_apellido_alu', 'P_nombre_alu', 'S_nombre_alu'))
+)
+
+def load_data_alumnos(db_path=None):
     """Loads student information including Course and Grade."""
-    query = """
+    query = f"""
     SELECT 
         a.Cod_alumno,
-        a.P_apellido_alu || ' ' || a.S_apellido_alu || ' ' || a.P_nombre_alu || ' ' || a.S_nombre_alu as Nombre_Completo,
+        {_NOMBRE_ALUMNO_SQL} as Nombre_Completo,
         a.Curso as Cod_curso,
         a.Activo,
         c.Nom_curso,
@@ -48,12 +240,11 @@ def load_data_alumnos():
     LEFT JOIN Curso c ON a.Curso = c.Cod_curso
     LEFT JOIN Grados g ON c.Grado = g.Cod_grado
     """
-    conn = get_connection()
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with pooled_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn)
     return df
 
-def load_data_deudores():
+def load_data_deudores(db_path=None):
     """Loads debt information from TBL_Alumnos_deudores."""
     # Usamos COALESCE (o IFNULL en Sqlite) para asegurar que la suma no sea NULL
     query = """
@@ -75,7 +266,616 @@ def load_data_deudores():
         COALESCE(d.Deuda, 0) as Deuda_Anterior
     FROM TBL_Alumnos_deudores d
     """
-    conn = get_connection()
-    df = pd.read_sql_query(query, conn)
-    conn.close()
+    with pooled_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn)
+    return df
+
+# --- Consultas Agregadas ---
+# Los filtros de año y grado se resuelven como WHERE/GROUP BY en SQLite,
+# de modo que solo las filas agregadas llegan a pandas. Si existen los rollups
+# de maintenance.py se leen de ahí, sumando los pagos posteriores al watermark.
+
+ROLLUP_PAGOS = 'Rollup_pagos'
+ROLLUP_ESTADO = 'Rollup_estado'
+
+_PAGOS_FROM = """
+    FROM Pago p
+    JOIN Detalle_pago d ON p.Num_pago = d.Num_pago
+    LEFT JOIN Rubros r ON d.Cod_rubro = r.Cod_rubro
+    LEFT JOIN Alumno a ON p.Cod_alumno = a.Cod_alumno
+    LEFT JOIN Curso c ON a.Curso = c.Cod_curso
+    LEFT JOIN Grados g ON c.Grado = g.Cod_grado
+"""
+
+# Conceptos de deuda (columna en TBL_Alumnos_deudores -> nombre en el dashboard)
+CONCEPTOS_DEUDA = {
+    'Matricula': 'Matricula',
+    'Pension': 'Pension',
+    'Transporte': 'Transporte',
+    'Sistemas': 'Sistemas',
+    'Asociacion': 'Asociacion',
+    'Otros': 'Otros',
+    'Ludicas': 'Ludicas',
+    'Mpruebas': 'Mpruebas',
+    'Deuda': 'Deuda_Anterior',
+}
+
+
+def _year_bounds(year):
+    """Returns the [start, end) range of a year as ms-epoch timestamps (UTC)."""
+    start = datetime(int(year), 1, 1, tzinfo=timezone.utc)
+    end = datetime(int(year) + 1, 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp() * 1000), int(end.timestamp() * 1000)
+
+
+def _grades_clause(column, grades, params):
+    """Appends the grade names to params and returns the IN clause."""
+    params.extend(grades)
+    return f"{column} IN ({', '.join('?' * len(grades))})"
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+def pagos_detalle_sql(year=None, grades=None, desde_num_pago=None, hasta_num_pago=None):
+    """SELECT over the raw tables with one row per payment line.
+
+    Columns: Anio, Mes ('%Y-%m'), Periodo (yyyymm integer), Nom_grado, Nom_curso, Cod_rubro, Nom_rubro, Valor.
+    Returns (sql, params); `desde_num_pago` is exclusive, `hasta_num_pago` inclusive.
+    """
+    clauses, params = [], []
+    if year is not None:
+        # Rango sobre Fecha (ms) en lugar de strftime para poder usar un índice
+        clauses.append("p.Fecha >= ? AND p.Fecha < ?")
+        params.extend(_year_bounds(year))
+    if grades:
+        clauses.append(_grades_clause('g.Nom_grado', grades, params))
+    if desde_num_pago is not None:
+        clauses.append("p.Num_pago > ?")
+        params.append(int(desde_num_pago))
+    if hasta_num_pago is not None:
+        clauses.append("p.Num_pago <= ?")
+        params.append(int(hasta_num_pago))
+    sql = f"""
+    SELECT
+        CAST(strftime('%Y', p.Fecha / 1000, 'unixepoch') AS INTEGER) AS Anio,
+        strftime('%Y-%m', p.Fecha / 1000, 'unixepoch') AS Mes,
+        CAST(strftime('%Y%m', p.Fecha / 1000, 'unixepoch') AS INTEGER) AS Periodo,
+        g.Nom_grado,
+        c.Nom_curso,
+        d.Cod_rubro,
+        r.Nom_rubro,
+        d.Valor
+    {_PAGOS_FROM}
+    {_where(clauses)}
+    """
+    return sql, params
+
+
+def firma_cartera(conn):
+    """Cheap signature of TBL_Alumnos_deudores used to detect a new snapshot."""
+    filas, max_rowid = conn.execute("SELECT COUNT(*), MAX(rowid) FROM TBL_Alumnos_deudores").fetchone()
+    return f"{filas}:{max_rowid}"
+
+
+# Lo que Rollup_pagos copia de las tablas al agregar: el curso de cada alumno y los
+# nombres de curso, grado y rubro. Si cambian, las filas ya agregadas quedan viejas.
+_FIRMA_ROLLUP_PAGOS = (
+    "SELECT Cod_alumno, Curso FROM Alumno ORDER BY rowid",
+    "SELECT Cod_curso, Nom_curso, Grado FROM Curso ORDER BY rowid",
+    "SELECT Cod_grado, Nom_grado FROM Grados ORDER BY rowid",
+    "SELECT Cod_rubro, Nom_rubro FROM Rubros ORDER BY rowid",
+)
+
+
+def firma_rollup_pagos(conn, watermark):
+    """Signature of the data Rollup_pagos folded up to `watermark`.
+
+    A hash of the student courses and the course/grade/rubro names, plus the
+    count and totals of the Pago and Detalle_pago rows up to the watermark,
+    so course changes and edits or deletes of folded payments are detected.
+    """
+    digest = hashlib.sha1()
+    for consulta in _FIRMA_ROLLUP_PAGOS:
+        for fila in conn.execute(consulta):
+            digest.update(repr(fila).encode())
+    pagos, fechas = conn.execute("SELECT COUNT(*), TOTAL(Fecha) FROM Pago WHERE Num_pago <= ?", (watermark,)).fetchone()
+    lineas, total = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(Valor), 0) FROM Detalle_pago WHERE Num_pago <= ?", (watermark,)
+    ).fetchone()
+    return f"{pagos}:{fechas:.0f}:{lineas}:{total}:{digest.hexdigest()}"
+
+
+def _rollup_estado(conn, tabla):
+    """Returns (watermark, firma) of a rollup table, or None if it was never built."""
+    existe = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (ROLLUP_ESTADO,)
+    ).fetchone()
+    if not existe:
+        return None
+    return conn.execute(
+        f"SELECT Watermark, Firma FROM {ROLLUP_ESTADO} WHERE Tabla = ?", (tabla,)
+    ).fetchone()
+
+
+_firma_rollup_memo = {}
+
+
+def _rollup_pagos_vigente(conn, db_path, estado):
+    """True when Rollup_pagos still matches the tables it was folded from.
+
+    The signature is recomputed once per file state (stat and PRAGMA
+    data_version, as get_data_version()), not on every query.
+    """
+    watermark, firma = estado
+    if firma is None:
+        return False
+    db_path = os.path.abspath(db_path or DB_PATH)
+    with _version_lock:
+        clave = (_file_stat(db_path), _pragma_data_version(db_path), watermark)
+        memo = _firma_rollup_memo.get(db_path)
+        if memo is not None and memo[0] == clave:
+            return memo[1] == firma
+    actual = firma_rollup_pagos(conn, watermark)
+    with _version_lock:
+        _firma_rollup_memo[db_path] = (clave, actual)
+    return actual == firma
+
+
+def _pagos_fuente(conn, year=None, grades=None, desde_num_pago=None, db_path=None):
+    """Filtered payment-line source: rollup plus raw rows above its watermark, or raw rows only.
+
+    The rollup is used only while its signature (firma_rollup_pagos) matches;
+    with `desde_num_pago` only the raw lines of later payments are returned (delta load).
+    """
+    if desde_num_pago is not None:
+        return pagos_detalle_sql(year, grades, desde_num_pago=desde_num_pago)
+    estado = _rollup_estado(conn, ROLLUP_PAGOS)
+    if estado is None or not _rollup_pagos_vigente(conn, db_path, estado):
+        # Sin rollup, o con alumnos que cambiaron de curso o pagos ya agregados que se editaron
+        return pagos_detalle_sql(year, grades)
+    clauses, params = [], []
+    if year is not None:
+        clauses.append("Anio = ?")
+        params.append(int(year))
+    if grades:
+        clauses.append(_grades_clause('Nom_grado', grades, params))
+    delta_sql, delta_params = pagos_detalle_sql(year, grades, desde_num_pago=estado[0])
+    sql = f"""
+    SELECT Anio, Mes, Anio * 100 + CAST(substr(Mes, 6, 2) AS INTEGER) AS Periodo,
+        Nom_grado, Nom_curso, Cod_rubro, Nom_rubro, Valor
+    FROM {ROLLUP_PAGOS}
+    {_where(clauses)}
+    UNION ALL
+    {delta_sql}
+    """
+    return sql, params + delta_params
+
+
+def _run_query(query, params=(), db_path=None):
+    """Runs a parameterized query and returns the result as a DataFrame."""
+    with pooled_connection(db_path) as conn:
+        df = pd.read_sql_query(query, conn, params=list(params))
+    return df
+
+
+def _query_pagos(select, year=None, grades=None, tail="", tail_params=(), desde_num_pago=None, db_path=None):
+    """Aggregates the filtered payment lines: SELECT {select} FROM <fuente> {tail}."""
+    with pooled_connection(db_path) as conn:
+        fuente, params = _pagos_fuente(conn, year, grades, desde_num_pago, db_path)
+        query = f"SELECT {select} FROM ({fuente}) {tail}"
+        df = pd.read_sql_query(query, conn, params=params + list(tail_params))
     return df
+
+
+def query_anios(db_path=None):
+    """Returns the distinct payment years, most recent first."""
+    query = """
+    SELECT DISTINCT CAST(strftime('%Y', Fecha / 1000, 'unixepoch') AS INTEGER) AS Año
+    FROM Pago
+    ORDER BY 1 DESC
+    """
+    return _run_query(query, db_path=db_path)['Año'].tolist()
+
+
+def query_grados(db_path=None):
+    """Returns the sorted grade names that have students assigned."""
+    query = """
+    SELECT DISTINCT g.Nom_grado
+    FROM Alumno a
+    JOIN Curso c ON a.Curso = c.Cod_curso
+    JOIN Grados g ON c.Grado = g.Cod_grado
+    WHERE g.Nom_grado IS NOT NULL
+    """
+    return sorted(_run_query(query, db_path=db_path)['Nom_grado'].tolist())
+
+
+def query_pagos_resumen(desde_num_pago=None, db_path=None):
+    """Payment totals at period (yyyymm)/grado/curso/rubro grain for every year and grade."""
+    return _query_pagos(
+        "Periodo, Nom_grado, Nom_curso, Cod_rubro, SUM(Valor) AS Valor", None, None,
+        "GROUP BY Periodo, Nom_grado, Nom_curso, Cod_rubro",
+        desde_num_pago=desde_num_pago, db_path=db_path,
+    )
+
+
+def query_alumnos_activos_por_curso(db_path=None):
+    """Number of active students per course (Nom_curso is NULL for students without a course)."""
+    query = """
+    SELECT c.Nom_curso, COUNT(*) AS Num_Alumnos
+    FROM Alumno a
+    LEFT JOIN Curso c ON a.Curso = c.Cod_curso
+    WHERE a.Activo = 1
+    GROUP BY c.Nom_curso
+    """
+    return _run_query(query, db_path=db_path)
+
+
+# --- Libro de cartera por alumno ---
+# Cartera_alumnos guarda los cargos del año lectivo vigente (Colegio.añoLectivo)
+# por alumno, mes (0 = matrícula) y concepto; los pagos se asignan a un concepto
+# por los dos primeros dígitos del Cod_rubro (Item_rubro). La matrícula pagada
+# desde MES_INICIO_MATRICULA se abona al año lectivo siguiente.
+CONCEPTOS_CARGO = {
+    'Matricula': ('01',),
+    'Papeleria': ('02',),
+    'Asociacion': ('03', '13'),
+    'Materiales': ('04',),
+    'Pension': ('05',),
+    'Transporte': ('06',),
+    'Sistemas': ('07',),
+    'Otros': ('08',),
+    'Modulos': ('09',),
+    'Ludicas': ('16',),
+    'Mpruebas': ('17',),
+}
+MES_INICIO_MATRICULA = 10
+
+_CONCEPTO_RUBRO_SQL = "CASE substr(d.Cod_rubro, 1, 2) {} END".format(' '.join(
+    f"WHEN '{item}' THEN '{concepto}'" for concepto, items in CONCEPTOS_CARGO.items() for item in items
+))
+
+
+def _existe_tabla(conn, tabla):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone() is not None
+
+
+def firma_cargos(conn):
+    """Cheap signature of Cartera_alumnos and the school year; None when the table does not exist."""
+    if not _existe_tabla(conn, 'Cartera_alumnos'):
+        return None
+    filas, max_rowid = conn.execute("SELECT COUNT(*), MAX(rowid) FROM Cartera_alumnos").fetchone()
+    anio = _anio_lectivo_sql(conn)
+    return f"{filas}:{max_rowid}:{conn.execute(f'SELECT {anio}').fetchone()[0]}"
+
+
+def _anio_lectivo_sql(conn):
+    """SQL expression of the current school year (Colegio.añoLectivo, or the current year without it)."""
+    actual = "CAST(strftime('%Y', 'now') AS INTEGER)"
+    if not _existe_tabla(conn, 'Colegio'):
+        return actual
+    return f"COALESCE((SELECT MAX(añoLectivo) FROM Colegio), {actual})"
+
+
+def query_cargos_alumno(cod_alumno=None, db_path=None):
+    """Charges per student, school year, month and concept from Cartera_alumnos (only positive ones).
+
+    With `cod_alumno` only that student's charges are read.
+    """
+    columnas = ['Cod_alumno', 'Grado', 'Anio', 'Mes', 'Concepto', 'Cargo']
+    with pooled_connection(db_path) as conn:
+        if not _existe_tabla(conn, 'Cartera_alumnos'):
+            return pd.DataFrame(columns=columnas)
+        # Un solo recorrido de la tabla ancha; el paso a filas por concepto se hace en pandas
+        conceptos = ', '.join(f"k.{concepto}" for concepto in CONCEPTOS_CARGO)
+        params = []
+        alumno = ""
+        if cod_alumno is not None:
+            alumno = "AND k.Cod_alumno = ?"
+            params.append(str(cod_alumno))
+        query = f"""
+        SELECT k.Cod_alumno, g.Nom_grado AS Grado, {_anio_lectivo_sql(conn)} AS Anio, k.Mes, {conceptos}
+        FROM Cartera_alumnos k
+        LEFT JOIN Alumno a ON k.Cod_alumno = a.Cod_alumno
+        LEFT JOIN Curso c ON a.Curso = c.Cod_curso
+        LEFT JOIN Grados g ON c.Grado = g.Cod_grado
+        WHERE ({' OR '.join(f"k.{concepto} > 0" for concepto in CONCEPTOS_CARGO)}) {alumno}
+        """
+        ancho = pd.read_sql_query(query, conn, params=params)
+    largo = ancho.melt(id_vars=columnas[:4], value_vars=list(CONCEPTOS_CARGO), var_name='Concepto', value_name='Cargo')
+    return largo[largo['Cargo'] > 0].astype({'Cargo': 'int64'}).reset_index(drop=True)[columnas]
+
+
+def query_abonos_alumno(desde_num_pago=None, cod_alumno=None, db_path=None):
+    """Payments per student, school year and concept (only rubros of a charged concept).
+
+    With `desde_num_pago` only later payments are summed (delta load); with
+    `cod_alumno` only that student's payments.
+    """
+    params = []
+    where = ""
+    if desde_num_pago is not None:
+        where = "AND p.Num_pago > ?"
+        params.append(int(desde_num_pago))
+    if cod_alumno is not None:
+        where += " AND p.Cod_alumno = ?"
+        params.append(str(cod_alumno))
+    query = f"""
+    SELECT Cod_alumno, Anio, Concepto, SUM(Valor) AS Valor
+    FROM (
+        SELECT
+            p.Cod_alumno,
+            CAST(strftime('%Y', p.Fecha / 1000, 'unixepoch') AS INTEGER)
+                + (CASE WHEN substr(d.Cod_rubro, 1, 2) IN ({', '.join(f"'{i}'" for i in CONCEPTOS_CARGO['Matricula'])})
+                        AND CAST(strftime('%m', p.Fecha / 1000, 'unixepoch') AS INTEGER) >= {MES_INICIO_MATRICULA}
+                   THEN 1 ELSE 0 END) AS Anio,
+            {_CONCEPTO_RUBRO_SQL} AS Concepto,
+            d.Valor
+        FROM Pago p
+        JOIN Detalle_pago d ON p.Num_pago = d.Num_pago
+        WHERE d.Valor <> 0 {where}
+    )
+    WHERE Concepto IS NOT NULL
+    GROUP BY Cod_alumno, Anio, Concepto
+    """
+    return _run_query(query, params, db_path=db_path)
+
+
+# --- Búsqueda de Alumnos e Historiales ---
+# maintenance.py indexa el código y el nombre de cada alumno en una tabla FTS5
+# (BUSQUEDA_ALUMNOS) con índices de prefijo y sin tildes; la búsqueda la usa
+# mientras su firma coincida con la de Alumno y, si no existe o quedó vieja,
+# recorre Alumno con LIKE. Los historiales de un alumno se paginan por clave
+# (keyset): cada página sigue a la última fila de la anterior por un índice
+# que empieza en Cod_alumno, sin OFFSET, así que cuesta lo mismo la primera
+# página que la última y no depende del tamaño de Pago o Cartera_alumnos.
+
+BUSQUEDA_ALUMNOS = 'Alumno_busqueda'
+PAGINA_HISTORIAL = 50
+
+
+def alumnos_busqueda_sql():
+    """SELECT of the indexed columns of every student (Cod_alumno, Nombre), source of BUSQUEDA_ALUMNOS."""
+    return f"SELECT a.Cod_alumno, {_NOMBRE_ALUMNO_SQL} AS Nombre FROM Alumno a WHERE a.Cod_alumno IS NOT NULL"
+
+
+def firma_alumnos(conn):
+    """Cheap signature of Alumno used to detect a stale search index."""
+    filas, max_rowid = conn.execute("SELECT COUNT(*), MAX(rowid) FROM Alumno").fetchone()
+    return f"{filas}:{max_rowid}"
+
+
+def _firma_alumnos_version(db_path=None):
+    # La misma firma, tomada de la versión de datos memoizada: buscar no cuenta Alumno cada vez
+    filas, max_rowid = dict(get_data_version(db_path))['dimensiones'][_TABLAS_DIMENSION.index('Alumno')]
+    return f"{filas}:{max_rowid}"
+
+
+def _terminos(texto):
+    # Letras y dígitos; sin comillas, comodines de LIKE ni operadores de FTS5
+    return re.findall(r"[^\W_]+", str(texto or ''))
+
+
+def _plegar(texto):
+    # Sin tildes ni mayúsculas, como remove_diacritics de FTS5 (PEÑA y Peña -> pena)
+    if texto is None:
+        return None
+    descompuesto = unicodedata.normalize('NFKD', texto)
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def buscar_alumnos(texto, limite=20, db_path=None):
+    """Students whose code or name words start with every term of `texto`, best matches first.
+
+    Columns: Cod_alumno, Nombre, Nom_curso, Nom_grado, Activo.
+    """
+    columnas = ['Cod_alumno', 'Nombre', 'Nom_curso', 'Nom_grado', 'Activo']
+    terminos = _terminos(texto)
+    if not terminos:
+        return pd.DataFrame(columns=columnas)
+    with pooled_connection(db_path) as conn:
+        estado = _rollup_estado(conn, BUSQUEDA_ALUMNOS)
+        if estado is not None and estado[1] == _firma_alumnos_version(db_path):
+            # "termino"* es una consulta de prefijo; varios términos deben estar todos
+            fuente = f"""
+            SELECT b.Cod_alumno, b.Nombre, b.rank AS Orden
+            FROM {BUSQUEDA_ALUMNOS} b
+            WHERE {BUSQUEDA_ALUMNOS} MATCH ?
+            ORDER BY b.rank
+            LIMIT ?
+            """
+            params = [' '.join(f'"{t}"*' for t in terminos), int(limite)]
+        else:
+            # Sin índice se recorre Alumno plegando nombre y términos igual que el índice
+            # (LOWER de SQLite solo pliega ASCII: plegar() se registra en get_connection)
+            clauses, params = [], []
+            for termino in map(_plegar, terminos):
+                clauses.append(f"(a.Cod_alumno LIKE ? OR ' ' || plegar({_NOMBRE_ALUMNO_SQL}) LIKE ?)")
+                params.extend([f"{termino}%", f"% {termino}%"])
+            fuente = f"""
+            SELECT a.Cod_alumno, {_NOMBRE_ALUMNO_SQL} AS Nombre, 0 AS Orden
+            FROM Alumno a
+            {_where(clauses)}
+            ORDER BY Nombre
+            LIMIT ?
+            """
+            params.append(int(limite))
+        query = f"""
+        SELECT b.Cod_alumno, b.Nombre, c.Nom_curso, g.Nom_grado, a.Activo
+        FROM ({fuente}) b
+        LEFT JOIN Alumno a ON a.Cod_alumno = b.Cod_alumno
+        LEFT JOIN Curso c ON a.Curso = c.Cod_curso
+        LEFT JOIN Grados g ON c.Grado = g.Cod_grado
+        ORDER BY b.Orden, b.Nombre
+        """
+        return pd.read_sql_query(query, conn, params=params)[columnas]
+
+
+def historial_pagos(cod_alumno, despues=None, limite=PAGINA_HISTORIAL, db_path=None):
+    """One page of a student's payments, newest first, one row per payment line.
+
+    Columns: Num_pago, Fecha, Cod_rubro, Nom_rubro, Valor. `despues` is the
+    cursor returned with the previous page; returns (page, cursor of the
+    next page or None on the last one).
+    """
+    params = [str(cod_alumno)]
+    siguiente = ""
+    if despues is not None:
+        siguiente = "AND (COALESCE(p.Fecha, 0), p.Num_pago) < (?, ?)"
+        params.extend(despues)
+    # Un pago de más para saber si hay otra página sin contar las restantes.
+    # Los pagos sin fecha ordenan como fecha 0 (al final), igual en el orden y en el cursor.
+    params.append(int(limite) + 1)
+    query = f"""
+    WITH pagina AS (
+        SELECT p.Num_pago, p.Fecha, COALESCE(p.Fecha, 0) AS Clave
+        FROM Pago p
+        WHERE p.Cod_alumno = ? {siguiente}
+        ORDER BY COALESCE(p.Fecha, 0) DESC, p.Num_pago DESC
+        LIMIT ?
+    )
+    SELECT pg.Num_pago, pg.Fecha, pg.Clave, d.Cod_rubro, r.Nom_rubro, d.Valor
+    FROM pagina pg
+    LEFT JOIN Detalle_pago d ON d.Num_pago = pg.Num_pago
+    LEFT JOIN Rubros r ON d.Cod_rubro = r.Cod_rubro
+    ORDER BY pg.Clave DESC, pg.Num_pago DESC
+    """
+    df = _run_query(query, params, db_path=db_path)
+    pagos = df[['Clave', 'Num_pago']].drop_duplicates()
+    cursor = None
+    if len(pagos) > limite:
+        ultimo = pagos.iloc[int(limite) - 1]
+        cursor = (int(ultimo['Clave']), int(ultimo['Num_pago']))
+        df = df[df['Num_pago'].isin(pagos['Num_pago'].iloc[:int(limite)])]
+    df = df.drop(columns='Clave').assign(Fecha=pd.to_datetime(df['Fecha'], unit='ms', errors='coerce'))
+    return df.reset_index(drop=True), cursor
+
+
+def historial_cargos(cod_alumno, despues=None, limite=PAGINA_HISTORIAL, db_path=None):
+    """One page of a student's monthly charges from Cartera_alumnos, by month, one row per month and concept.
+
+    Columns: Mes, Concepto, Cargo (only positive ones). Paged like historial_pagos().
+    """
+    columnas = ['Mes', 'Concepto', 'Cargo']
+    with pooled_connection(db_path) as conn:
+        if not _existe_tabla(conn, 'Cartera_alumnos'):
+            return pd.DataFrame(columns=columnas), None
+        params = [str(cod_alumno)]
+        siguiente = ""
+        if despues is not None:
+            siguiente = "AND (k.Mes, k.rowid) > (?, ?)"
+            params.extend(despues)
+        params.append(int(limite) + 1)
+        conceptos = ', '.join(f"k.{concepto}" for concepto in CONCEPTOS_CARGO)
+        query = f"""
+        SELECT k.rowid AS Fila, k.Mes, {conceptos}
+        FROM Cartera_alumnos k
+        WHERE k.Cod_alumno = ? {siguiente}
+        ORDER BY k.Mes, k.rowid
+        LIMIT ?
+        """
+        ancho = pd.read_sql_query(query, conn, params=params)
+    cursor = None
+    if len(ancho) > limite:
+        ancho = ancho.iloc[:int(limite)]
+        cursor = (int(ancho['Mes'].iloc[-1]), int(ancho['Fila'].iloc[-1]))
+    largo = ancho.melt(id_vars=['Fila', 'Mes'], value_vars=list(CONCEPTOS_CARGO), var_name='Concepto', value_name='Cargo')
+    largo = largo[largo['Cargo'] > 0].sort_values(['Mes', 'Fila'], kind='stable')
+    return largo.astype({'Cargo': 'int64'}).reset_index(drop=True)[columnas], cursor
+
+
+# --- Versión de Datos ---
+# Firma del estado de la base para invalidar cachés sin reiniciar la app.
+# Solo se recalcula cuando cambia el archivo (mtime/tamaño, incluido el -wal)
+# o el PRAGMA data_version de una conexión dedicada (commits de otros procesos).
+
+_version_memo = {}
+_version_conns = {}
+_version_lock = threading.Lock()
+
+# Tablas de dimensión: un cambio en ellas obliga a recargar todo lo que las usa
+_TABLAS_DIMENSION = ('Alumno', 'Curso', 'Grados', 'Rubros')
+
+
+def _file_stat(db_path):
+    stat = []
+    for path in (db_path, db_path + '-wal'):
+        if os.path.exists(path):
+            st_ = os.stat(path)
+            stat.append((st_.st_mtime_ns, st_.st_size))
+    return tuple(stat)
+
+
+def _pragma_data_version(db_path):
+    """PRAGMA data_version on a long-lived connection (call with _version_lock held)."""
+    file_id = _file_id(db_path)
+    entry = _version_conns.get(db_path)
+    if entry is None or entry[0] != file_id:
+        if entry is not None:
+            entry[1].close()
+        entry = _version_conns[db_path] = (file_id, get_connection(db_path))
+    return entry[1].execute("PRAGMA data_version").fetchone()[0]
+
+
+def _firma_pagos(conn):
+    """(max Num_pago, Pago rows, Detalle_pago rows, total Valor)."""
+    max_pago, filas_pago = conn.execute("SELECT COALESCE(MAX(Num_pago), 0), COUNT(*) FROM Pago").fetchone()
+    filas_detalle, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(Valor), 0) FROM Detalle_pago").fetchone()
+    return (max_pago, filas_pago, filas_detalle, total)
+
+
+def _firma_dimensiones(conn):
+    firmas = []
+    for tabla in _TABLAS_DIMENSION:
+        firmas.append(conn.execute(f"SELECT COUNT(*), MAX(rowid) FROM {tabla}").fetchone())
+    return tuple(firmas)
+
+
+def get_data_version(db_path=None):
+    """Returns the change state of the database as a hashable token.
+
+    The token is a tuple of (source, signature) pairs for 'pagos',
+    'dimensiones', 'cartera' and 'cargos'; it changes whenever any of them changes.
+    """
+    db_path = os.path.abspath(db_path or DB_PATH)
+    if not os.path.exists(db_path):
+        raise FileNotFoundError(f"Database file not found at {db_path}")
+    with _version_lock:
+        estado = (_file_stat(db_path), _pragma_data_version(db_path))
+        if db_path in _version_memo and _version_memo[db_path][0] == estado:
+            return _version_memo[db_path][1]
+    with pooled_connection(db_path) as conn:
+        version = (
+            ('pagos', _firma_pagos(conn)),
+            ('dimensiones', _firma_dimensiones(conn)),
+            ('cartera', firma_cartera(conn)),
+            ('cargos', firma_cargos(conn)),
+        )
+    with _version_lock:
+        _version_memo[db_path] = (estado, version)
+    return version
+
+
+@functools.lru_cache(maxsize=32)
+def pagos_nuevos_desde(anterior, actual, db_path=None):
+    """Returns the Num_pago watermark to delta-load from, or None if a full reload is needed.
+
+    A delta is only valid when nothing but new payments arrived: dimensions,
+    debt and charges are unchanged and every added row/value lies above the old max Num_pago.
+    """
+    anterior, actual = dict(anterior), dict(actual)
+    if {k: v for k, v in anterior.items() if k != 'pagos'} != {k: v for k, v in actual.items() if k != 'pagos'}:
+        return None
+    max_ant, pagos_ant, detalle_ant, total_ant = anterior['pagos']
+    max_act, pagos_act, detalle_act, total_act = actual['pagos']
+    if max_act <= max_ant:
+        return None
+    with pooled_connection(db_path) as conn:
+        nuevos_pago = conn.execute("SELECT COUNT(*) FROM Pago WHERE Num_pago > ?", (max_ant,)).fetchone()[0]
+        nuevos_detalle, nuevo_total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(Valor), 0) FROM Detalle_pago WHERE Num_pago > ?", (max_ant,)
+        ).fetchone()
+    if (pagos_act - pagos_ant, detalle_act - detalle_ant, total_act - total_ant) != (nuevos_pago, nuevos_detalle, nuevo_total):
+        return None
+    return max_ant
@@ -0,0 +1,388 @@
+import argparse
+import inspect
+import json
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import db_utils
+import maintenance
+
+# Diagnóstico de una base SISCAR: por qué una carga es lenta. Reporta por tabla
+# filas, tamaño en disco (dbstat), nulos y cardinalidad por columna (una sola
+# pasada de SQL, sobre una muestra en tablas grandes) e índices existentes; luego
+# ejecuta cada consulta de db_utils que usan el dashboard y el informe
+# (CONSULTAS) capturando las sentencias que emite, corre
+# EXPLAIN QUERY PLAN sobre ellas y marca recorridos completos e índices
+# automáticos, con los índices sugeridos. La salida JSON sirve para comparar
+# diagnósticos en el tiempo.
+#
+#   python diagnostico.py --db ruta/siscar_estadistica.db
+#   python diagnostico.py --db copia.db --json diagnostico_2025-06.json
+
+MUESTRA_FILAS = 200000
+# Consultas de db_utils que corren el dashboard y reporte.py (vía federacion.py)
+CONSULTAS = (
+    'query_anios', 'query_grados', 'query_pagos_resumen', 'query_alumnos_activos_por_curso',
+    'query_cargos_alumno', 'query_abonos_alumno',
+)
+TIMEOUT_CONSULTA = 30
+
+# Palabras que pueden seguir al nombre de una tabla y no son su alias
+_NO_ALIAS = {
+    'WHERE', 'ON', 'USING', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'NATURAL', 'JOIN',
+    'GROUP', 'ORDER', 'LIMIT', 'UNION', 'EXCEPT', 'INTERSECT', 'HAVING', 'WINDOW',
+}
+_TABLA_ALIAS = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+_PASO_PLAN = re.compile(r'^(SCAN|SEARCH|BLOOM FILTER ON)\s+"?(\w+)"?(?:\s+(.*))?$')
+
+
+def _tablas(conn):
+    return [fila[0] for fila in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )]
+
+
+def _columnas(conn, tabla):
+    return [(fila[1], fila[2]) for fila in conn.execute(f'PRAGMA table_info("{tabla}")')]
+
+
+def tamanos(conn):
+    """{table: {'bytes', 'bytes_indices'}} from dbstat; None when SQLite was built without it."""
+    try:
+        paginas = conn.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name").fetchall()
+    except sqlite3.OperationalError:
+        return None
+    tabla_de = dict(conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type IN ('table', 'index')"))
+    resultado = {}
+    for nombre, bytes_ in paginas:
+        tabla = tabla_de.get(nombre, nombre)
+        entrada = resultado.setdefault(tabla, {'bytes': 0, 'bytes_indices': 0})
+        entrada['bytes' if nombre == tabla else 'bytes_indices'] += bytes_
+    return resultado
+
+
+def _tiene_rowid(conn, tabla):
+    try:
+        conn.execute(f'SELECT rowid FROM "{tabla}" LIMIT 1')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def estadisticas_columnas(conn, tabla, filas, muestra=MUESTRA_FILAS):
+    """Null count and distinct values of every column in one pass, over a sample of large tables.
+
+    The sample takes every k-th rowid (or the first `muestra` rows of a
+    WITHOUT ROWID table); distinct counts on a sample are a lower bound.
+    """
+    columnas = _columnas(conn, tabla)
+    if not columnas:
+        return {'filas_leidas': 0, 'columnas': []}
+    fuente = f'"{tabla}"'
+    if muestra and filas > muestra:
+        if _tiene_rowid(conn, tabla):
+            fuente = f'(SELECT * FROM "{tabla}" WHERE rowid % {math.ceil(filas / muestra)} = 0)'
+        else:
+            fuente = f'(SELECT * FROM "{tabla}" LIMIT {int(muestra)})'
+    agregados = ', '.join(f'COUNT("{c}"), COUNT(DISTINCT "{c}")' for c, _ in columnas)
+    fila = conn.execute(f"SELECT COUNT(*), {agregados} FROM {fuente}").fetchone()
+    leidas = fila[0]
+    resultado = []
+    for i, (columna, tipo) in enumerate(columnas):
+        no_nulos, distintos = fila[1 + 2 * i], fila[2 + 2 * i]
+        resultado.append({
+            'columna': columna,
+            'tipo': tipo,
+            'nulos': leidas - no_nulos,
+            'pct_nulos': round((leidas - no_nulos) / leidas * 100, 2) if leidas else None,
+            'distintos': distintos,
+        })
+    return {'filas_leidas': leidas, 'columnas': resultado}
+
+
+def indices(conn):
+    """Existing indexes as [{'nombre', 'tabla', 'columnas', 'unico', 'origen'}]."""
+    resultado = []
+    for tabla in _tablas(conn):
+        for _, nombre, unico, origen, _ in conn.execute(f'PRAGMA index_list("{tabla}")'):
+            columnas = [fila[2] for fila in conn.execute(f'PRAGMA index_info("{nombre}")')]
+            resultado.append({'nombre': nombre, 'tabla': tabla, 'columnas': columnas, 'unico': bool(unico), 'origen': origen})
+    return resultado
+
+
+def _alias(sql):
+    """{alias or table name: table} of the FROM/JOIN clauses of a statement."""
+    alias = {}
+    for tabla, nombre in _TABLA_ALIAS.findall(sql):
+        alias[tabla] = tabla
+        if nombre and nombre.upper() not in _NO_ALIAS:
+            alias[nombre] = tabla
+    return alias
+
+
+def hallazgos(plan, sql, filas):
+    """Full scans, automatic indexes and temporary b-trees of a query plan, with a suggested index for the automatic ones."""
+    alias = _alias(sql)
+    resultado = []
+    for detalle in plan:
+        if detalle.startswith('USE TEMP B-TREE'):
+            resultado.append({'tipo': 'btree_temporal', 'tabla': None, 'filas': None, 'detalle': detalle, 'sugerencia': None})
+            continue
+        paso = _PASO_PLAN.match(detalle)
+        if paso is None:
+            continue
+        accion, nombre, resto = paso.group(1), paso.group(2), paso.group(3) or ''
+        tabla = alias.get(nombre, nombre)
+        if tabla not in filas:
+            # Subconsultas, CTE y co-rutinas no son tablas de la base
+            continue
+        if accion == 'BLOOM FILTER ON':
+            # Filtro en memoria para un join; no implica que falte un índice
+            resultado.append({'tipo': 'filtro_bloom', 'tabla': tabla, 'filas': filas[tabla], 'detalle': detalle, 'sugerencia': None})
+        elif 'AUTOMATIC' in resto:
+            # SQLite arma un índice temporal en cada ejecución: sus columnas son el índice que falta
+            columnas = re.findall(r'(\w+)[=<>]', resto)
+            resultado.append({'tipo': 'indice_automatico', 'tabla': tabla, 'filas': filas[tabla], 'detalle': detalle,
+                              'sugerencia': columnas or None})
+        elif accion == 'SCAN' and 'INDEX' not in resto:
+            resultado.append({'tipo': 'scan_completo', 'tabla': tabla, 'filas': filas[tabla], 'detalle': detalle, 'sugerencia': None})
+    return resultado
+
+
+def _consultas(db_path, conn):
+    """(name, function()) for every query in CONSULTAS, plus its filtered and delta-load variants."""
+    max_pago = conn.execute("SELECT MAX(Num_pago) FROM Pago").fetchone()[0] if 'Pago' in _tablas(conn) else None
+    consultas = [
+        ('get_data_version', lambda: db_utils.get_data_version(db_path)),
+        ('categorias_rubro', lambda: db_utils.categorias_rubro(db_path)),
+        ('nombre_colegio', lambda: db_utils.nombre_colegio(db_path)),
+    ]
+    if max_pago:
+        def pagos_nuevos_desde():
+            # Un pago "nuevo" respecto de una versión anterior simulada: recorre la ruta de carga incremental
+            version = db_utils.get_data_version(db_path)
+            anterior = tuple((fuente, (max_pago - 1, *firma[1:]) if fuente == 'pagos' else firma) for fuente, firma in version)
+            return db_utils.pagos_nuevos_desde.__wrapped__(anterior, version, db_path)
+        consultas.append(('pagos_nuevos_desde', pagos_nuevos_desde))
+    # Ficha de alumno: búsqueda por prefijo y la segunda página de sus historiales
+    alumno = conn.execute(
+        "SELECT Cod_alumno FROM Pago GROUP BY Cod_alumno ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone() if 'Pago' in _tablas(conn) else None
+    if alumno:
+        alumno = alumno[0]
+        nombre = db_utils.buscar_alumnos(alumno, 1, db_path)['Nombre']
+        if not nombre.empty and nombre.iloc[0]:
+            prefijo = nombre.iloc[0].split()[0][:3]
+            consultas.append((f"buscar_alumnos({prefijo!r})", lambda: db_utils.buscar_alumnos(prefijo, db_path=db_path)))
+        for funcion in (db_utils.historial_pagos, db_utils.historial_cargos):
+            def pagina(f=funcion):
+                _, cursor = f(alumno, limite=1, db_path=db_path)
+                return f(alumno, cursor, limite=1, db_path=db_path)
+            consultas.append((f"{funcion.__name__}({alumno!r})", pagina))
+    for nombre in CONSULTAS:
+        funcion = getattr(db_utils, nombre)
+        parametros = inspect.signature(funcion).parameters
+        consultas.append((nombre, lambda f=funcion: f(db_path=db_path)))
+        if 'cod_alumno' in parametros and alumno:
+            consultas.append((f"{nombre}(cod_alumno={alumno!r})", lambda f=funcion: f(cod_alumno=alumno, db_path=db_path)))
+        if 'desde_num_pago' in parametros and max_pago:
+            consultas.append((f"{nombre}(desde_num_pago={max_pago - 1})", lambda f=funcion: f(desde_num_pago=max_pago - 1, db_path=db_path)))
+    return consultas
+
+
+def planes(db_path, conn, filas, timeout=TIMEOUT_CONSULTA):
+    """Runs every diagnosed query, capturing its statements, and returns their timings, plans and findings.
+
+    A query that exceeds `timeout` seconds is interrupted; its statements
+    were already captured, so its plan is reported anyway.
+    """
+    resultado = []
+    for nombre, funcion in _consultas(db_path, conn):
+        estado = 'ok'
+        inicio = time.perf_counter()
+        with db_utils.capturar_sentencias() as sentencias:
+            try:
+                with db_utils.limite_tiempo(timeout):
+                    funcion()
+            except TimeoutError:
+                estado = 'timeout'
+            except Exception as e:
+                estado = f"error: {type(e).__name__}: {e}"
+        segundos = time.perf_counter() - inicio
+        detalle = []
+        for sql in dict.fromkeys(sentencias):
+            if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            plan = [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            detalle.append({'sql': ' '.join(sql.split()), 'plan': plan, 'hallazgos': hallazgos(plan, sql, filas)})
+        resultado.append({'consulta': nombre, 'estado': estado, 'segundos': round(segundos, 4), 'sentencias': detalle})
+    return resultado
+
+
+def _columnas_indice(columnas):
+    # Comas de primer nivel: una expresión como COALESCE(Fecha, 0) es una sola clave y se deja entera
+    claves = [c.strip() for c in re.split(r',(?![^()]*\))', columnas)]
+    return [(c if '(' in c else c.split()[0].strip('"')).lower() for c in claves]
+
+
+def sugerencias(resultado_planes, existentes, filas):
+    """Indexes to create, as [{'sql', 'origen', 'consultas'}].
+
+    The automatic indexes seen in the plans, resolved to the maintenance.py
+    index that would replace them when there is one (same table, the
+    automatic columns as its leading columns); then the rest of the
+    maintenance.py indexes missing from the file.
+    """
+    mantenimiento = [(nombre, tabla, _columnas_indice(columnas), columnas) for nombre, tabla, columnas in maintenance.INDICES]
+    nombres = {indice['nombre'] for indice in existentes}
+    cubiertas = {(indice['tabla'], tuple(str(c).lower() for c in indice['columnas'])) for indice in existentes}
+    sugeridas = {}
+    for consulta in resultado_planes:
+        for sentencia in consulta['sentencias']:
+            for hallazgo in sentencia['hallazgos']:
+                columnas = hallazgo['sugerencia']
+                if not columnas:
+                    continue
+                tabla, claves = hallazgo['tabla'], [c.lower() for c in columnas]
+                if any(t == tabla and cols[:len(claves)] == tuple(claves) for t, cols in cubiertas):
+                    # Ya hay un índice con esas columnas al frente: falta ANALYZE o el planificador prefiere no usarlo
+                    continue
+                sql, origen = None, 'plan'
+                for nombre, tabla_m, claves_m, columnas_m in mantenimiento:
+                    if tabla_m == tabla and claves_m[:len(claves)] == claves:
+                        sql, origen = f'CREATE INDEX "{nombre}" ON "{tabla}" ({columnas_m})', 'maintenance.py'
+                        break
+                if sql is None:
+                    sql = f'CREATE INDEX "idx_{tabla.lower()}_{"_".join(claves)}" ON "{tabla}" ({", ".join(columnas)})'
+                sugeridas.setdefault(sql, (origen, set()))[1].add(consulta['consulta'])
+    for nombre, tabla, _, columnas in mantenimiento:
+        sql = f'CREATE INDEX "{nombre}" ON "{tabla}" ({columnas})'
+        if nombre not in nombres and tabla in filas and sql not in sugeridas:
+            sugeridas[sql] = ('maintenance.py', set())
+    return [{'sql': sql, 'origen': origen, 'consultas': sorted(consultas)} for sql, (origen, consultas) in sugeridas.items()]
+
+
+def diagnosticar(db_path, muestra=MUESTRA_FILAS, timeout=TIMEOUT_CONSULTA, consultas=True):
+    """Full diagnostics of one database as a JSON-serializable dict."""
+    db_path = os.path.abspath(db_path)
+    conn = db_utils.get_connection(db_path)
+    try:
+        inicio = time.perf_counter()
+        filas = {tabla: conn.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0] for tabla in _tablas(conn)}
+        bytes_tabla = tamanos(conn)
+        tablas = []
+        for tabla, n in filas.items():
+            tablas.append({
+                'tabla': tabla,
+                'filas': n,
+                **((bytes_tabla or {}).get(tabla, {'bytes': None, 'bytes_indices': None})),
+                **estadisticas_columnas(conn, tabla, n, muestra),
+            })
+        existentes = indices(conn)
+        resultado_planes = planes(db_path, conn, filas, timeout) if consultas else []
+        return {
+            'db': db_path,
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'sqlite': sqlite3.sqlite_version,
+            'bytes_archivo': os.path.getsize(db_path),
+            'dbstat': bytes_tabla is not None,
+            'analyze': 'sqlite_stat1' in {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master")},
+            'muestra_filas': muestra,
+            'tablas': tablas,
+            'indices': existentes,
+            'consultas': resultado_planes,
+            'sugerencias': sugerencias(resultado_planes, existentes, filas),
+            'segundos': round(time.perf_counter() - inicio, 3),
+        }
+    finally:
+        conn.close()
+
+
+def _mb(bytes_):
+    return '-' if bytes_ is None else f"{bytes_ / 1048576:.2f} MB"
+
+
+def imprimir(diag, salida=sys.stdout):
+    """Human-readable report of diagnosticar()."""
+    def p(texto=''):
+        print(texto, file=salida)
+
+    p(f"Base: {diag['db']} ({_mb(diag['bytes_archivo'])}, SQLite {diag['sqlite']})")
+    if not diag['dbstat']:
+        p("  dbstat no disponible en este SQLite: sin tamaños por tabla")
+    if not diag['analyze']:
+        p("  Sin estadísticas del planificador (sqlite_stat1): ejecutar maintenance.py corre ANALYZE")
+
+    p("\n== Tablas ==")
+    p(f"{'Tabla':<28}{'Filas':>12}{'Datos':>12}{'Índices':>12}  Muestra")
+    for t in diag['tablas']:
+        muestra = '' if t['filas_leidas'] == t['filas'] else f"{t['filas_leidas']:,} filas"
+        p(f"{t['tabla']:<28}{t['filas']:>12,}{_mb(t['bytes']):>12}{_mb(t['bytes_indices']):>12}  {muestra}")
+
+    p("\n== Columnas (nulos / distintos) ==")
+    for t in diag['tablas']:
+        if not t['columnas'] or not t['filas']:
+            continue
+        p(f"{t['tabla']}:")
+        for c in t['columnas']:
+            p(f"  {c['columna']:<26}{c['tipo'] or '-':<10}{c['pct_nulos']:>7.1f}% nulos {c['distintos']:>10,} distintos")
+
+    p("\n== Índices ==")
+    if not diag['indices']:
+        p("  (ninguno)")
+    for i in diag['indices']:
+        p(f"  {i['nombre']:<34} {i['tabla']}({', '.join(map(str, i['columnas']))}){' UNIQUE' if i['unico'] else ''}")
+
+    if diag['consultas']:
+        p("\n== Consultas de db_utils ==")
+        p("  (SCAN: recorrido completo; AUTO: índice automático armado en cada ejecución)")
+        for c in diag['consultas']:
+            p(f"  {c['consulta']:<64}{c['segundos']:>9.3f}s  {c['estado']}")
+            for tipo, marca in (('scan_completo', 'SCAN'), ('indice_automatico', 'AUTO')):
+                tablas = dict.fromkeys(
+                    f"{h['tabla']}({', '.join(h['sugerencia'])})" if h['sugerencia'] else h['tabla']
+                    for s in c['sentencias'] for h in s['hallazgos'] if h['tipo'] == tipo
+                )
+                if tablas:
+                    p(f"      {marca}: {', '.join(tablas)}")
+
+    p("\n== Índices sugeridos ==")
+    if not diag['sugerencias']:
+        p("  (ninguno)")
+    for s in diag['sugerencias']:
+        uso = f"{len(s['consultas'])} consultas" if s['consultas'] else "sin uso en los planes"
+        p(f"  {s['sql']};  -- {s['origen']}, {uso}")
+    p(f"\nDiagnóstico en {diag['segundos']:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diagnóstico de esquema, estadísticas y planes de consulta de una base SISCAR.")
+    parser.add_argument('--db', default=db_utils.DB_PATH, help="Ruta de la base SQLite (por defecto %(default)s)")
+    parser.add_argument('--muestra', type=int, default=MUESTRA_FILAS,
+                        help="Filas máximas leídas por tabla para nulos/cardinalidad; 0 lee todo (por defecto %(default)s)")
+    parser.add_argument('--timeout', type=float, default=TIMEOUT_CONSULTA, help="Segundos máximos por consulta (por defecto %(default)s)")
+    parser.add_argument('--sin-consultas', action='store_true', help="Solo tablas e índices, sin ejecutar las consultas de db_utils")
+    parser.add_argument('--json', metavar='ARCHIVO', help="Escribe el diagnóstico como JSON ('-' para la salida estándar)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"Database file not found at {os.path.abspath(args.db)}")
+
+    diag = diagnosticar(args.db, args.muestra, args.timeout, not args.sin_consultas)
+    if args.json == '-':
+        json.dump(diag, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+        return
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(diag, f, ensure_ascii=False, indent=2)
+    imprimir(diag)
+
+
+if __name__ == '__main__':
+    main()
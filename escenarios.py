@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+
+# Escenarios "what-if" de costos y rentabilidad por curso.
+# Los ingresos y alumnos activos por curso se arman una sola vez (vectores) y
+# la grilla completa docentes x salario x factor prestacional x curso se
+# evalúa en un solo broadcast de NumPy, en vez de un rerun por escenario.
+#
+# Costo anual de un curso:
+#   (docentes_curso[c] + docentes * alumnos[c] / total_alumnos) * salario * factor * 12
+# docentes son los compartidos, prorrateados por alumno como en informe.costos();
+# docentes_curso (opcional) son los asignados a cada curso. Sin ellos el
+# resultado coincide con informe.costos() escenario por escenario.
+
+MESES_NOMINA = 12
+
+
+def vectores(res):
+    """Per-course revenue and active-student vectors from informe.resumen(); None without data."""
+    ingresos_curso = res.get('ingreso_curso', pd.DataFrame())
+    alumnos_curso = res.get('alumnos_curso', pd.DataFrame())
+    if ingresos_curso.empty or alumnos_curso.empty:
+        return None
+    cursos = pd.merge(ingresos_curso, alumnos_curso.dropna(subset=['Nom_curso']), on='Nom_curso', how='inner')
+    return {
+        'cursos': cursos['Nom_curso'].to_numpy(),
+        'ingresos': cursos['Valor'].to_numpy(dtype=np.float64),
+        'alumnos': cursos['Num_Alumnos'].to_numpy(dtype=np.float64),
+        # El prorrateo usa todos los activos, también los que no tienen curso o ingresos
+        'total_alumnos': int(alumnos_curso['Num_Alumnos'].sum()),
+    }
+
+
+def _eje(valores):
+    return np.atleast_1d(np.asarray(valores, dtype=np.float64))
+
+
+def _asignados(vect, docentes_curso):
+    """Per-course assigned teachers aligned to vect['cursos'] (dict by course, array or None)."""
+    if docentes_curso is None:
+        return np.zeros(len(vect['cursos']))
+    if isinstance(docentes_curso, dict):
+        return np.array([docentes_curso.get(c, 0) or 0 for c in vect['cursos']], dtype=np.float64)
+    return np.asarray(docentes_curso, dtype=np.float64)
+
+
+def evaluar(vect, num_docentes, salario_promedio, factor_prestacional, docentes_curso=None):
+    """Cost, profit and margin of every course for every parameter combination.
+
+    Each parameter is a scalar or a 1-D range. Arrays in the result are indexed
+    [docentes, salario, factor] (totals) or [docentes, salario, factor, curso].
+    """
+    docentes, salarios, factores = _eje(num_docentes), _eje(salario_promedio), _eje(factor_prestacional)
+    asignados = _asignados(vect, docentes_curso)
+    # Mismo orden de operaciones que informe.costos(): nómina anual / total de alumnos
+    nomina_anual = docentes[:, None, None] * salarios[None, :, None] * factores[None, None, :] * MESES_NOMINA
+    total = vect['total_alumnos']
+    costo_por_estudiante = nomina_anual / total if total > 0 else np.zeros_like(nomina_anual)
+    costo_docente = salarios[:, None] * factores[None, :] * MESES_NOMINA
+    costo = asignados * costo_docente[None, :, :, None] + vect['alumnos'] * costo_por_estudiante[..., None]
+    utilidad = vect['ingresos'] - costo
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margen = utilidad / vect['ingresos'] * 100
+    return {
+        'docentes': docentes,
+        'salarios': salarios,
+        'factores': factores,
+        'cursos': vect['cursos'],
+        'nomina_anual': nomina_anual + asignados.sum() * costo_docente[None, :, :],
+        'costo_por_estudiante': costo_por_estudiante,
+        'costo': costo,
+        'utilidad': utilidad,
+        'margen': margen,
+        'utilidad_total': utilidad.sum(axis=-1),
+        'cursos_en_perdida': (utilidad < 0).sum(axis=-1),
+    }
+
+
+def sensibilidad(resultado, filas='docentes', columnas='salarios', valor='utilidad_total', **fijos):
+    """2-D table of a total (utilidad_total, cursos_en_perdida, nomina_anual) over two parameters.
+
+    The third parameter is fixed at the grid value closest to `fijos[nombre]`
+    (the middle of its range by default).
+    """
+    ejes = ['docentes', 'salarios', 'factores']
+    datos = resultado[valor]
+    indice = []
+    for eje in ejes:
+        if eje in (filas, columnas):
+            indice.append(slice(None))
+        else:
+            valores = resultado[eje]
+            objetivo = fijos.get(eje, valores[len(valores) // 2])
+            indice.append(int(np.abs(valores - objetivo).argmin()))
+    tabla = datos[tuple(indice)]
+    if ejes.index(filas) > ejes.index(columnas):
+        tabla = tabla.T
+    return pd.DataFrame(tabla, index=pd.Index(resultado[filas], name=filas), columns=pd.Index(resultado[columnas], name=columnas))
+
+
+def salario_equilibrio(vect, num_docentes, factor_prestacional, docentes_curso=None):
+    """Highest base salary with total profit >= 0, as a docentes x factor table (break-even frontier)."""
+    docentes, factores = _eje(num_docentes), _eje(factor_prestacional)
+    asignados = _asignados(vect, docentes_curso).sum()
+    total = vect['total_alumnos']
+    prorrateo = vect['alumnos'].sum() / total if total > 0 else 0.0
+    # utilidad = ingresos - (asignados + docentes * prorrateo) * salario * factor * 12 = 0
+    docentes_efectivos = asignados + docentes[:, None] * prorrateo
+    with np.errstate(divide='ignore'):
+        salario = vect['ingresos'].sum() / (docentes_efectivos * factores[None, :] * MESES_NOMINA)
+    return pd.DataFrame(salario, index=pd.Index(docentes, name='docentes'), columns=pd.Index(factores, name='factores'))
+
+
+def docentes_equilibrio(vect, salario_promedio, factor_prestacional, docentes_curso=None):
+    """Most shared teachers with total profit >= 0, as a salario x factor table (break-even frontier)."""
+    salarios, factores = _eje(salario_promedio), _eje(factor_prestacional)
+    asignados = _asignados(vect, docentes_curso).sum()
+    total = vect['total_alumnos']
+    prorrateo = vect['alumnos'].sum() / total if total > 0 else 0.0
+    costo_docente = salarios[:, None] * factores[None, :] * MESES_NOMINA
+    with np.errstate(divide='ignore'):
+        docentes = (vect['ingresos'].sum() / costo_docente - asignados) / prorrateo
+    return pd.DataFrame(np.floor(np.maximum(docentes, 0)), index=pd.Index(salarios, name='salarios'),
+                        columns=pd.Index(factores, name='factores'))
+
+
+def equilibrio_por_curso(vect, resultado):
+    """Per course, the share of the scenarios in the grid where it breaks even, and its best and worst margin."""
+    utilidad = resultado['utilidad'].reshape(-1, len(vect['cursos']))
+    margen = resultado['margen'].reshape(-1, len(vect['cursos']))
+    return pd.DataFrame({
+        'Nom_curso': vect['cursos'],
+        'Escenarios_Rentables': (utilidad >= 0).mean(axis=0) * 100,
+        'Margen_Min': margen.min(axis=0),
+        'Margen_Max': margen.max(axis=0),
+    }).sort_values('Escenarios_Rentables', ascending=False, ignore_index=True)
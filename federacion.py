@@ -0,0 +1,218 @@
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+import data_cache
+import db_utils
+import libro_cartera
+import rubros
+import snapshot
+
+# Federación de colegios: varias bases SISCAR (una por colegio o sede, lista en
+# db_utils.DB_PATHS) consultadas a la vez y unidas en un solo resumen con la
+# columna Colegio. Cada archivo se consulta en su propio hilo con su propia
+# conexión del pool: sqlite3 suelta el GIL mientras ejecuta la consulta, así que
+# el tiempo total queda acotado por el archivo más lento y los hilos comparten
+# las cachés del proceso (data_cache, pool de conexiones, firmas de versión).
+# Dentro de cada archivo las fuentes (pagos, cargos, abonos, alumnos) también se
+# consultan a la vez, cada una con su límite de tiempo; una fuente que falla o
+# se pasa del límite queda vacía y su error se informa, sin tumbar las demás.
+
+MAX_HILOS = 8
+# Límite por consulta en segundos (SISCAR_TIMEOUT_CONSULTA=0 lo desactiva)
+TIMEOUT_CONSULTA = float(os.environ.get('SISCAR_TIMEOUT_CONSULTA', '60')) or None
+
+
+def en_paralelo(funcion, paths):
+    """[funcion(path) for path in paths], one thread per file; the first error is re-raised."""
+    paths = list(paths)
+    if len(paths) <= 1:
+        return [funcion(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(len(paths), MAX_HILOS), thread_name_prefix='federacion') as pool:
+        return list(pool.map(funcion, paths))
+
+
+def cargar_fuentes(fuentes, timeout=TIMEOUT_CONSULTA):
+    """Runs {name: loader()} concurrently, interrupting any query that exceeds `timeout` seconds.
+
+    Returns (results, errors): a source that fails is left out of the results
+    and its error message is kept under its name in errors.
+    """
+    def ejecutar(nombre):
+        with db_utils.limite_tiempo(timeout):
+            return fuentes[nombre]()
+
+    resultados, errores = {}, {}
+    with ThreadPoolExecutor(max_workers=max(1, min(len(fuentes), MAX_HILOS)), thread_name_prefix='fuente') as pool:
+        futuros = {nombre: pool.submit(ejecutar, nombre) for nombre in fuentes}
+        for nombre, futuro in futuros.items():
+            try:
+                resultados[nombre] = futuro.result()
+            except Exception as e:
+                errores[nombre] = f"{type(e).__name__}: {e}"
+    return resultados, errores
+
+
+def rutas(paths=None):
+    """Absolute paths of the federated databases (db_utils.DB_PATHS by default), without repeats."""
+    return list(dict.fromkeys(os.path.abspath(p) for p in (paths or db_utils.DB_PATHS)))
+
+
+@functools.lru_cache(maxsize=16)
+def _nombres(paths):
+    nombres = en_paralelo(db_utils.nombre_colegio, paths)
+    # Dos archivos del mismo colegio (p. ej. sedes) se distinguen por el nombre del archivo
+    repetidos = {n for n in nombres if nombres.count(n) > 1}
+    return tuple(
+        f"{n} ({os.path.splitext(os.path.basename(p))[0]})" if n in repetidos else n
+        for p, n in zip(paths, nombres)
+    )
+
+
+def colegios(paths=None):
+    """[(path, school name)] of the federated databases; names are unique."""
+    paths = tuple(rutas(paths))
+    return list(zip(paths, _nombres(paths)))
+
+
+def get_data_version(paths=None):
+    """Federated version token: ((path, db_utils.get_data_version(path)), ...)."""
+    paths = rutas(paths)
+    return tuple(zip(paths, en_paralelo(db_utils.get_data_version, paths)))
+
+
+def query_anios(paths=None):
+    """Distinct payment years across the databases, most recent first."""
+    return sorted(set().union(*en_paralelo(db_utils.query_anios, rutas(paths))), reverse=True)
+
+
+def query_grados(paths=None):
+    """Sorted grade names with students in any of the databases."""
+    return sorted(set().union(*en_paralelo(db_utils.query_grados, rutas(paths))))
+
+
+def _sin_pagos(version):
+    return tuple(parte for parte in version if parte[0] != 'pagos')
+
+
+def _pagos_vacios():
+    columnas = ['Periodo', 'Nom_grado', 'Nom_curso', 'Cod_rubro', 'Valor']
+    return pd.DataFrame(columns=columnas).assign(Categoria_Rubro=pd.Categorical([]))
+
+
+def _resumen(dataset, path):
+    """Loader of one snapshot.DATASETS summary for data_cache.agregado.
+
+    A full load reads the columnar snapshot when it matches the database
+    version; delta loads (desde_num_pago) and stale snapshots query SQLite.
+    """
+    consultar = functools.partial(snapshot.DATASETS[dataset], db_path=path)
+
+    def cargar(**kwargs):
+        if not kwargs:
+            frames = snapshot.cargar_snapshot(path, [dataset])
+            if frames is not None:
+                return frames[dataset]
+        return consultar(**kwargs)
+    return cargar
+
+
+def _cargar_colegio(path, nombre, version, hoy=None, timeout=TIMEOUT_CONSULTA):
+    """Summaries of one database, tagged with its school, plus {source: error} of the sources that failed."""
+    def pagos():
+        pagos = data_cache.agregado(
+            ('pagos_resumen', path), _resumen('pagos_resumen', path), version,
+            ['Periodo', 'Nom_grado', 'Nom_curso', 'Cod_rubro'], db_path=path,
+        )
+        # La categoría de cada rubro sale de las tablas de rubros de su propia base
+        return pagos.assign(Categoria_Rubro=rubros.asignar_categoria(pagos, db_utils.categorias_rubro(path)))
+
+    # Libro de cartera: cargos por versión de cargos/dimensiones, abonos con carga incremental
+    fuentes = {
+        'pagos': pagos,
+        'cargos': lambda: data_cache.agregado(
+            ('cargos_alumno', path), _resumen('cargos_alumno', path), _sin_pagos(version),
+        ),
+        'abonos': lambda: data_cache.agregado(
+            ('abonos_alumno', path), _resumen('abonos_alumno', path), version,
+            ['Cod_alumno', 'Anio', 'Concepto'], db_path=path,
+        ),
+        'alumnos_curso': lambda: data_cache.agregado(
+            ('alumnos_curso', path), _resumen('alumnos_curso', path), _sin_pagos(version),
+        ),
+    }
+    datos, errores = cargar_fuentes(fuentes, timeout)
+    # Sin cargos o sin abonos el libro no se puede armar (todo cargo parecería deuda): queda vacío
+    if 'cargos' in datos and 'abonos' in datos:
+        cartera = libro_cartera.libro(datos['cargos'], datos['abonos'], hoy)
+    else:
+        cartera = libro_cartera.libro(pd.DataFrame(), pd.DataFrame())
+    alumnos_curso = datos.get('alumnos_curso', pd.DataFrame(columns=['Nom_curso', 'Num_Alumnos']))
+    return {
+        'pagos': datos.get('pagos', _pagos_vacios()).assign(Colegio=nombre),
+        'cartera': cartera.assign(Colegio=nombre),
+        'alumnos_curso': alumnos_curso.assign(Colegio=nombre),
+        'errores': errores,
+    }
+
+
+def _unir(frames):
+    """Concatenates frames whose categorical columns may differ in categories, keeping them categorical.
+
+    The categories keep the first file's order (Categoria_Rubro follows the rubros.py order).
+    """
+    if len(frames) == 1:
+        return frames[0]
+    unido = pd.concat(frames, ignore_index=True)
+    for columna in unido.columns:
+        if all(isinstance(df[columna].dtype, pd.CategoricalDtype) for df in frames):
+            unido[columna] = union_categoricals([df[columna] for df in frames])
+    return unido
+
+
+def cargar(version=None, hoy=None, timeout=TIMEOUT_CONSULTA):
+    """Consolidated pagos, cartera ledger and alumnos_curso of every database, with a Colegio column.
+
+    `version` is the token of get_data_version(); each file is loaded (or
+    taken from data_cache) in its own thread. `hoy` is the aging cut-off
+    date of the ledger (today by default). Sources that fail or exceed
+    `timeout` are left empty and reported in 'errores' as {school: {source: message}}.
+    """
+    version = version or get_data_version()
+    nombres = dict(colegios([path for path, _ in version]))
+    partes = en_paralelo(
+        lambda path: _cargar_colegio(path, nombres[path], dict(version)[path], hoy, timeout), [path for path, _ in version],
+    )
+    datos = {clave: _unir([p[clave] for p in partes]) for clave in ('pagos', 'cartera', 'alumnos_curso')}
+    datos['errores'] = {nombres[path]: p['errores'] for (path, _), p in zip(version, partes) if p['errores']}
+    return datos
+
+
+def buscar_alumnos(texto, limite=20, paths=None, timeout=TIMEOUT_CONSULTA):
+    """Students matching `texto` (db_utils.buscar_alumnos) in every database, with Colegio and Base columns.
+
+    Base is the file to read the student's history from. Returns (students,
+    {school: error}); a database that fails is left out.
+    """
+    nombres = dict(colegios(paths))
+    fuentes = {path: functools.partial(db_utils.buscar_alumnos, texto, limite, db_path=path) for path in nombres}
+    resultados, errores = cargar_fuentes(fuentes, timeout)
+    partes = [resultados[path].assign(Colegio=nombres[path], Base=path) for path in nombres if path in resultados]
+    columnas = ['Cod_alumno', 'Nombre', 'Nom_curso', 'Nom_grado', 'Activo', 'Colegio', 'Base']
+    alumnos = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=columnas)
+    return alumnos, {nombres[path]: error for path, error in errores.items()}
+
+
+def libro_alumno(path, cod_alumno, hoy=None, timeout=TIMEOUT_CONSULTA):
+    """Cartera ledger (libro_cartera.libro) of one student, from that student's charges and payments only."""
+    fuentes = {
+        'cargos': functools.partial(db_utils.query_cargos_alumno, cod_alumno, db_path=path),
+        'abonos': functools.partial(db_utils.query_abonos_alumno, cod_alumno=cod_alumno, db_path=path),
+    }
+    datos, errores = cargar_fuentes(fuentes, timeout)
+    if errores:
+        raise RuntimeError('; '.join(f"{fuente}: {error}" for fuente, error in errores.items()))
+    return libro_cartera.libro(datos['cargos'], datos['abonos'], hoy)
@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import threading
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow llega con streamlit; sin él se muestran los originales
+    Image = None
+    ImageOps = None
+
+# Miniaturas de la galería de actividades (carpeta imagenes/).
+# Cada imagen se identifica por el SHA-256 de su contenido: las copias del
+# mismo archivo (p. ej. imagenes/gpr_aire.png e imagenes/assets/gpr_aire.png)
+# se muestran una sola vez y su miniatura WebP se genera una sola vez.
+# El manifiesto (.miniaturas/manifest.json) guarda la firma de la carpeta
+# (ruta, tamaño, mtime de cada archivo) y solo se rehace cuando esa firma
+# cambia; un archivo que no cambió reutiliza su hash anterior.
+
+EXTENSIONES = ('.png', '.jpg', '.jpeg', '.webp')
+CARPETA_MINIATURAS = '.miniaturas'
+LADO_MINIATURA = 480
+CALIDAD_WEBP = 80
+
+_lock = threading.Lock()
+_memo = {}
+
+
+def _archivos(carpeta):
+    """(relative path, size, mtime_ns) of every image under the folder, cache folder excluded."""
+    encontrados = []
+    for raiz, dirs, archivos in os.walk(carpeta):
+        dirs[:] = sorted(d for d in dirs if d != CARPETA_MINIATURAS)
+        for nombre in sorted(archivos):
+            if nombre.lower().endswith(EXTENSIONES):
+                ruta = os.path.join(raiz, nombre)
+                st = os.stat(ruta)
+                encontrados.append((os.path.relpath(ruta, carpeta).replace(os.sep, '/'), st.st_size, st.st_mtime_ns))
+    return encontrados
+
+
+def firma_carpeta(carpeta):
+    """Cheap signature of the folder: changes when an image is added, removed or rewritten."""
+    return tuple(_archivos(carpeta))
+
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _crear_miniatura(origen, destino, lado):
+    with Image.open(origen) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA' if 'A' in img.getbands() or 'transparency' in img.info else 'RGB')
+        img.thumbnail((lado, lado))
+        tmp = destino + '.tmp'
+        img.save(tmp, 'WEBP', quality=CALIDAD_WEBP, method=4)
+    os.replace(tmp, destino)
+
+
+def _leer_manifiesto(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def construir_manifiesto(carpeta, lado=LADO_MINIATURA):
+    """Hashes the images, writes missing thumbnails and the manifest; returns the manifest."""
+    cache = os.path.join(carpeta, CARPETA_MINIATURAS)
+    ruta_manifiesto = os.path.join(cache, 'manifest.json')
+    anterior = _leer_manifiesto(ruta_manifiesto)
+    firma = [list(a) for a in _archivos(carpeta)]
+    if anterior.get('firma') == firma and anterior.get('lado') == lado:
+        return anterior
+
+    # Hash anterior de cada archivo que no cambió de tamaño ni de mtime
+    conocidos = {(a[0], a[1], a[2]): a[3] for a in anterior.get('hashes', [])}
+    hashes, imagenes = [], {}
+    for rel, tamano, mtime in firma:
+        contenido = conocidos.get((rel, tamano, mtime)) or _hash_archivo(os.path.join(carpeta, rel))
+        hashes.append([rel, tamano, mtime, contenido])
+        if contenido in imagenes:
+            imagenes[contenido]['duplicados'].append(rel)
+            continue
+        imagenes[contenido] = {'hash': contenido, 'ruta': rel, 'duplicados': [], 'miniatura': rel}
+
+    if Image is not None:
+        os.makedirs(cache, exist_ok=True)
+        for contenido, imagen in imagenes.items():
+            nombre = f"{contenido[:16]}_{lado}.webp"
+            destino = os.path.join(cache, nombre)
+            if not os.path.exists(destino):
+                try:
+                    _crear_miniatura(os.path.join(carpeta, imagen['ruta']), destino, lado)
+                except OSError:
+                    continue  # imagen ilegible: se muestra el original
+            imagen['miniatura'] = f"{CARPETA_MINIATURAS}/{nombre}"
+        # Miniaturas de imágenes que ya no están en la carpeta
+        vigentes = {os.path.basename(i['miniatura']) for i in imagenes.values()}
+        for nombre in os.listdir(cache):
+            if nombre.endswith('.webp') and nombre not in vigentes:
+                os.remove(os.path.join(cache, nombre))
+
+    manifiesto = {'firma': firma, 'lado': lado, 'hashes': hashes, 'imagenes': list(imagenes.values())}
+    if Image is not None:
+        tmp = ruta_manifiesto + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, ensure_ascii=False)
+        os.replace(tmp, ruta_manifiesto)
+    return manifiesto
+
+
+def imagenes(carpeta, lado=LADO_MINIATURA):
+    """Unique images of the folder as [{hash, ruta, miniatura, duplicados}] with paths joined to the folder.
+
+    The manifest is rebuilt only when the folder signature changes; otherwise
+    this costs one directory walk with stat calls.
+    """
+    firma = firma_carpeta(carpeta)
+    clave = (os.path.abspath(carpeta), lado)
+    with _lock:
+        memo = _memo.get(clave)
+        if memo is None or memo[0] != firma:
+            manifiesto = construir_manifiesto(carpeta, lado)
+            lista = [
+                {**i, 'ruta': os.path.join(carpeta, i['ruta']), 'miniatura': os.path.join(carpeta, i['miniatura'])}
+                for i in manifiesto['imagenes']
+            ]
+            memo = _memo[clave] = (firma, lista)
+    return memo[1]
@@ -0,0 +1,351 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+
+import cube
+import escenarios
+import federacion
+import series
+
+# Datos, KPIs y figuras del "Informe de Gestión", sin depender de Streamlit.
+# app.py los muestra en vivo y reporte.py los escribe a HTML/imagen en lote;
+# ambos usan estas mismas funciones, así el informe estático y el dashboard
+# no se separan.
+
+COSTOS_DEFECTO = {'num_docentes': 25, 'salario_promedio': 1950000, 'factor_prestacional': 1.5}
+
+CONCEPTOS_GRAFICO = ['Matricula', 'Pension', 'Transporte', 'Sistemas', 'Asociacion', 'Otros', 'Ludicas', 'Mpruebas',
+                     'Papeleria', 'Materiales', 'Modulos']
+
+
+def cargar_cubos(version=None, hoy=None):
+    """Cubes and small tables behind every section of the report, for one federated data version.
+
+    Every database in db_utils.DB_PATHS is loaded concurrently (federacion.py);
+    rows carry a Colegio column, so a single school is just a filter. The debt
+    cube comes from the per-student ledger aged at `hoy` (today by default).
+    Sources that could not be loaded are empty and listed in 'errores'.
+    """
+    return cubos(federacion.cargar(version, hoy))
+
+
+def cubos(datos):
+    """Builds the cubes from the consolidated frames of federacion.cargar()."""
+    return {
+        'pagos': cube.cubo_pagos(datos['pagos']),
+        'cartera': cube.cubo_cartera(datos['cartera']),
+        'alumnos_curso': datos['alumnos_curso'],
+        'errores': datos['errores'],
+    }
+
+
+def textos_errores(errores):
+    """One line per source that failed to load, as "school / source: message"."""
+    return [f"{colegio} / {fuente}: {mensaje}" for colegio, fuentes in errores.items() for fuente, mensaje in fuentes.items()]
+
+
+def mayor_a_menor(df, columna, valor):
+    """Labelled groups from largest to smallest value."""
+    return df.dropna(subset=[columna]).sort_values(valor, ascending=False, ignore_index=True)
+
+
+def _alumnos_curso(alumnos_curso, colegios):
+    """Active students per course for the selected schools (empty means all)."""
+    if colegios:
+        alumnos_curso = alumnos_curso[alumnos_curso['Colegio'].isin(list(colegios))]
+    return alumnos_curso.groupby('Nom_curso', sort=False, dropna=False, as_index=False)['Num_Alumnos'].sum()
+
+
+def resumen(cubos, selected_year, selected_grades, colegios=None):
+    """Frames of every section for a year, a list of grades and a list of schools (empty means all)."""
+    cubo_pagos, cubo_cartera = cubos['pagos'], cubos['cartera']
+    colegios = list(colegios or [])
+    filtro = dict(Anio=selected_year, Nom_grado=list(selected_grades), Colegio=colegios)
+    # Serie de todos los años con los mismos grados y colegios; el año elegido es un corte de ella
+    serie = series.mensual(cubo_pagos, Nom_grado=list(selected_grades), Colegio=colegios)
+    mensual = series.del_anio(serie, selected_year)
+    mensual = mensual[mensual['Con_Datos']]
+    mensual = pd.DataFrame({
+        'Mes': [f"{anio}-{mes:02d}" for anio, mes in zip(mensual['Anio'], mensual['Mes'])],
+        'Valor': mensual['Valor'].to_numpy(),
+    })
+    # La cartera sale del libro por alumno (cargos - abonos), con año lectivo
+    filtro_cartera = dict(Anio=selected_year, Grado=list(selected_grades), Colegio=colegios)
+    return {
+        'recaudo_mensual': mensual,
+        'recaudo_series': serie,
+        'ingreso_grado': mayor_a_menor(cubo_pagos.por('Nom_grado', **filtro), 'Nom_grado', 'Valor'),
+        'ingreso_curso': mayor_a_menor(cubo_pagos.por('Nom_curso', **filtro), 'Nom_curso', 'Valor'),
+        'ingreso_categoria': cubo_pagos.por('Categoria_Rubro', **filtro).astype({'Categoria_Rubro': str}),
+        'alumnos_curso': _alumnos_curso(cubos['alumnos_curso'], colegios),
+        'deuda_grado': cubo_cartera.por('Grado', 'Total_Deuda', **filtro_cartera).sort_values('Total_Deuda', ascending=False, ignore_index=True),
+        'deuda_mes': cubo_cartera.por('Mes', 'Total_Deuda', **filtro_cartera),
+        'deuda_concepto': cubo_cartera.por('Concepto', 'Monto', **filtro_cartera).astype({'Concepto': str}),
+        'deuda_edad': cubo_cartera.por('Edad', 'Total_Deuda', **filtro_cartera).astype({'Edad': str}),
+    }
+
+
+def kpis_por_colegio(cubos, selected_year, selected_grades, colegios=None):
+    """Collected, debt and recovery % per school, with the same filters as resumen()."""
+    colegios = list(colegios or [])
+    recaudo = cubos['pagos'].por('Colegio', 'Total Recaudado', Anio=selected_year, Nom_grado=list(selected_grades), Colegio=colegios)
+    cartera = cubos['cartera'].por('Colegio', 'Total Cartera', Anio=selected_year, Grado=list(selected_grades), Colegio=colegios)
+    tabla = recaudo.merge(cartera, on='Colegio', how='outer').fillna({'Total Recaudado': 0, 'Total Cartera': 0})
+    total = tabla['Total Recaudado'] + tabla['Total Cartera']
+    tabla['% Recuperación'] = (tabla['Total Recaudado'] / total.where(total > 0) * 100).fillna(0)
+    return tabla.sort_values('Total Recaudado', ascending=False, ignore_index=True)
+
+
+def kpis(res):
+    """Collected, debt and recovery %; None without payments.
+
+    Debt and recovery are None when the ledger has no charges for the year.
+    """
+    recaudo_mensual = res.get('recaudo_mensual', pd.DataFrame())
+    deuda_grado = res.get('deuda_grado', pd.DataFrame())
+    if recaudo_mensual.empty:
+        return None
+    total_recaudado = recaudo_mensual['Valor'].sum()
+    if deuda_grado.empty:
+        return {'total_recaudado': total_recaudado, 'total_cartera': None, 'pct_recuperacion': None}
+    total_cartera = deuda_grado['Total_Deuda'].sum()
+    pct_recuperacion = 0
+    if (total_recaudado + total_cartera) > 0:
+        pct_recuperacion = (total_recaudado / (total_recaudado + total_cartera)) * 100
+    return {'total_recaudado': total_recaudado, 'total_cartera': total_cartera, 'pct_recuperacion': pct_recuperacion}
+
+
+def textos_kpis(indicadores):
+    """(label, formatted value) of the main KPIs; N/D where there is no data."""
+    cartera, pct = indicadores['total_cartera'], indicadores['pct_recuperacion']
+    return [
+        ("💰 Total Recaudado", f"${indicadores['total_recaudado']:,.0f}"),
+        ("📉 Total Cartera (Deuda)", "N/D" if cartera is None else f"${cartera:,.0f}"),
+        ("📈 % Recuperación", "N/D" if pct is None else f"{pct:.1f}%"),
+    ]
+
+
+def costos(res, num_docentes, salario_promedio, factor_prestacional, docentes_curso=None):
+    """Estimated payroll cost and per-course profitability; None without income or active students.
+
+    One scenario of escenarios.evaluar(): the annual payroll (12 months) is
+    prorated by active student, plus the teachers assigned to each course if given.
+    """
+    vect = escenarios.vectores(res)
+    if vect is None:
+        return None
+    # El conteo de activos incluye a los que no tienen curso asignado (Alumno es la foto actual)
+    esc = escenarios.evaluar(vect, num_docentes, salario_promedio, factor_prestacional, docentes_curso)
+    analisis_curso = pd.DataFrame({
+        'Nom_curso': vect['cursos'],
+        'Ingresos': vect['ingresos'],
+        'Num_Alumnos': vect['alumnos'].astype(np.int64),
+        'Costo_Estimado': esc['costo'][0, 0, 0],
+        'Utilidad': esc['utilidad'][0, 0, 0],
+        'Margen': esc['margen'][0, 0, 0],
+    }).sort_values('Utilidad', ascending=False)
+    total_alumnos_activos = vect['total_alumnos']
+    return {
+        'costo_nomina_anual': float(esc['nomina_anual'][0, 0, 0]),
+        'costo_por_estudiante': float(esc['costo_por_estudiante'][0, 0, 0]),
+        'total_alumnos_activos': total_alumnos_activos,
+        'alumnos_x_profe': total_alumnos_activos / num_docentes if num_docentes > 0 else None,
+        'analisis_curso': analisis_curso,
+    }
+
+
+def conceptos_con_deuda(deuda_concepto):
+    """Charted debt concepts with a positive amount, largest first."""
+    deuda_concepto = deuda_concepto[deuda_concepto['Concepto'].isin(CONCEPTOS_GRAFICO)]
+    deuda_concepto = deuda_concepto[deuda_concepto['Monto'] > 0]
+    return deuda_concepto.sort_values('Monto', ascending=False)
+
+
+def estado_cuenta(libro):
+    """Charges, payments, balance and overdue debt per concept of a student's ledger (federacion.libro_alumno)."""
+    return libro.groupby('Concepto', as_index=False)[['Cargo', 'Abono', 'Saldo', 'Deuda']].sum()
+
+
+# --- Figuras ---
+
+def _estilo(fig):
+    fig.update_layout(font=dict(size=14), hoverlabel=dict(font_size=18))
+    return fig
+
+
+def fig_recaudo_mensual(recaudo_mensual, selected_year):
+    return _estilo(px.area(recaudo_mensual, x='Mes', y='Valor',
+                           title=f"Recaudo Mensual - Año {selected_year}",
+                           labels={'Valor': 'Ingresos ($)', 'Mes': 'Mes'},
+                           markers=True))
+
+
+def fig_comparativo_anual(serie):
+    # Solo los años con recaudo; los años vacíos entre registros aislados no aportan líneas
+    anios = serie.loc[serie['Con_Datos'], 'Anio'].unique()
+    serie = serie[serie['Anio'].isin(anios)]
+    return _estilo(px.line(serie.astype({'Anio': str}), x='Mes', y='Acumulado', color='Anio',
+                           title="Recaudo Acumulado por Año (mismo mes)",
+                           labels={'Acumulado': 'Acumulado ($)', 'Mes': 'Mes', 'Anio': 'Año'},
+                           markers=True)
+                   .update_xaxes(tickmode='array', tickvals=list(range(1, series.MESES + 1)), ticktext=list(series.NOMBRES_MES)))
+
+
+def fig_variacion_anual(serie_anio, selected_year):
+    datos = serie_anio.dropna(subset=['Variacion_Pct']).assign(Signo=lambda d: np.where(d['Variacion_Pct'] >= 0, 'Crece', 'Cae'))
+    return _estilo(px.bar(datos, x='Mes', y='Variacion_Pct', color='Signo',
+                          color_discrete_map={'Crece': 'green', 'Cae': 'red'},
+                          hover_data={'Valor': ':,.0f', 'Valor_Anterior': ':,.0f', 'Variacion_Acumulada_Pct': ':.1f', 'Signo': False},
+                          title=f"Variación del Recaudo vs {selected_year - 1} (%)",
+                          labels={'Variacion_Pct': 'Variación (%)', 'Mes': 'Mes', 'Valor': 'Recaudo',
+                                  'Valor_Anterior': f"Recaudo {selected_year - 1}", 'Variacion_Acumulada_Pct': 'Variación acumulada (%)'})
+                   .update_xaxes(tickmode='array', tickvals=list(range(1, series.MESES + 1)), ticktext=list(series.NOMBRES_MES)))
+
+
+def fig_ingreso_grado(ingreso_grado):
+    return _estilo(px.bar(ingreso_grado, x='Nom_grado', y='Valor',
+                          color='Valor',
+                          title="Ranking de Ingresos por Grado",
+                          labels={'Valor': 'Total ($)', 'Nom_grado': 'Grado'}))
+
+
+def fig_ingreso_curso(ingresos_curso_df):
+    ingreso_curso = ingresos_curso_df.head(10)  # Top 10
+    return _estilo(px.bar(ingreso_curso, x='Nom_curso', y='Valor',
+                          title="Top 10 Cursos con Mayores Ingresos",
+                          labels={'Valor': 'Total ($)', 'Nom_curso': 'Curso'}))
+
+
+def fig_ingreso_categoria(ingreso_rubro, selected_year):
+    fig = px.pie(ingreso_rubro, values='Valor', names='Categoria_Rubro',
+                 title=f"Distribución de Ingresos por Concepto - Año {selected_year}",
+                 hole=0.4)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return _estilo(fig)
+
+
+def fig_rentabilidad(analisis_curso):
+    # "melt" para la barra agrupada de plotly
+    analisis_melted = analisis_curso.melt(id_vars='Nom_curso', value_vars=['Ingresos', 'Costo_Estimado'], var_name='Tipo', value_name='Monto')
+    return _estilo(px.bar(analisis_melted, x='Nom_curso', y='Monto', color='Tipo', barmode='group',
+                          title="Comparativa: Ingresos Reales vs Costos Operativos Estimados",
+                          labels={'Monto': 'Valor ($)', 'Nom_curso': 'Curso'},
+                          color_discrete_map={'Ingresos': '#00CC96', 'Costo_Estimado': '#EF553B'}))
+
+
+def fig_eficiencia(analisis_curso):
+    fig = px.scatter(analisis_curso, x='Num_Alumnos', y='Utilidad',
+                     size='Ingresos', color='Utilidad',
+                     hover_name='Nom_curso',
+                     title="Eficiencia por Curso (Tamaño burbuja = Ingresos)",
+                     color_continuous_scale='RdYlGn',
+                     labels={'Num_Alumnos': 'Número de Estudiantes', 'Utilidad': 'Utilidad Neta Estimada ($)'})
+    fig.add_hline(y=0, line_dash="dash", line_color="gray", annotation_text="Punto de Equilibrio")
+    return _estilo(fig)
+
+
+def fig_sensibilidad(tabla, factor):
+    """Heatmap of total profit over teachers x base salary (escenarios.sensibilidad())."""
+    fig = px.imshow(tabla, aspect='auto', origin='lower', color_continuous_scale='RdYlGn',
+                    color_continuous_midpoint=0,
+                    title=f"Utilidad Total por Docentes y Salario (factor {factor:.2f})",
+                    labels={'x': 'Salario Promedio Base', 'y': 'Número de Docentes', 'color': 'Utilidad ($)'})
+    return _estilo(fig)
+
+
+def fig_equilibrio(frontera):
+    """Break-even salary per number of teachers, one line per factor (escenarios.salario_equilibrio())."""
+    largo = frontera.reset_index().melt(id_vars='docentes', var_name='factor', value_name='Salario')
+    largo['factor'] = largo['factor'].map(lambda f: f"{f:.2f}")
+    return _estilo(px.line(largo, x='docentes', y='Salario', color='factor',
+                           title="Punto de Equilibrio: Salario Máximo por Número de Docentes",
+                           labels={'docentes': 'Número de Docentes', 'Salario': 'Salario Base de Equilibrio ($)',
+                                   'factor': 'Factor'}))
+
+
+def fig_docentes_equilibrio(frontera):
+    """Break-even number of shared teachers per base salary, one line per factor (escenarios.docentes_equilibrio())."""
+    largo = frontera.reset_index().melt(id_vars='salarios', var_name='factor', value_name='Docentes')
+    largo['factor'] = largo['factor'].map(lambda f: f"{f:.2f}")
+    return _estilo(px.line(largo, x='salarios', y='Docentes', color='factor',
+                           title="Punto de Equilibrio: Docentes Máximos por Salario",
+                           labels={'salarios': 'Salario Promedio Base', 'Docentes': 'Docentes de Equilibrio',
+                                   'factor': 'Factor'}))
+
+
+def fig_deuda_grado(deuda_grado_mapeada):
+    return _estilo(px.bar(deuda_grado_mapeada, x='Grado', y='Total_Deuda',
+                          color='Total_Deuda',
+                          color_continuous_scale='Reds',
+                          title="Grados con Mayor Deuda Acumulada"))
+
+
+def fig_deuda_concepto(deuda_concepto):
+    return _estilo(px.bar(deuda_concepto, x='Concepto', y='Monto',
+                          color='Monto', color_continuous_scale='OrRd',
+                          title="¿Qué se debe más?",
+                          labels={'Monto': 'Deuda Total ($)'}))
+
+
+def fig_deuda_mes(deuda_tiempo):
+    return _estilo(px.bar(deuda_tiempo, x='Mes', y='Total_Deuda',
+                          title="Evolución de la Deuda por Mes",
+                          labels={'Total_Deuda': 'Monto ($)', 'Mes': 'Mes de Deuda'}))
+
+
+def fig_deuda_edad(deuda_edad):
+    return _estilo(px.bar(deuda_edad, x='Edad', y='Total_Deuda',
+                          color='Total_Deuda', color_continuous_scale='Reds',
+                          title="Edad de la Cartera (días de mora)",
+                          labels={'Total_Deuda': 'Monto ($)', 'Edad': 'Días desde el vencimiento'}))
+
+
+def figuras_ingresos(res, selected_year):
+    """Revenue section figures (monthly trend, grade, course, category) that have data."""
+    figs = {}
+    if not res['recaudo_mensual'].empty:
+        figs['recaudo_mensual'] = fig_recaudo_mensual(res['recaudo_mensual'], selected_year)
+    serie = res['recaudo_series']
+    if serie.loc[serie['Con_Datos'], 'Anio'].nunique() > 1:
+        figs['comparativo_anual'] = fig_comparativo_anual(serie)
+        serie_anio = series.del_anio(serie, selected_year)
+        if selected_year is not None and serie_anio['Variacion_Pct'].notna().any():
+            figs['variacion_anual'] = fig_variacion_anual(serie_anio, selected_year)
+    if not res['ingreso_grado'].empty:
+        figs['ingreso_grado'] = fig_ingreso_grado(res['ingreso_grado'])
+    if not res['ingreso_curso'].empty:
+        figs['ingreso_curso'] = fig_ingreso_curso(res['ingreso_curso'])
+    if not res['ingreso_categoria'].empty:
+        figs['ingreso_categoria'] = fig_ingreso_categoria(res['ingreso_categoria'], selected_year)
+    return figs
+
+
+def figuras_costos(costo):
+    """Cost section figures, empty without a cost analysis."""
+    if costo is None:
+        return {}
+    return {
+        'rentabilidad': fig_rentabilidad(costo['analisis_curso']),
+        'eficiencia': fig_eficiencia(costo['analisis_curso']),
+    }
+
+
+def figuras_cartera(res):
+    """Cartera section figures (grade, concept, month, aging) that have data."""
+    figs = {}
+    deuda_grado = res['deuda_grado'].dropna(subset=['Grado'])
+    if not deuda_grado.empty:
+        figs['deuda_grado'] = fig_deuda_grado(deuda_grado)
+    if not res['deuda_grado'].empty:
+        if not res['deuda_concepto'].empty:
+            figs['deuda_concepto'] = fig_deuda_concepto(conceptos_con_deuda(res['deuda_concepto']))
+        if not res['deuda_mes'].empty:
+            figs['deuda_mes'] = fig_deuda_mes(res['deuda_mes'])
+        if not res['deuda_edad'].empty:
+            figs['deuda_edad'] = fig_deuda_edad(res['deuda_edad'])
+    return figs
+
+
+def figuras(res, selected_year, costo=None):
+    """Every figure of the report that has data, in page order, as {name: Figure}."""
+    return {**figuras_ingresos(res, selected_year), **figuras_costos(costo), **figuras_cartera(res)}
@@ -0,0 +1,167 @@
+import contextlib
+import cProfile
+import json
+import os
+import time
+import uuid
+
+# Instrumentación liviana del dashboard: cada rerun arma una Traza con
+# secciones nombradas (carga, kpis, tendencia, ...) que guardan tiempo de
+# pared, filas procesadas y, si se pide, el tamaño en bytes del JSON de las
+# figuras que se envían al navegador. La traza se puede volcar como una línea
+# JSON por rerun y un rerun puntual se puede perfilar con cProfile o
+# pyinstrument (si está instalado).
+
+class Seccion:
+    """One named span of a rerun."""
+
+    __slots__ = ('nombre', 'inicio', 'segundos', 'filas', 'figuras', 'bytes_figuras')
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = time.perf_counter()
+        self.segundos = None
+        self.filas = 0
+        self.figuras = 0
+        self.bytes_figuras = 0
+
+    def cerrar(self):
+        if self.segundos is None:
+            self.segundos = time.perf_counter() - self.inicio
+
+    def a_dict(self):
+        return {
+            'seccion': self.nombre,
+            'segundos': round(self.segundos or 0.0, 6),
+            'filas': self.filas,
+            'figuras': self.figuras,
+            'bytes_figuras': self.bytes_figuras,
+        }
+
+
+class Traza:
+    """Sequence of sections of one rerun.
+
+    `seccion(nombre)` closes the current section and opens the next one, so a
+    script can be instrumented without re-indenting it; `span(nombre)` times a
+    sub-step inside the current section (its row is named "seccion/nombre").
+    """
+
+    def __init__(self, medir_figuras=False):
+        self.id = uuid.uuid4().hex[:12]
+        self.inicio = time.time()
+        self._t0 = time.perf_counter()
+        self.medir_figuras = medir_figuras
+        self.secciones = []
+        self._actual = None
+
+    def seccion(self, nombre):
+        if self._actual is not None:
+            self._actual.cerrar()
+        self._actual = Seccion(nombre)
+        self.secciones.append(self._actual)
+        return self._actual
+
+    @contextlib.contextmanager
+    def span(self, nombre):
+        if self._actual is not None:
+            nombre = f"{self._actual.nombre}/{nombre}"
+        seccion = Seccion(nombre)
+        self.secciones.append(seccion)
+        try:
+            yield seccion
+        finally:
+            seccion.cerrar()
+
+    def filas(self, *frames):
+        """Adds the row count of the given frames to the current section."""
+        if self._actual is not None:
+            self._actual.filas += sum(len(df) for df in frames if df is not None)
+
+    def figura(self, fig):
+        """Counts a figure (and its JSON payload size if enabled) in the current section; returns it."""
+        if self._actual is not None:
+            self._actual.figuras += 1
+            if self.medir_figuras:
+                self._actual.bytes_figuras += len(fig.to_json())
+        return fig
+
+    def terminar(self):
+        if self._actual is not None:
+            self._actual.cerrar()
+            self._actual = None
+        return self
+
+    def total(self):
+        return time.perf_counter() - self._t0
+
+    def registro(self, **extra):
+        """JSON-serializable record of the rerun."""
+        return {
+            'rerun': self.id,
+            'inicio': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.inicio)),
+            'total_segundos': round(self.total(), 6),
+            'secciones': [s.a_dict() for s in self.secciones],
+            **extra,
+        }
+
+
+def escribir_jsonl(path, registro):
+    """Appends one record as a JSON line."""
+    carpeta = os.path.dirname(path)
+    if carpeta:
+        os.makedirs(carpeta, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+
+def leer_jsonl(path, ultimos=50):
+    """Last records of a JSON-lines log (empty if it does not exist)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            lineas = f.readlines()[-ultimos:]
+    except OSError:
+        return []
+    return [json.loads(linea) for linea in lineas if linea.strip()]
+
+
+def perfiladores_disponibles():
+    disponibles = ['cprofile']
+    try:
+        import pyinstrument  # noqa: F401
+        disponibles.append('pyinstrument')
+    except ImportError:
+        pass
+    return disponibles
+
+
+class Perfilador:
+    """cProfile or pyinstrument around a single rerun; `guardar` writes the dump and returns its path."""
+
+    def __init__(self, tipo='cprofile'):
+        self.tipo = tipo
+        if tipo == 'pyinstrument':
+            import pyinstrument
+            self._perfil = pyinstrument.Profiler()
+        else:
+            self._perfil = cProfile.Profile()
+
+    def iniciar(self):
+        if self.tipo == 'pyinstrument':
+            self._perfil.start()
+        else:
+            self._perfil.enable()
+
+    def guardar(self, carpeta):
+        os.makedirs(carpeta, exist_ok=True)
+        base = os.path.join(carpeta, f"rerun_{time.strftime('%Y%m%d_%H%M%S')}")
+        if self.tipo == 'pyinstrument':
+            self._perfil.stop()
+            path = base + '.html'
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(self._perfil.output_html())
+        else:
+            self._perfil.disable()
+            path = base + '.prof'
+            self._perfil.dump_stats(path)
+        return path
@@ -0,0 +1,77 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# Libro de cartera por alumno: saldo = cargos - abonos por alumno, año lectivo,
+# mes y concepto. Los abonos de un alumno a un concepto se aplican primero a
+# sus cargos más antiguos (FIFO) con sumas acumuladas, sin recorrer fila a fila;
+# lo que sobra queda como saldo a favor (negativo) en su último cargo. Los
+# abonos sin ningún cargo del mismo año y concepto no entran al libro.
+#
+# Como los abonos llegan ya agregados por alumno/año/concepto (data_cache los
+# actualiza solo con los pagos nuevos, ver federacion.py), rehacer el libro es
+# vectorial y barato.
+
+# Tramos de mora en días desde el vencimiento; los cargos aún no vencidos no son deuda
+TRAMOS_EDAD = ('Por vencer', '0-30', '31-60', '61-90', '90+')
+_LIMITES_EDAD = np.array([30, 60, 90])
+
+_CLAVES = ['Cod_alumno', 'Anio', 'Concepto']
+
+
+def vencimientos(anios, meses):
+    """Due date of each charge: the first day of its month (matrícula, Mes 0, in January)."""
+    anios = np.asarray(anios, dtype=np.int64)
+    meses = np.clip(np.asarray(meses, dtype=np.int64), 1, 12)
+    return ((anios - 1970) * 12 + meses - 1).astype('datetime64[M]').astype('datetime64[D]')
+
+
+def cortes(anios, hoy=None):
+    """Aging cut-off date per school year: the year's last day, or today while it is in progress."""
+    hoy = np.datetime64(hoy or date.today(), 'D')
+    fin = (np.asarray(anios, dtype=np.int64) - 1970 + 1).astype('datetime64[Y]').astype('datetime64[D]') - 1
+    return np.minimum(fin, hoy)
+
+
+def libro(cargos, abonos, hoy=None):
+    """Ledger rows (Cod_alumno, Grado, Anio, Mes, Concepto, Cargo, Abono, Saldo, Dias, Edad, Deuda).
+
+    `cargos` is db_utils.query_cargos_alumno() and `abonos` is
+    db_utils.query_abonos_alumno(). Dias is the age of the charge at the
+    cut-off date of its year, Edad its aging bucket and Deuda the positive
+    balance of the charges already due.
+    """
+    columnas = ['Cod_alumno', 'Grado', 'Anio', 'Mes', 'Concepto', 'Cargo', 'Abono', 'Saldo', 'Dias', 'Edad', 'Deuda']
+    if cargos.empty:
+        vacio = pd.DataFrame(columns=columnas)
+        vacio['Edad'] = pd.Categorical([], categories=TRAMOS_EDAD, ordered=True)
+        return vacio
+
+    df = cargos.sort_values(_CLAVES + ['Mes'], ignore_index=True)
+    pagado = abonos.groupby(_CLAVES, sort=False)['Valor'].sum()
+    grupo = df.groupby(_CLAVES, sort=False)
+    acumulado = grupo['Cargo'].cumsum().to_numpy(dtype=np.int64)
+    cargo = df['Cargo'].to_numpy(dtype=np.int64)
+    total = pd.MultiIndex.from_frame(df[_CLAVES])
+    pagado = pagado.reindex(total, fill_value=0).to_numpy(dtype=np.int64)
+
+    # FIFO: el cargo i recibe lo pagado que exceda los cargos anteriores, hasta su valor
+    abono = np.clip(pagado - (acumulado - cargo), 0, cargo)
+    # El excedente (pagó más que todos sus cargos) se abona al último cargo del grupo
+    ultimo = (grupo.cumcount(ascending=False) == 0).to_numpy()
+    excedente = pagado - grupo['Cargo'].transform('sum').to_numpy(dtype=np.int64)
+    abono = abono + np.where(ultimo & (excedente > 0), excedente, 0)
+
+    anios, meses = df['Anio'].to_numpy(), df['Mes'].to_numpy()
+    dias = (cortes(anios, hoy) - vencimientos(anios, meses)).astype(np.int64)
+    vencido = dias >= 0
+    edad = np.where(vencido, np.searchsorted(_LIMITES_EDAD, dias, side='left') + 1, 0)
+    saldo = cargo - abono
+    return df.assign(
+        Abono=abono,
+        Saldo=saldo,
+        Dias=dias,
+        Edad=pd.Categorical.from_codes(edad, categories=TRAMOS_EDAD, ordered=True),
+        Deuda=np.where(vencido, np.maximum(saldo, 0), 0),
+    )[columnas]
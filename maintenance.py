@@ -0,0 +1,206 @@
+import argparse
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import db_utils
+import snapshot
+
+# Índices para los joins y filtros del dashboard (nombre, tabla, columnas)
+INDICES = [
+    ('idx_pago_num_pago', 'Pago', 'Num_pago'),
+    ('idx_pago_fecha', 'Pago', 'Fecha'),
+    # Historial de pagos de un alumno paginado por (Fecha, Num_pago) sin ordenar en memoria;
+    # la expresión es la misma de db_utils.historial_pagos (pagos sin fecha al final)
+    ('idx_pago_alumno_historial', 'Pago', 'Cod_alumno, COALESCE(Fecha, 0), Num_pago'),
+    # Cubre el join con Pago y la suma de Valor sin leer la tabla
+    ('idx_detalle_pago_num_pago', 'Detalle_pago', 'Num_pago, Cod_rubro, Valor'),
+    ('idx_rubros_cod_rubro', 'Rubros', 'Cod_rubro'),
+    ('idx_alumno_cod_alumno', 'Alumno', 'Cod_alumno'),
+    ('idx_alumno_curso', 'Alumno', 'Curso'),
+    ('idx_curso_cod_curso', 'Curso', 'Cod_curso'),
+    ('idx_curso_grado', 'Curso', 'Grado'),
+    ('idx_grados_cod_grado', 'Grados', 'Cod_grado'),
+    ('idx_deudores_cod_curso', 'TBL_Alumnos_deudores', 'Cod_curso'),
+    ('idx_cartera_alumnos_alumno_mes', 'Cartera_alumnos', 'Cod_alumno, Mes'),
+]
+
+_SCHEMA_ESTADO = f"""
+CREATE TABLE IF NOT EXISTS {db_utils.ROLLUP_ESTADO} (
+    Tabla TEXT PRIMARY KEY,
+    Watermark INTEGER NOT NULL,
+    Firma TEXT,
+    Actualizado TEXT
+);
+"""
+
+_SCHEMA_ROLLUPS = _SCHEMA_ESTADO + f"""
+CREATE TABLE IF NOT EXISTS {db_utils.ROLLUP_PAGOS} (
+    Anio INTEGER,
+    Mes TEXT,
+    Nom_grado TEXT,
+    Nom_curso TEXT,
+    Cod_rubro TEXT,
+    Nom_rubro TEXT,
+    Valor INTEGER NOT NULL,
+    Num_lineas INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_rollup_pagos_anio ON {db_utils.ROLLUP_PAGOS} (Anio, Nom_grado);
+"""
+
+_KEY_PAGOS = "Anio, Mes, Nom_grado, Nom_curso, Cod_rubro, Nom_rubro"
+
+
+def crear_indices(conn):
+    """Creates the missing indexes and refreshes the planner statistics."""
+    creados = []
+    # Cartera_alumnos no está en todas las bases
+    tablas = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for nombre, tabla, columnas in INDICES:
+        if tabla not in tablas:
+            continue
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (nombre,)
+        ).fetchone()
+        if not existe:
+            conn.execute(f'CREATE INDEX "{nombre}" ON "{tabla}" ({columnas})')
+            creados.append(nombre)
+    conn.execute("ANALYZE")
+    conn.commit()
+    return creados
+
+
+def _leer_estado(conn, tabla):
+    row = conn.execute(
+        f"SELECT Watermark, Firma FROM {db_utils.ROLLUP_ESTADO} WHERE Tabla = ?", (tabla,)
+    ).fetchone()
+    return row if row else (0, None)
+
+
+def _guardar_estado(conn, tabla, watermark, firma=None):
+    conn.execute(
+        f"INSERT OR REPLACE INTO {db_utils.ROLLUP_ESTADO} (Tabla, Watermark, Firma, Actualizado) VALUES (?, ?, ?, ?)",
+        (tabla, watermark, firma, datetime.now().isoformat(timespec='seconds')),
+    )
+
+
+def refrescar_rollup_pagos(conn, completo=False):
+    """Folds the Pago rows above the stored Num_pago watermark into Rollup_pagos.
+
+    Returns the number of payment lines folded in. Rows keep the grado/curso
+    they had when they were folded in, so the rollup is rebuilt from scratch
+    with `completo=True` or when its stored signature (db_utils.firma_rollup_pagos)
+    no longer matches: students changed course or folded payments were edited.
+    """
+    watermark, firma = _leer_estado(conn, db_utils.ROLLUP_PAGOS)
+    if not completo and watermark and firma != db_utils.firma_rollup_pagos(conn, watermark):
+        completo = True
+    if completo:
+        watermark = 0
+        conn.execute(f"DELETE FROM {db_utils.ROLLUP_PAGOS}")
+    max_pago = conn.execute("SELECT COALESCE(MAX(Num_pago), 0) FROM Pago").fetchone()[0]
+    if max_pago <= watermark:
+        _guardar_estado(conn, db_utils.ROLLUP_PAGOS, watermark, db_utils.firma_rollup_pagos(conn, watermark))
+        return 0
+
+    # Solo las filas nuevas se agregan desde las tablas crudas; luego se
+    # combinan con el rollup existente (pocos cientos de filas) y se reescribe.
+    delta_sql, params = db_utils.pagos_detalle_sql(desde_num_pago=watermark, hasta_num_pago=max_pago)
+    conn.execute("DROP TABLE IF EXISTS temp.rollup_delta")
+    conn.execute(f"""
+        CREATE TEMP TABLE rollup_delta AS
+        SELECT {_KEY_PAGOS}, SUM(Valor) AS Valor, COUNT(*) AS Num_lineas
+        FROM ({delta_sql})
+        GROUP BY {_KEY_PAGOS}
+    """, params)
+    lineas = conn.execute("SELECT COALESCE(SUM(Num_lineas), 0) FROM temp.rollup_delta").fetchone()[0]
+    conn.execute(f"""
+        CREATE TEMP TABLE rollup_merge AS
+        SELECT {_KEY_PAGOS}, SUM(Valor) AS Valor, SUM(Num_lineas) AS Num_lineas
+        FROM (
+            SELECT * FROM {db_utils.ROLLUP_PAGOS}
+            UNION ALL
+            SELECT * FROM temp.rollup_delta
+        )
+        GROUP BY {_KEY_PAGOS}
+    """)
+    conn.execute(f"DELETE FROM {db_utils.ROLLUP_PAGOS}")
+    conn.execute(f"INSERT INTO {db_utils.ROLLUP_PAGOS} SELECT * FROM temp.rollup_merge")
+    conn.execute("DROP TABLE temp.rollup_delta")
+    conn.execute("DROP TABLE temp.rollup_merge")
+    _guardar_estado(conn, db_utils.ROLLUP_PAGOS, max_pago, db_utils.firma_rollup_pagos(conn, max_pago))
+    return lineas
+
+
+def refrescar_busqueda(conn, completo=False):
+    """Rebuilds the Alumno_busqueda full-text index when the Alumno signature changed.
+
+    Returns the number of indexed students, or None when it was up to date.
+    Needs SQLite with FTS5; without it sqlite3.OperationalError is raised and
+    db_utils.buscar_alumnos() keeps searching Alumno directly.
+    """
+    conn.executescript(_SCHEMA_ESTADO)
+    firma = db_utils.firma_alumnos(conn)
+    if not completo and _leer_estado(conn, db_utils.BUSQUEDA_ALUMNOS)[1] == firma:
+        return None
+    with conn:
+        conn.execute(f"DROP TABLE IF EXISTS {db_utils.BUSQUEDA_ALUMNOS}")
+        # Sin tildes ni mayúsculas (PEÑA se encuentra con "pena") y con índices de prefijo de 1 a 3 letras
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE {db_utils.BUSQUEDA_ALUMNOS} USING fts5(
+                Cod_alumno, Nombre, tokenize = 'unicode61 remove_diacritics 2', prefix = '1 2 3'
+            )
+        """)
+        conn.execute(f"INSERT INTO {db_utils.BUSQUEDA_ALUMNOS} (Cod_alumno, Nombre) {db_utils.alumnos_busqueda_sql()}")
+        filas = conn.execute(f"SELECT COUNT(*) FROM {db_utils.BUSQUEDA_ALUMNOS}").fetchone()[0]
+        _guardar_estado(conn, db_utils.BUSQUEDA_ALUMNOS, filas, firma)
+    return filas
+
+
+def refrescar_rollups(conn, completo=False):
+    """Creates the rollup tables if needed and refreshes them in one transaction."""
+    conn.executescript(_SCHEMA_ROLLUPS)
+    with conn:
+        lineas = refrescar_rollup_pagos(conn, completo)
+    return lineas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de índices y rollups de la base SISCAR.")
+    parser.add_argument('--db', default=db_utils.DB_PATH, help="Ruta de la base SQLite (por defecto %(default)s)")
+    parser.add_argument('--completo', action='store_true', help="Reconstruir los rollups desde cero")
+    parser.add_argument('--solo-indices', action='store_true', help="Crear índices (y el de búsqueda de alumnos) sin tocar los rollups")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        raise SystemExit(f"Database file not found at {os.path.abspath(args.db)}")
+
+    conn = db_utils.get_connection(args.db, readonly=False)
+    try:
+        inicio = time.perf_counter()
+        creados = crear_indices(conn)
+        print(f"Índices creados: {', '.join(creados) if creados else 'ninguno (ya existían)'}")
+        try:
+            alumnos = refrescar_busqueda(conn, args.completo)
+        except sqlite3.OperationalError as e:
+            print(f"Búsqueda de alumnos: sin índice FTS5 ({e}); se buscará directamente en Alumno")
+        else:
+            print("Búsqueda de alumnos: sin cambios" if alumnos is None else f"Búsqueda de alumnos: {alumnos} alumnos indexados")
+        if not args.solo_indices:
+            lineas = refrescar_rollups(conn, args.completo)
+            print(f"Rollup pagos: {lineas} líneas nuevas incorporadas")
+            # Snapshot columnar de los resúmenes del dashboard, con los rollups ya al día
+            try:
+                carpeta = None if snapshot.snapshot_vigente(args.db) else snapshot.exportar_snapshot(args.db)
+            except RuntimeError as e:
+                print(f"Snapshot: no se exportó ({e})")
+            else:
+                print("Snapshot: sin cambios" if carpeta is None else f"Snapshot: escrito en {carpeta}")
+        print(f"Listo en {time.perf_counter() - inicio:.2f}s")
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+import argparse
+import html
+import importlib.util
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import plotly.offline
+
+import federacion
+import informe
+
+# Generador en lote del "Informe de Gestión", sin Streamlit. Carga los cubos una
+# vez en el proceso principal, los reparte a un pool de procesos y escribe una
+# página HTML estática (KPIs + todas las figuras) por cada combinación
+# año x grado; opcionalmente también PNG/PDF de cada figura (requiere kaleido).
+#
+#   python reporte.py --salida informes
+#   python reporte.py --anios 2025 --grados Quinto Noveno --formato html png
+#
+# Las bases se toman de SISCAR_DB_PATH (o SISCAR_DB_PATHS), igual que el dashboard.
+
+FORMATOS_IMAGEN = ('png', 'pdf')
+
+# Estado de cada proceso del pool, fijado por _iniciar
+_CONTEXTO = {}
+
+
+def _slug(texto):
+    texto = re.sub(r'[^\w-]+', '_', str(texto), flags=re.UNICODE).strip('_')
+    return texto.lower() or 'sin_nombre'
+
+
+def variantes(anios, grados, por_grado=True):
+    """Year x grade matrix: every year with all grades, plus each grade alone when `por_grado`."""
+    seleccion = [('todos', ())]
+    if por_grado:
+        seleccion += [(grado, (grado,)) for grado in grados]
+    return [
+        {'anio': anio, 'grado': etiqueta, 'grados': list(filtro), 'nombre': f"{anio}_{_slug(etiqueta)}"}
+        for anio in anios for etiqueta, filtro in seleccion
+    ]
+
+
+def _iniciar(cubos, parametros, salida, formatos):
+    _CONTEXTO.update(cubos=cubos, parametros=parametros, salida=salida, formatos=formatos)
+
+
+def _formato_kpis(indicadores, costo):
+    filas = []
+    if indicadores:
+        filas += informe.textos_kpis(indicadores)
+    if costo:
+        filas += [
+            ("Costo Nómina Anual (Est.)", f"${costo['costo_nomina_anual']:,.0f}"),
+            ("Costo Anual por Alumno", f"${costo['costo_por_estudiante']:,.0f}"),
+        ]
+        if costo['alumnos_x_profe'] is not None:
+            filas.append(("Alumnos por Docente", f"{costo['alumnos_x_profe']:.1f}"))
+    return filas
+
+
+def _pagina(titulo, kpis, figs):
+    celdas = ''.join(
+        f"<div class='kpi'><div>{html.escape(etiqueta)}</div><b>{html.escape(valor)}</b></div>"
+        for etiqueta, valor in kpis
+    ) or "<p>No hay datos suficientes para mostrar KPIs.</p>"
+    graficos = ''.join(
+        fig.to_html(full_html=False, include_plotlyjs=False, default_width='100%') for fig in figs.values()
+    )
+    return f"""<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(titulo)}</title>
+<script src="plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; margin: 2em; }}
+h1 {{ text-align: center; }}
+.kpis {{ display: flex; gap: 2em; flex-wrap: wrap; justify-content: center; }}
+.kpi {{ border: 1px solid #ddd; border-radius: 6px; padding: 0.8em 1.2em; }}
+.kpi b {{ font-size: 1.6em; }}
+</style>
+</head>
+<body>
+<h1>{html.escape(titulo)}</h1>
+<div class="kpis">{celdas}</div>
+{graficos}
+</body>
+</html>
+"""
+
+
+def generar_variante(variante):
+    """Renders one variant in the current process; returns its timing summary."""
+    inicio = time.perf_counter()
+    cubos, parametros, salida = _CONTEXTO['cubos'], _CONTEXTO['parametros'], _CONTEXTO['salida']
+    res = informe.resumen(cubos, variante['anio'], variante['grados'])
+    indicadores = informe.kpis(res)
+    costo = informe.costos(res, **parametros)
+    figs = informe.figuras(res, variante['anio'], costo)
+    titulo = f"Informe de Gestión - Año {variante['anio']}"
+    if variante['grados']:
+        titulo += f" - {variante['grado']}"
+
+    archivos = []
+    if 'html' in _CONTEXTO['formatos']:
+        archivo = os.path.join(salida, f"{variante['nombre']}.html")
+        with open(archivo, 'w', encoding='utf-8') as f:
+            f.write(_pagina(titulo, _formato_kpis(indicadores, costo), figs))
+        archivos.append(archivo)
+    for formato in FORMATOS_IMAGEN:
+        if formato in _CONTEXTO['formatos']:
+            for nombre, fig in figs.items():
+                archivo = os.path.join(salida, variante['nombre'], f"{nombre}.{formato}")
+                os.makedirs(os.path.dirname(archivo), exist_ok=True)
+                fig.write_image(archivo)
+                archivos.append(archivo)
+    return {
+        'nombre': variante['nombre'],
+        'anio': variante['anio'],
+        'grado': variante['grado'],
+        'figuras': len(figs),
+        'archivos': len(archivos),
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+
+
+def generar_informes(salida, anios=None, grados=None, por_grado=True, procesos=None, formatos=('html',), parametros=None):
+    """Writes every variant of the report into `salida`; returns the per-variant timing summary."""
+    inicio = time.perf_counter()
+    os.makedirs(salida, exist_ok=True)
+    cubos = informe.cargar_cubos()
+    anios = anios or federacion.query_anios()
+    grados = grados or federacion.query_grados()
+    errores = informe.textos_errores(cubos['errores'])
+    parametros = {**informe.COSTOS_DEFECTO, **(parametros or {})}
+    carga = time.perf_counter() - inicio
+
+    if 'html' in formatos:
+        with open(os.path.join(salida, 'plotly.min.js'), 'w', encoding='utf-8') as f:
+            f.write(plotly.offline.get_plotlyjs())
+
+    lista = variantes(anios, grados, por_grado)
+    # Los cubos se envían una sola vez por proceso (initializer), no por variante
+    with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar,
+                             initargs=(cubos, parametros, salida, tuple(formatos))) as pool:
+        resultados = list(pool.map(generar_variante, lista))
+
+    resumen = {
+        'carga_segundos': round(carga, 3),
+        'total_segundos': round(time.perf_counter() - inicio, 3),
+        'parametros': parametros,
+        'errores': errores,
+        'variantes': resultados,
+    }
+    with open(os.path.join(salida, 'resumen.json'), 'w', encoding='utf-8') as f:
+        json.dump(resumen, f, ensure_ascii=False, indent=2, default=str)
+    return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera en lote el Informe de Gestión (HTML estático y opcionalmente imágenes).")
+    parser.add_argument('--salida', default='informes', help="Carpeta de salida (por defecto %(default)s)")
+    parser.add_argument('--anios', type=int, nargs='+', help="Años a generar (por defecto todos)")
+    parser.add_argument('--grados', nargs='+', help="Grados a generar por separado (por defecto todos)")
+    parser.add_argument('--solo-todos', action='store_true', help="Solo la variante con todos los grados por año")
+    parser.add_argument('--procesos', type=int, help="Procesos del pool (por defecto uno por CPU)")
+    parser.add_argument('--formato', nargs='+', choices=('html', *FORMATOS_IMAGEN), default=['html'], help="Formatos de salida")
+    parser.add_argument('--docentes', type=int, default=informe.COSTOS_DEFECTO['num_docentes'], help="Número de docentes")
+    parser.add_argument('--salario', type=int, default=informe.COSTOS_DEFECTO['salario_promedio'], help="Salario promedio base")
+    parser.add_argument('--factor', type=float, default=informe.COSTOS_DEFECTO['factor_prestacional'], help="Factor prestacional")
+    args = parser.parse_args()
+
+    if set(args.formato) & set(FORMATOS_IMAGEN) and importlib.util.find_spec('kaleido') is None:
+        parser.error("exportar PNG/PDF requiere el paquete kaleido")
+
+    resumen = generar_informes(
+        args.salida, args.anios, args.grados, not args.solo_todos, args.procesos, args.formato,
+        {'num_docentes': args.docentes, 'salario_promedio': args.salario, 'factor_prestacional': args.factor},
+    )
+    for error in resumen['errores']:
+        print(f"AVISO datos parciales: {error}")
+    for r in resumen['variantes']:
+        print(f"{r['nombre']:<30} {r['figuras']:>3} figuras {r['segundos']:>8.3f}s")
+    print(f"Carga de datos: {resumen['carga_segundos']:.3f}s  Total: {resumen['total_segundos']:.3f}s "
+          f"({len(resumen['variantes'])} variantes en {args.salida})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pandas as pd
+
+# Clasificación de rubros en categorías para "Ingresos por Concepto".
+# Las reglas se evalúan una vez por rubro (la tabla Rubros tiene decenas de
+# filas), no por cada línea de pago. La primera regla cuyo patrón aparezca en
+# el nombre (en minúsculas) gana; si ninguna aplica se usa el nombre en Title Case.
+#
+# Se pueden reemplazar con un JSON [[categoria, [patron, ...]], ...] indicado
+# en SISCAR_REGLAS_RUBROS.
+
+REGLAS_DEFECTO = [
+    ('Pensión', ('pensión', 'pension')),
+    ('Transporte', ('transporte',)),
+    ('Matrícula', ('matrícula', 'matricula')),
+    ('Seguro', ('seguro',)),
+    ('Sistemas', ('sistemas',)),
+]
+
+SIN_RUBRO = 'Sin Rubro'
+
+
+def cargar_reglas(path=None):
+    """Returns the classification rules from the JSON file in SISCAR_REGLAS_RUBROS, or the defaults."""
+    path = path or os.environ.get('SISCAR_REGLAS_RUBROS')
+    if not path:
+        return REGLAS_DEFECTO
+    with open(path, encoding='utf-8') as f:
+        return [(categoria, tuple(p.lower() for p in patrones)) for categoria, patrones in json.load(f)]
+
+
+def clasificar(nombre, reglas=None):
+    """Category of a single rubro name."""
+    if nombre is None or pd.isna(nombre):
+        return SIN_RUBRO
+    nombre = str(nombre).lower()
+    for categoria, patrones in reglas or REGLAS_DEFECTO:
+        if any(patron in nombre for patron in patrones):
+            return categoria
+    return nombre.title()
+
+
+def tabla_categorias(df_rubros, reglas=None):
+    """Cod_rubro -> Categoria_Rubro table, classifying each distinct rubro once."""
+    reglas = reglas or cargar_reglas()
+    tabla = df_rubros[['Cod_rubro', 'Nom_rubro']].drop_duplicates('Cod_rubro').reset_index(drop=True)
+    tabla['Categoria_Rubro'] = [clasificar(nombre, reglas) for nombre in tabla['Nom_rubro']]
+    tabla['Categoria_Rubro'] = tabla['Categoria_Rubro'].astype('category')
+    return tabla
+
+
+def asignar_categoria(df, tabla):
+    """Categorical Categoria_Rubro for each row of df, mapped through its Cod_rubro."""
+    mapa = dict(zip(tabla['Cod_rubro'], tabla['Categoria_Rubro']))
+    categorias = list(tabla['Categoria_Rubro'].cat.categories)
+    if SIN_RUBRO not in categorias:
+        categorias.append(SIN_RUBRO)
+    # Se clasifica cada rubro distinto (las categorías de Cod_rubro) y las filas
+    # solo toman el código de su rubro; el último destino es el de Cod_rubro nulo
+    cod_rubro = df['Cod_rubro'].astype('category')
+    destinos = pd.Index(categorias).get_indexer(
+        [mapa.get(rubro, SIN_RUBRO) for rubro in cod_rubro.cat.categories] + [SIN_RUBRO]
+    )
+    return pd.Categorical.from_codes(destinos[cod_rubro.cat.codes.to_numpy()], categories=categorias)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+import db_utils
+
+# Esquema tipado de los frames que guarda el proceso: los resúmenes de
+# data_cache.agregado (pagos, cargos, abonos, alumnos por curso) y el snapshot.
+# Los códigos y nombres repetidos se guardan como categóricas (códigos de 1-2
+# bytes por fila en lugar de strings) y los montos e ids se reducen a int32
+# cuando el rango lo permite. aplicar_esquema comparte un mismo diccionario
+# entre varios frames, para unirlos sin volver a strings.
+
+CATEGORICAS = [
+    'Cod_alumno', 'Cod_rubro', 'Nom_rubro', 'Categoria_Rubro', 'Cod_curso', 'Nom_curso', 'Nom_grado', 'Grado', 'Concepto',
+]
+
+MONTOS = ['Valor', 'Cargo', 'Total_Deuda', *db_utils.CONCEPTOS_DEUDA.values()]
+
+# Enteros compactos: int32 para montos, ids y periodos (las sumas de pandas suben a int64)
+ENTEROS = {
+    'Num_pago': np.int32, 'Periodo': np.int32, 'Anio': np.int16, 'Mes': np.int8, 'Num_Alumnos': np.int32,
+    **{columna: np.int32 for columna in MONTOS},
+}
+
+BOOLEANAS = ['Activo']
+
+
+def diccionarios(frames):
+    """Builds one CategoricalDtype per categorical column from the union of all frames."""
+    valores = {}
+    for df in frames.values():
+        for columna in CATEGORICAS:
+            if columna in df.columns:
+                serie = df[columna]
+                unicos = serie.cat.categories if isinstance(serie.dtype, pd.CategoricalDtype) else serie.dropna().unique()
+                valores.setdefault(columna, set()).update(unicos)
+    return {columna: pd.CategoricalDtype(sorted(v)) for columna, v in valores.items()}
+
+
+def _entero_compacto(serie, destino):
+    """Downcasts an integer column to `destino` when its range allows it."""
+    if not pd.api.types.is_integer_dtype(serie.dtype) or serie.empty or serie.dtype == destino:
+        return serie
+    info = np.iinfo(destino)
+    if serie.min() >= info.min and serie.max() <= info.max:
+        return serie.astype(destino)
+    return serie
+
+
+def tipar_frame(df, dtypes):
+    """Returns df with the shared categoricals, compact integers and nullable booleans.
+
+    Columns that already have their type are kept as they are, without a copy.
+    """
+    columnas = {}
+    for columna in df.columns:
+        serie = df[columna]
+        if columna in dtypes:
+            columnas[columna] = serie if serie.dtype == dtypes[columna] else serie.astype(dtypes[columna])
+        elif columna in ENTEROS:
+            columnas[columna] = _entero_compacto(serie, ENTEROS[columna])
+        elif columna in BOOLEANAS:
+            columnas[columna] = serie.astype('boolean')
+        else:
+            columnas[columna] = serie
+    return pd.DataFrame(columnas, index=df.index, copy=False)
+
+
+def tipar(df):
+    """Types a single frame against its own dictionaries."""
+    return tipar_frame(df, diccionarios({'frame': df}))
+
+
+def aplicar_esquema(frames):
+    """Types every frame of {name: DataFrame} against one set of shared dictionaries."""
+    dtypes = diccionarios(frames)
+    return {nombre: tipar_frame(df, dtypes) for nombre, df in frames.items()}
+
+
+def bytes_por_frame(frames):
+    """Deep memory usage in bytes of each frame, plus the total."""
+    uso = {nombre: int(df.memory_usage(deep=True).sum()) for nombre, df in frames.items()}
+    uso['total'] = sum(uso.values())
+    return uso
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+# Series de tiempo del recaudo sobre la clave entera de periodo yyyymm
+# (db_utils la calcula en SQL desde Fecha; en el cubo es el eje Periodo).
+# Una sola suma por periodo sobre el cubo llena una matriz densa años x 12
+# meses con todos los años a la vez; de ella salen la serie mensual, el
+# acumulado del año y la comparación con el mismo mes del año anterior con
+# operaciones de NumPy por columna, sin agrupar de nuevo por cada año.
+
+MESES = 12
+NOMBRES_MES = ('Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic')
+
+
+def periodo(anios, meses):
+    """yyyymm key of each year and month."""
+    return np.asarray(anios, dtype=np.int64) * 100 + np.asarray(meses, dtype=np.int64)
+
+
+def anio_mes(periodos):
+    """(years, months) of yyyymm keys."""
+    periodos = np.asarray(periodos, dtype=np.int64)
+    return periodos // 100, periodos % 100
+
+
+def matriz(cubo, eje='Periodo', **filtros):
+    """Monthly totals of every year as a dense matrix.
+
+    Returns (years, values, with_data): `values[i, m]` is the total of year
+    `years[i]` and month m + 1, and `with_data` marks the months with source
+    rows. Years without data between the first and the last are kept as zero rows.
+    """
+    etiquetas, valores, conteo = cubo.por_eje(eje, **filtros)
+    if etiquetas.empty:
+        return np.array([], dtype=np.int64), np.zeros((0, MESES), dtype=np.int64), np.zeros((0, MESES), dtype=bool)
+    anios, meses = anio_mes(etiquetas['Periodo'].to_numpy())
+    primero = int(anios.min())
+    filas = anios - primero
+    total = np.zeros((int(anios.max()) - primero + 1, MESES), dtype=np.int64)
+    con_datos = np.zeros(total.shape, dtype=bool)
+    np.add.at(total, (filas, meses - 1), valores)
+    np.logical_or.at(con_datos, (filas, meses - 1), conteo > 0)
+    return np.arange(primero, primero + len(total)), total, con_datos
+
+
+def _variacion(actual, anterior):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(anterior > 0, (actual - anterior) / anterior * 100, np.nan)
+
+
+def mensual(cubo, **filtros):
+    """Monthly, year-to-date and year-over-year series of every year, from one aggregation of the cube.
+
+    One row per month between the first and the last period with data:
+    Periodo, Anio, Mes, Valor, Acumulado (within the year), Valor_Anterior and
+    Acumulado_Anterior (same month of the previous year, NaN for the first
+    year), Variacion_Pct, Variacion_Acumulada_Pct and Con_Datos.
+    """
+    anios, total, con_datos = matriz(cubo, **filtros)
+    columnas = ['Periodo', 'Anio', 'Mes', 'Valor', 'Acumulado', 'Valor_Anterior', 'Acumulado_Anterior',
+                'Variacion_Pct', 'Variacion_Acumulada_Pct', 'Con_Datos']
+    if len(anios) == 0:
+        return pd.DataFrame(columns=columnas)
+    acumulado = total.cumsum(axis=1)
+    # El año anterior de la primera fila no está en la matriz: NaN
+    sin_anterior = np.full((1, MESES), np.nan)
+    anterior = np.vstack([sin_anterior, total[:-1]])
+    acumulado_anterior = np.vstack([sin_anterior, acumulado[:-1]])
+    serie = pd.DataFrame({
+        'Periodo': periodo(np.repeat(anios, MESES), np.tile(np.arange(1, MESES + 1), len(anios))),
+        'Anio': np.repeat(anios, MESES),
+        'Mes': np.tile(np.arange(1, MESES + 1), len(anios)),
+        'Valor': total.ravel(),
+        'Acumulado': acumulado.ravel(),
+        'Valor_Anterior': anterior.ravel(),
+        'Acumulado_Anterior': acumulado_anterior.ravel(),
+        'Variacion_Pct': _variacion(total, anterior).ravel(),
+        'Variacion_Acumulada_Pct': _variacion(acumulado, acumulado_anterior).ravel(),
+        'Con_Datos': con_datos.ravel(),
+    })
+    # Sin los meses antes del primer periodo y después del último (el año en curso no está completo)
+    marcados = np.flatnonzero(serie['Con_Datos'].to_numpy())
+    if len(marcados) == 0:
+        return pd.DataFrame(columns=columnas)
+    return serie.iloc[marcados[0]:marcados[-1] + 1].reset_index(drop=True)[columnas]
+
+
+def del_anio(serie, anio):
+    """Rows of one year of mensual() (every year when `anio` is None)."""
+    return serie if anio is None else serie[serie['Anio'] == anio].reset_index(drop=True)
@@ -0,0 +1,262 @@
+import argparse
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import db_utils
+import rubros
+
+# Generador de bases SISCAR sintéticas para pruebas de escala.
+# Copia de la base real el esquema (CREATE TABLE tal cual) de las tablas que
+# usa el dashboard y los catálogos Rubros y Grados; Curso, Alumno, Pago,
+# Detalle_pago, Cartera_alumnos y TBL_Alumnos_deudores se generan con NumPy:
+#   - escala multiplica los alumnos (300 en la base real) y los cursos por grado,
+#     como si fueran varias sedes;
+#   - anios es la cantidad de años lectivos de historia.
+# Cada alumno paga matrícula (nov-dic del año anterior) y diez pensiones
+# (feb-nov), con transporte si lo usa; los cargos del último año (el año lectivo
+# de Colegio) quedan en Cartera_alumnos y las pensiones no pagadas también en
+# TBL_Alumnos_deudores. Con escala=1 y anios=1 las tablas tienen el tamaño de
+# la base real.
+#
+#   python sintetico.py --destino /tmp/siscar_x100.db --escala 100 --anios 10
+
+TABLAS = ['Colegio', 'Rubros', 'Grados', 'Curso', 'Alumno', 'Pago', 'Detalle_pago', 'Cartera_alumnos', 'TBL_Alumnos_deudores']
+CATALOGOS = ['Rubros', 'Grados']
+
+ALUMNOS_BASE = 300
+PROB_ACTIVO = 0.92
+PROB_TRANSPORTE = 0.3
+PROB_MORA = 0.08
+MESES_PENSION = list(range(2, 12))
+
+NOMBRES = ['MARTÍN', 'SOFÍA', 'SANTIAGO', 'VALENTINA', 'MATÍAS', 'ISABELLA', 'SAMUEL', 'MARIANA',
+           'ALEJANDRO', 'LUCIANA', 'GERONIMO', 'SALOMÉ', 'DANIEL', 'GABRIELA', 'TOMÁS', 'ANTONELLA']
+APELLIDOS = ['RODRÍGUEZ', 'GÓMEZ', 'MARTÍNEZ', 'GARCÍA', 'LÓPEZ', 'PEÑA', 'TORRES', 'RAMÍREZ',
+             'CARVAJAL', 'BENAVIDES', 'VILLABÓN', 'TRUJILLO', 'SÁNCHEZ', 'DÍAZ', 'MORENO', 'ROJAS']
+
+
+def _ms(anio, mes, dia):
+    # 05:00 UTC = medianoche en Colombia, como las fechas de la base real
+    return int(datetime(anio, mes, dia, 5, tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _copiar_esquema(origen, destino):
+    for tabla in TABLAS:
+        sql = origen.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone()
+        if sql is None:
+            raise ValueError(f"La plantilla no tiene la tabla {tabla}")
+        destino.execute(sql[0])
+    for tabla in CATALOGOS:
+        cur = origen.execute(f'SELECT * FROM "{tabla}"')
+        marcas = ', '.join('?' * len(cur.description))
+        destino.executemany(f'INSERT INTO "{tabla}" VALUES ({marcas})', cur.fetchall())
+
+
+def _cursos(grados, escala):
+    """One course per grade and campus; escala > 1 adds campuses."""
+    sedes = max(1, math.ceil(escala))
+    filas = []
+    for cod_grado, nom_grado in grados:
+        for sede in range(1, sedes + 1):
+            nombre = nom_grado if sedes == 1 else f"{nom_grado} {sede}"
+            filas.append((f"{cod_grado}{sede:02d}", cod_grado, f"{sede:02d}", nombre, '01', None, None))
+    return pd.DataFrame(filas, columns=['Cod_curso', 'Grado', 'Curso', 'Nom_curso', 'Jornada', 'Director', 'NuevoC'])
+
+
+def _rubro_por_grado(df_rubros, categoria, grados, rng):
+    """(Cod_rubro, Valor_rubro) per grade for a category, preferring the rubro tied to the grade."""
+    tabla = rubros.tabla_categorias(df_rubros)
+    tabla = tabla.merge(df_rubros[['Cod_rubro', 'Valor_rubro', 'CodCursoR']], on='Cod_rubro')
+    candidatos = tabla[(tabla['Categoria_Rubro'] == categoria) & (tabla['Valor_rubro'] > 0)]
+    if candidatos.empty:
+        candidatos = df_rubros[df_rubros['Valor_rubro'] > 0]
+    codigos, valores = [], []
+    for cod_grado in grados:
+        propios = candidatos[candidatos['CodCursoR'].fillna('').str.startswith(cod_grado)]
+        fila = (propios if not propios.empty else candidatos).iloc[rng.integers(len(propios) or len(candidatos))]
+        codigos.append(fila['Cod_rubro'])
+        valores.append(int(fila['Valor_rubro']))
+    return np.array(codigos, dtype=object), np.array(valores, dtype=np.int64)
+
+
+def _insertar(conn, tabla, df):
+    marcas = ', '.join('?' * len(df.columns))
+    columnas = ', '.join(f'"{c}"' for c in df.columns)
+    filas = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    conn.executemany(f'INSERT INTO "{tabla}" ({columnas}) VALUES ({marcas})', filas)
+
+
+def generar_base(destino, escala=1, anios=1, anio_final=2025, semilla=0, plantilla=None):
+    """Writes a synthetic SISCAR database at `destino`; returns the row count per table."""
+    rng = np.random.default_rng(semilla)
+    if os.path.exists(destino):
+        os.remove(destino)
+    origen = db_utils.get_connection(plantilla)
+    conn = sqlite3.connect(destino)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        _copiar_esquema(origen, conn)
+        df_rubros = pd.read_sql_query("SELECT Cod_rubro, Nom_rubro, Valor_rubro, CodCursoR FROM Rubros", origen)
+        grados = origen.execute(
+            "SELECT Cod_grado, Nom_grado FROM Grados WHERE Cod_grado IS NOT NULL ORDER BY Cod_grado"
+        ).fetchall()
+    finally:
+        origen.close()
+
+    with conn:
+        # Sin nombre: en una federación el colegio se identifica por el nombre del archivo
+        conn.execute('INSERT INTO Colegio ("añoLectivo") VALUES (?)', (anio_final,))
+        cursos = _cursos(grados, escala)
+        _insertar(conn, 'Curso', cursos)
+
+        # --- Alumnos ---
+        n = max(1, round(ALUMNOS_BASE * escala))
+        curso_idx = rng.integers(len(cursos), size=n)
+        grado_idx = pd.Index([g for g, _ in grados]).get_indexer(cursos['Grado'].to_numpy()[curso_idx])
+        activo = rng.random(n) < PROB_ACTIVO
+        transporte = rng.random(n) < PROB_TRANSPORTE
+        codigos = np.array([str(10000 + i) for i in range(n)], dtype=object)
+        nombres = {
+            'P_apellido_alu': np.array(APELLIDOS, dtype=object)[rng.integers(len(APELLIDOS), size=n)],
+            'S_apellido_alu': np.array(APELLIDOS, dtype=object)[rng.integers(len(APELLIDOS), size=n)],
+            'P_nombre_alu': np.array(NOMBRES, dtype=object)[rng.integers(len(NOMBRES), size=n)],
+            'S_nombre_alu': np.where(rng.random(n) < 0.5, np.array(NOMBRES, dtype=object)[rng.integers(len(NOMBRES), size=n)], None),
+        }
+        alumnos = pd.DataFrame({
+            'Cod_alumno': codigos, **nombres,
+            'Curso': cursos['Cod_curso'].to_numpy()[curso_idx],
+            'Activo': activo.astype(int), 'Saldo': 0, 'TransporteAlum': transporte.astype(int),
+        })
+        _insertar(conn, 'Alumno', alumnos)
+
+        cod_grados = [g for g, _ in grados]
+        mat_cod, mat_valor = _rubro_por_grado(df_rubros, 'Matrícula', cod_grados, rng)
+        pen_cod, pen_valor = _rubro_por_grado(df_rubros, 'Pensión', cod_grados, rng)
+        tra_cod, tra_valor = _rubro_por_grado(df_rubros, 'Transporte', cod_grados, rng)
+
+        # --- Pagos: matrícula + diez pensiones por alumno activo y año ---
+        pagadores = np.flatnonzero(activo)
+        fechas, alumno_pago, tipo_pago, nombre_pago = [], [], [], []
+        for anio in range(anio_final - anios + 1, anio_final + 1):
+            dias = rng.integers(1, 29, size=len(pagadores))
+            mes_mat = rng.choice([11, 12], size=len(pagadores))
+            base = np.where(mes_mat == 11, _ms(anio - 1, 11, 1), _ms(anio - 1, 12, 1))
+            fechas.append(base + (dias - 1).astype(np.int64) * 86_400_000)
+            alumno_pago.append(pagadores)
+            tipo_pago.append(np.zeros(len(pagadores), dtype=np.int8))
+            nombre_pago.append(np.full(len(pagadores), f"MATRICULA {anio}", dtype=object))
+            for mes in MESES_PENSION:
+                pagan = pagadores[rng.random(len(pagadores)) >= PROB_MORA]
+                dias = rng.integers(1, 29, size=len(pagan))
+                base = _ms(anio, mes, 1)
+                fechas.append(base + (dias - 1).astype(np.int64) * 86_400_000)
+                alumno_pago.append(pagan)
+                tipo_pago.append(np.full(len(pagan), mes, dtype=np.int8))
+                nombre_pago.append(np.full(len(pagan), f"PENSION {mes}", dtype=object))
+                if anio == anio_final:
+                    en_mora = np.setdiff1d(pagadores, pagan, assume_unique=True)
+                    _deudas(conn, alumnos, cursos, curso_idx, grado_idx, en_mora, mes, pen_valor, tra_valor, transporte)
+
+        fechas = np.concatenate(fechas)
+        orden = np.argsort(fechas, kind='stable')
+        fechas = fechas[orden]
+        alumno_pago = np.concatenate(alumno_pago)[orden]
+        tipo_pago = np.concatenate(tipo_pago)[orden]
+        nombre_pago = np.concatenate(nombre_pago)[orden]
+        num_pago = np.arange(1, len(fechas) + 1)
+        _insertar(conn, 'Pago', pd.DataFrame({
+            'Num_pago': num_pago, 'Cod_alumno': codigos[alumno_pago], 'Fecha': fechas,
+            'Nom_cliente': nombre_pago, 'Entidad': 3, 'Nom_entidad': 'BANCO',
+        }))
+
+        g = grado_idx[alumno_pago]
+        es_mat = tipo_pago == 0
+        detalle = pd.DataFrame({
+            'Num_pago': num_pago,
+            'Cod_rubro': np.where(es_mat, mat_cod[g], pen_cod[g]),
+            'Valor': np.where(es_mat, mat_valor[g], pen_valor[g]),
+        })
+        con_transporte = ~es_mat & transporte[alumno_pago]
+        detalle_transporte = pd.DataFrame({
+            'Num_pago': num_pago[con_transporte],
+            'Cod_rubro': tra_cod[g[con_transporte]],
+            'Valor': tra_valor[g[con_transporte]],
+        })
+        _insertar(conn, 'Detalle_pago', pd.concat([detalle, detalle_transporte], ignore_index=True))
+
+        _cargos(conn, codigos, grado_idx, pagadores, transporte, mat_valor, pen_valor, tra_valor)
+
+        # Matrícula pendiente (Mes 0) de algunos alumnos activos
+        pendientes = pagadores[rng.random(len(pagadores)) < PROB_MORA / 2]
+        _deudas(conn, alumnos, cursos, curso_idx, grado_idx, pendientes, 0, mat_valor, None, transporte, concepto='Matricula')
+
+    filas = {tabla: conn.execute(f'SELECT COUNT(*) FROM "{tabla}"').fetchone()[0] for tabla in TABLAS}
+    conn.close()
+    return filas
+
+
+def _cargos(conn, codigos, grado_idx, indices, transporte, mat_valor, pen_valor, tra_valor):
+    """Cartera_alumnos of the last year: matrícula (Mes 0) and one pension (plus transport) per month."""
+    meses = np.array([0] + MESES_PENSION)
+    alumno = np.repeat(indices, len(meses))
+    mes = np.tile(meses, len(indices))
+    g = grado_idx[alumno]
+    es_mat = mes == 0
+    ceros = np.zeros(len(alumno), dtype=np.int64)
+    conceptos = {c: ceros for c in db_utils.CONCEPTOS_CARGO}
+    conceptos['Matricula'] = np.where(es_mat, mat_valor[g], 0)
+    conceptos['Pension'] = np.where(es_mat, 0, pen_valor[g])
+    conceptos['Transporte'] = np.where(~es_mat & transporte[alumno], tra_valor[g], 0)
+    _insertar(conn, 'Cartera_alumnos', pd.DataFrame({'Cod_alumno': codigos[alumno], **conceptos, 'Mes': mes}))
+
+
+def _deudas(conn, alumnos, cursos, curso_idx, grado_idx, indices, mes, valor, valor_transporte, transporte, concepto='Pension'):
+    if len(indices) == 0:
+        return
+    g = grado_idx[indices]
+    ceros = np.zeros(len(indices), dtype=np.int64)
+    conceptos = {c: ceros for c in ['Matricula', 'Pension', 'Transporte', 'Sistemas', 'Asociacion', 'Otros', 'Ludicas', 'Mpruebas']}
+    conceptos[concepto] = valor[g]
+    if valor_transporte is not None:
+        conceptos['Transporte'] = np.where(transporte[indices], valor_transporte[g], 0)
+    deudas = pd.DataFrame({
+        'Cod_alumno': alumnos['Cod_alumno'].to_numpy()[indices],
+        'P_apellido_alu': alumnos['P_apellido_alu'].to_numpy()[indices],
+        'S_apellido_alu': alumnos['S_apellido_alu'].to_numpy()[indices],
+        'P_nombre_alu': alumnos['P_nombre_alu'].to_numpy()[indices],
+        'S_nombre_alu': alumnos['S_nombre_alu'].to_numpy()[indices],
+        'Deuda': None,
+        'Nom_curso': cursos['Nom_curso'].to_numpy()[curso_idx[indices]],
+        'Cod_curso': cursos['Cod_curso'].to_numpy()[curso_idx[indices]],
+        'Mes': mes,
+        **conceptos,
+    })
+    _insertar(conn, 'TBL_Alumnos_deudores', deudas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera una base SISCAR sintética a escala.")
+    parser.add_argument('--destino', required=True, help="Archivo SQLite a escribir (se reemplaza)")
+    parser.add_argument('--escala', type=float, default=1, help="Factor de alumnos y cursos respecto a la base real (1-1000)")
+    parser.add_argument('--anios', type=int, default=1, help="Años lectivos de historia")
+    parser.add_argument('--anio-final', type=int, default=2025, help="Último año lectivo generado")
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--plantilla', default=db_utils.DB_PATH, help="Base de la que se copian esquema y catálogos")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    filas = generar_base(args.destino, args.escala, args.anios, args.anio_final, args.semilla, args.plantilla)
+    for tabla, n in filas.items():
+        print(f"{tabla:<22} {n:>12,}")
+    print(f"Base escrita en {args.destino} ({time.perf_counter() - inicio:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
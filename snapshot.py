@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import db_utils
+import schema
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow llega con streamlit, pero el módulo no depende de ello
+    pa = None
+    feather = None
+
+# Snapshot columnar (Arrow IPC / Feather v2 sin compresión) de los resúmenes que
+# carga el dashboard (federacion._cargar_colegio): pagos por periodo/grado/curso/rubro,
+# cargos y abonos por alumno y alumnos activos por curso. Sin compresión los archivos
+# se pueden memory-mapear: varios procesos comparten las mismas páginas y un arranque
+# en frío lee columnas ya armadas en lugar de volver a agregar en SQLite. Lo escribe
+# maintenance.py después de refrescar los rollups; mientras la versión de datos
+# coincida, las cargas completas de federacion lo leen (las cargas delta siguen en SQL).
+# Se escriben con el esquema de schema.py (las categóricas viajan como columnas
+# diccionario) y se leen con to_pandas(split_blocks=True): cada columna numérica y
+# los códigos de cada categórica quedan como vistas del archivo mapeado, sin copia.
+#
+# Estructura junto a la base:
+#   siscar_estadistica_snapshot/
+#       actual.json          -> {"version": "<carpeta>"}
+#       <carpeta>/manifest.json, pagos_resumen.feather, cargos_alumno.feather, ...
+
+DATASETS = {
+    'pagos_resumen': db_utils.query_pagos_resumen,
+    'cargos_alumno': db_utils.query_cargos_alumno,
+    'abonos_alumno': db_utils.query_abonos_alumno,
+    'alumnos_curso': db_utils.query_alumnos_activos_por_curso,
+}
+
+VERSIONES_A_CONSERVAR = 2
+
+
+def snapshot_dir(db_path=None):
+    """Folder holding the snapshot versions of a database file."""
+    db_path = os.path.abspath(db_path or db_utils.DB_PATH)
+    base, _ = os.path.splitext(db_path)
+    return base + '_snapshot'
+
+
+def _version_json(db_path):
+    return json.dumps(db_utils.get_data_version(db_path))
+
+
+def _leer_actual(raiz):
+    try:
+        with open(os.path.join(raiz, 'actual.json'), encoding='utf-8') as f:
+            carpeta = os.path.join(raiz, json.load(f)['version'])
+        with open(os.path.join(carpeta, 'manifest.json'), encoding='utf-8') as f:
+            return carpeta, json.load(f)
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def exportar_snapshot(db_path=None, frames=None):
+    """Writes the dashboard summaries (DATASETS) as a new snapshot version.
+
+    Returns the folder of the new version. The `actual.json` pointer is
+    swapped atomically, so readers never see a half-written snapshot.
+    """
+    if feather is None:
+        raise RuntimeError("pyarrow is required to export the columnar snapshot")
+    db_path = os.path.abspath(db_path or db_utils.DB_PATH)
+    version = _version_json(db_path)
+    if frames is None:
+        frames = {nombre: loader(db_path=db_path) for nombre, loader in DATASETS.items()}
+    frames = {nombre: schema.tipar(df) for nombre, df in frames.items()}
+
+    raiz = snapshot_dir(db_path)
+    # Nanosegundos en el nombre: dos exportes en el mismo segundo no chocan y el orden sigue siendo cronológico
+    nombre = time.strftime('%Y%m%d%H%M%S') + f'{time.time_ns() % 10**9:09d}_{os.getpid()}'
+    carpeta = os.path.join(raiz, nombre)
+    os.makedirs(carpeta)
+    filas = {}
+    for dataset, df in frames.items():
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        feather.write_feather(tabla, os.path.join(carpeta, f'{dataset}.feather'), compression='uncompressed')
+        filas[dataset] = tabla.num_rows
+    manifest = {'version_datos': version, 'creado': time.time(), 'filas': filas}
+    with open(os.path.join(carpeta, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    tmp = os.path.join(raiz, 'actual.json.tmp')
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump({'version': nombre}, f)
+    os.replace(tmp, os.path.join(raiz, 'actual.json'))
+    _limpiar_versiones(raiz, nombre)
+    return carpeta
+
+
+def _limpiar_versiones(raiz, actual):
+    versiones = sorted(
+        d for d in os.listdir(raiz)
+        if os.path.isdir(os.path.join(raiz, d)) and d != actual
+    )
+    # Se conserva la versión previa por si un proceso la tiene mapeada
+    for viejo in versiones[:max(0, len(versiones) - (VERSIONES_A_CONSERVAR - 1))]:
+        shutil.rmtree(os.path.join(raiz, viejo), ignore_errors=True)
+
+
+def snapshot_vigente(db_path=None):
+    """Returns the folder of the current snapshot if it matches the database, else None."""
+    if feather is None:
+        return None
+    db_path = os.path.abspath(db_path or db_utils.DB_PATH)
+    carpeta, manifest = _leer_actual(snapshot_dir(db_path))
+    if carpeta is None or manifest.get('version_datos') != _version_json(db_path):
+        return None
+    return carpeta
+
+
+def cargar_snapshot(db_path=None, datasets=None):
+    """Memory-maps the current snapshot; returns {dataset: DataFrame} or None if stale/missing.
+
+    The frames are already typed (schema.tipar) and their columns are views of the mapped files.
+    """
+    carpeta = snapshot_vigente(db_path)
+    if carpeta is None:
+        return None
+    frames = {}
+    for dataset in datasets or DATASETS:
+        tabla = feather.read_table(os.path.join(carpeta, f'{dataset}.feather'), memory_map=True)
+        frames[dataset] = tabla.to_pandas(split_blocks=True)
+    return frames
+
+
+def load_data(db_path=None, datasets=None, usar_snapshot=True):
+    """Loads the typed summaries from the snapshot when current, from SQLite otherwise."""
+    datasets = list(datasets or DATASETS)
+    frames = cargar_snapshot(db_path, datasets) if usar_snapshot else None
+    if frames is None:
+        frames = {dataset: schema.tipar(DATASETS[dataset](db_path=db_path)) for dataset in datasets}
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el snapshot columnar de la base SISCAR.")
+    parser.add_argument('--db', default=db_utils.DB_PATH, help="Ruta de la base SQLite (por defecto %(default)s)")
+    parser.add_argument('--si-cambio', action='store_true', help="Solo exportar si el snapshot actual está desactualizado")
+    args = parser.parse_args()
+
+    if args.si_cambio and snapshot_vigente(args.db):
+        print("Snapshot al día, nada que exportar.")
+        return
+    inicio = time.perf_counter()
+    carpeta = exportar_snapshot(args.db)
+    print(f"Snapshot escrito en {carpeta} ({time.perf_counter() - inicio:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# Los módulos del dashboard viven en la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sintetico  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def base_sintetica(tmp_path_factory):
+    """Small synthetic database (sintetico.py, two school years), built once per session."""
+    path = str(tmp_path_factory.mktemp('bases') / 'siscar_prueba.db')
+    sintetico.generar_base(path, escala=1, anios=2)
+    return path
+
+
+@pytest.fixture
+def base(base_sintetica, tmp_path):
+    """Private copy of the synthetic database, safe to modify in a test."""
+    path = str(tmp_path / 'siscar.db')
+    shutil.copyfile(base_sintetica, path)
+    return path
@@ -0,0 +1,94 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import db_utils
+import maintenance
+
+TODO = 10**6
+
+
+def _alumno_con_mas_filas(path, tabla):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f"SELECT Cod_alumno FROM {tabla} GROUP BY Cod_alumno ORDER BY COUNT(*) DESC LIMIT 1").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def _paginas(funcion, cod_alumno, limite, path):
+    """Every page of a history, following the cursors until the last one."""
+    paginas, cursor = [], None
+    while True:
+        pagina, cursor = funcion(cod_alumno, despues=cursor, limite=limite, db_path=path)
+        paginas.append(pagina)
+        if cursor is None:
+            return paginas
+
+
+@pytest.mark.parametrize('funcion, tabla', [
+    (db_utils.historial_pagos, 'Pago'),
+    (db_utils.historial_cargos, 'Cartera_alumnos'),
+])
+def test_historial_paginado_devuelve_cada_fila_una_vez_en_orden(base, funcion, tabla):
+    cod_alumno = _alumno_con_mas_filas(base, tabla)
+    completo, cursor = funcion(cod_alumno, limite=TODO, db_path=base)
+    assert cursor is None and len(completo) > 3
+
+    for limite in (1, 3, 4):
+        paginas = _paginas(funcion, cod_alumno, limite, base)
+        assert len(paginas) > 1
+        # La última página trae cursor None; ninguna queda vacía
+        assert all(len(pagina) for pagina in paginas)
+        pd.testing.assert_frame_equal(pd.concat(paginas, ignore_index=True), completo)
+
+
+def test_ultima_pagina_exacta_sin_cursor(base):
+    cod_alumno = _alumno_con_mas_filas(base, 'Pago')
+    completo, _ = db_utils.historial_pagos(cod_alumno, limite=TODO, db_path=base)
+    pagos = completo['Num_pago'].nunique()
+
+    # Página justa con todos los pagos: no hay siguiente
+    pagina, cursor = db_utils.historial_pagos(cod_alumno, limite=pagos, db_path=base)
+    assert cursor is None
+    pd.testing.assert_frame_equal(pagina, completo)
+    # Una menos: la segunda página trae el pago restante y cierra
+    primera, cursor = db_utils.historial_pagos(cod_alumno, limite=pagos - 1, db_path=base)
+    segunda, cursor = db_utils.historial_pagos(cod_alumno, despues=cursor, limite=pagos - 1, db_path=base)
+    assert cursor is None
+    assert segunda['Num_pago'].nunique() == 1
+
+
+BUSQUEDAS = ['sanchez', 'SÁNCHEZ', 'Sánchez garcia', 'garcía ale', 'martin', 'MARTÍ', 'pena', 'PEÑA', '1000', 'zzz']
+
+
+def _encontrados(path):
+    return {texto: set(db_utils.buscar_alumnos(texto, limite=TODO, db_path=path)['Cod_alumno']) for texto in BUSQUEDAS}
+
+
+def test_busqueda_con_tildes_igual_con_fts_y_sin_indice(base):
+    conn = sqlite3.connect(base)
+    conn.execute("UPDATE Alumno SET P_apellido_alu = 'PEÑA' WHERE rowid % 7 = 0")
+    conn.commit()
+    conn.close()
+
+    sin_indice = _encontrados(base)
+    conn = db_utils.get_connection(base, readonly=False)
+    try:
+        try:
+            maintenance.refrescar_busqueda(conn)
+        except sqlite3.OperationalError:
+            pytest.skip("SQLite sin FTS5")
+    finally:
+        conn.close()
+    # El índice está al día: buscar_alumnos lo usa en lugar de recorrer Alumno
+    with db_utils.pooled_connection(base) as conn:
+        assert db_utils._rollup_estado(conn, db_utils.BUSQUEDA_ALUMNOS)[1] == db_utils._firma_alumnos_version(base)
+    con_fts = _encontrados(base)
+
+    assert con_fts == sin_indice
+    assert sin_indice['sanchez'] and sin_indice['pena'] and not sin_indice['zzz']
+    # Con o sin tildes y mayúsculas se encuentra lo mismo
+    assert sin_indice['sanchez'] == sin_indice['SÁNCHEZ']
+    assert sin_indice['pena'] == sin_indice['PEÑA']
@@ -0,0 +1,80 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import cube
+import db_utils
+import libro_cartera
+import rubros
+
+HOY = date(2025, 6, 15)
+
+
+@pytest.fixture(scope='module')
+def pagos(base_sintetica):
+    """Payment summary tagged like federacion.py does, plus the year and month of its yyyymm period."""
+    df = db_utils.query_pagos_resumen(db_path=base_sintetica)
+    df = df.assign(Colegio='prueba', Categoria_Rubro=rubros.asignar_categoria(df, db_utils.categorias_rubro(base_sintetica)))
+    return df.assign(Anio=df['Periodo'] // 100, Mes=df['Periodo'] % 100)
+
+
+@pytest.fixture(scope='module')
+def libro(base_sintetica):
+    cargos = db_utils.query_cargos_alumno(db_path=base_sintetica)
+    abonos = db_utils.query_abonos_alumno(db_path=base_sintetica)
+    # La base sintética queda al día: sin uno de cada tres abonos hay deuda en todos los tramos
+    abonos = abonos[abonos.index % 3 != 0]
+    return libro_cartera.libro(cargos, abonos, HOY).assign(Colegio='prueba')
+
+
+def _groupby(df, columnas, valor):
+    resultado = df.groupby(columnas, dropna=False, observed=True, as_index=False)[valor].sum()
+    return resultado[resultado[valor] != 0].sort_values(columnas, ignore_index=True)
+
+
+def _corte(cubo, columnas, valor, **filtros):
+    resultado = cubo.por(columnas, valor, **filtros)
+    return resultado[resultado[valor] != 0].sort_values(columnas, ignore_index=True)
+
+
+def test_total_del_cubo_de_pagos(pagos):
+    cubo = cube.cubo_pagos(pagos)
+    assert cubo.total() == pagos['Valor'].sum()
+    anio = int(pagos['Anio'].max())
+    assert cubo.total(Anio=anio) == pagos.loc[pagos['Anio'] == anio, 'Valor'].sum()
+
+
+@pytest.mark.parametrize('columnas', [
+    ['Nom_grado'],
+    ['Nom_curso'],
+    ['Anio', 'Mes'],
+    ['Categoria_Rubro'],
+    ['Nom_grado', 'Cod_rubro'],
+])
+def test_cortes_de_pagos_igual_a_groupby(pagos, columnas):
+    cubo = cube.cubo_pagos(pagos)
+    pd.testing.assert_frame_equal(
+        _corte(cubo, columnas, 'Valor'), _groupby(pagos, columnas, 'Valor'), check_dtype=False, check_categorical=False,
+    )
+
+
+def test_cortes_filtrados_de_pagos(pagos):
+    cubo = cube.cubo_pagos(pagos)
+    anio = int(pagos['Anio'].max())
+    grados = sorted(pagos['Nom_grado'].dropna().unique())[:3]
+    filtrado = pagos[(pagos['Anio'] == anio) & pagos['Nom_grado'].isin(grados)]
+    pd.testing.assert_frame_equal(
+        _corte(cubo, ['Mes'], 'Valor', Anio=anio, Nom_grado=grados), _groupby(filtrado, ['Mes'], 'Valor'), check_dtype=False,
+    )
+
+
+@pytest.mark.parametrize('columnas', [['Concepto'], ['Grado'], ['Anio', 'Mes'], ['Edad']])
+def test_cortes_de_cartera_igual_a_groupby(libro, columnas):
+    cubo = cube.cubo_cartera(libro)
+    deuda = libro[libro['Deuda'] > 0]
+    assert not deuda.empty
+    assert cubo.total() == deuda['Deuda'].sum()
+    pd.testing.assert_frame_equal(
+        _corte(cubo, columnas, 'Deuda'), _groupby(deuda, columnas, 'Deuda'), check_dtype=False, check_categorical=False,
+    )
@@ -0,0 +1,76 @@
+import functools
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import data_cache
+import db_utils
+import schema
+
+DIA_MS = 86_400_000
+
+# (consulta, columnas clave) de las cargas incrementales de federacion.py
+AGREGADOS = {
+    'pagos_resumen': (db_utils.query_pagos_resumen, ['Periodo', 'Nom_grado', 'Nom_curso', 'Cod_rubro']),
+    'abonos_alumno': (db_utils.query_abonos_alumno, ['Cod_alumno', 'Anio', 'Concepto']),
+}
+
+
+def _agregar_pagos(path):
+    """Copies the last payment twice above the max Num_pago: same date, and one month later."""
+    conn = sqlite3.connect(path)
+    try:
+        ultimo = conn.execute("SELECT MAX(Num_pago) FROM Pago").fetchone()[0]
+        for nuevo, desplazamiento in ((ultimo + 1, 0), (ultimo + 2, 31 * DIA_MS)):
+            conn.execute(
+                "INSERT INTO Pago (Num_pago, Cod_alumno, Fecha, Nom_cliente, Entidad, Nom_entidad) "
+                "SELECT ?, Cod_alumno, Fecha + ?, Nom_cliente, Entidad, Nom_entidad FROM Pago WHERE Num_pago = ?",
+                (nuevo, desplazamiento, ultimo),
+            )
+            conn.execute(
+                "INSERT INTO Detalle_pago (Num_pago, Cod_rubro, Valor) "
+                "SELECT ?, Cod_rubro, Valor FROM Detalle_pago WHERE Num_pago = ?",
+                (nuevo, ultimo),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _ordenado(df, claves):
+    return df.sort_values(claves, ignore_index=True)[sorted(df.columns)]
+
+
+@pytest.mark.parametrize('nombre', sorted(AGREGADOS))
+def test_carga_incremental_igual_a_recarga(base, nombre):
+    consulta, claves = AGREGADOS[nombre]
+    cargar = functools.partial(consulta, db_path=base)
+    data_cache.limpiar()
+    data_cache.agregado((nombre, base), cargar, db_utils.get_data_version(base), claves, db_path=base)
+
+    _agregar_pagos(base)
+    deltas = data_cache.estadisticas()['deltas']
+    incremental = data_cache.agregado((nombre, base), cargar, db_utils.get_data_version(base), claves, db_path=base)
+
+    assert data_cache.estadisticas()['deltas'] == deltas + 1
+    pd.testing.assert_frame_equal(_ordenado(incremental, claves), _ordenado(schema.tipar(cargar()), claves))
+
+
+def test_cambio_de_dimensiones_recarga_completa(base):
+    consulta, claves = AGREGADOS['pagos_resumen']
+    cargar = functools.partial(consulta, db_path=base)
+    data_cache.limpiar()
+    data_cache.agregado(('pagos_resumen', base), cargar, db_utils.get_data_version(base), claves, db_path=base)
+
+    conn = sqlite3.connect(base)
+    # Un curso nuevo cambia la firma de dimensiones (filas y MAX(rowid) de Curso)
+    conn.execute("INSERT INTO Curso SELECT * FROM Curso WHERE rowid = (SELECT MIN(rowid) FROM Curso)")
+    conn.commit()
+    conn.close()
+    _agregar_pagos(base)
+    cargas = data_cache.estadisticas()['cargas']
+    resultado = data_cache.agregado(('pagos_resumen', base), cargar, db_utils.get_data_version(base), claves, db_path=base)
+
+    assert data_cache.estadisticas()['cargas'] == cargas + 1
+    pd.testing.assert_frame_equal(_ordenado(resultado, claves), _ordenado(schema.tipar(cargar()), claves))
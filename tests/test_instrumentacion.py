@@ -0,0 +1,20 @@
+import instrumentacion
+
+
+def test_span_dentro_de_la_seccion_y_log(tmp_path):
+    traza = instrumentacion.Traza()
+    traza.seccion('carga')
+    with traza.span('consultas') as span:
+        span.filas = 10
+    traza.seccion('kpis')
+    traza.terminar()
+
+    log = str(tmp_path / 'tiempos.jsonl')
+    for _ in range(3):
+        instrumentacion.escribir_jsonl(log, traza.registro(anio=2025))
+
+    registros = instrumentacion.leer_jsonl(log, ultimos=2)
+    assert len(registros) == 2
+    assert [s['seccion'] for s in registros[-1]['secciones']] == ['carga', 'carga/consultas', 'kpis']
+    assert registros[-1]['secciones'][1]['filas'] == 10
+    assert instrumentacion.leer_jsonl(str(tmp_path / 'no_existe.jsonl')) == []
@@ -0,0 +1,59 @@
+from datetime import date
+
+import pandas as pd
+
+import libro_cartera
+
+# Caso resuelto a mano, con corte al 15 de marzo de 2024:
+#   A paga 250 de una matrícula de 200 -> 50 a favor en la matrícula.
+#   A paga 100 + 50 de tres pensiones de 100 -> FIFO: la de febrero completa,
+#     la de marzo a medias y la de abril (aún no vencida) sin abono.
+#   A paga 80 de transporte sin cargo de transporte -> no entra al libro.
+#   B no paga la pensión de noviembre de 2023 -> el corte de 2023 es el 31 de diciembre.
+CARGOS = pd.DataFrame({
+    'Cod_alumno': ['A', 'A', 'A', 'A', 'B'],
+    'Grado': ['Primero', 'Primero', 'Primero', 'Primero', 'Segundo'],
+    'Anio': [2024, 2024, 2024, 2024, 2023],
+    'Mes': [4, 3, 2, 0, 11],
+    'Concepto': ['Pension', 'Pension', 'Pension', 'Matricula', 'Pension'],
+    'Cargo': [100, 100, 100, 200, 100],
+})
+ABONOS = pd.DataFrame({
+    'Cod_alumno': ['A', 'A', 'A', 'A'],
+    'Anio': [2024, 2024, 2024, 2024],
+    'Concepto': ['Matricula', 'Pension', 'Pension', 'Transporte'],
+    'Valor': [250, 100, 50, 80],
+})
+HOY = date(2024, 3, 15)
+
+
+def test_libro_fifo_resuelto_a_mano():
+    libro = libro_cartera.libro(CARGOS, ABONOS, HOY)
+    esperado = pd.DataFrame({
+        'Cod_alumno': ['A', 'A', 'A', 'A', 'B'],
+        'Anio': [2024, 2024, 2024, 2024, 2023],
+        'Mes': [0, 2, 3, 4, 11],
+        'Concepto': ['Matricula', 'Pension', 'Pension', 'Pension', 'Pension'],
+        'Cargo': [200, 100, 100, 100, 100],
+        'Abono': [250, 100, 50, 0, 0],
+        'Saldo': [-50, 0, 50, 100, 100],
+        # Días desde el primer día del mes (la matrícula vence en enero) hasta el corte de su año
+        'Dias': [74, 43, 14, -17, 60],
+        'Edad': ['61-90', '31-60', '0-30', 'Por vencer', '31-60'],
+        'Deuda': [0, 0, 50, 0, 100],
+    })
+    resultado = libro[list(esperado.columns)].astype({'Edad': str})
+    pd.testing.assert_frame_equal(resultado, esperado, check_dtype=False)
+
+
+def test_abonos_sin_cargo_no_entran():
+    libro = libro_cartera.libro(CARGOS, ABONOS, HOY)
+    assert 'Transporte' not in set(libro['Concepto'])
+    # Lo abonado a conceptos con cargo se reparte completo: 250 de matrícula y 150 de pensión
+    assert libro['Abono'].sum() == 400
+
+
+def test_libro_vacio():
+    libro = libro_cartera.libro(pd.DataFrame(), ABONOS, HOY)
+    assert libro.empty
+    assert list(libro['Edad'].cat.categories) == list(libro_cartera.TRAMOS_EDAD)
@@ -0,0 +1,16 @@
+import pandas as pd
+
+import db_utils
+import rubros
+
+
+def test_asignar_categoria_igual_a_clasificar_cada_fila(base):
+    tabla = rubros.tabla_categorias(db_utils.load_data_rubros(base))
+    nombres = dict(zip(tabla['Cod_rubro'], tabla['Nom_rubro']))
+    cod_rubro = pd.Series([*tabla['Cod_rubro'], tabla['Cod_rubro'].iloc[0], 'NO-EXISTE', None])
+    esperado = [rubros.clasificar(nombres[c]) if c in nombres else rubros.SIN_RUBRO for c in cod_rubro]
+
+    for columna in (cod_rubro, cod_rubro.astype('category')):
+        categorias = rubros.asignar_categoria(pd.DataFrame({'Cod_rubro': columna}), tabla)
+        assert list(categorias) == esperado
+        assert categorias.categories[-1] == rubros.SIN_RUBRO
@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_cache
+import federacion
+import schema
+import snapshot
+from test_data_cache import _agregar_pagos
+
+pytest.importorskip('pyarrow')
+
+
+def _sin_sql(monkeypatch, consultas):
+    """Replaces the SQL summaries with ones that record the call instead of querying."""
+    for dataset in snapshot.DATASETS:
+        monkeypatch.setitem(snapshot.DATASETS, dataset, lambda dataset=dataset, **kwargs: consultas.append(dataset))
+
+
+@pytest.mark.parametrize('dataset', sorted(snapshot.DATASETS))
+def test_carga_completa_lee_el_snapshot(base, monkeypatch, dataset):
+    esperado = schema.tipar(snapshot.DATASETS[dataset](db_path=base))
+    snapshot.exportar_snapshot(base)
+    consultas = []
+    _sin_sql(monkeypatch, consultas)
+
+    pd.testing.assert_frame_equal(federacion._resumen(dataset, base)(), esperado)
+    assert consultas == []
+
+
+def test_snapshot_viejo_consulta_sqlite(base, monkeypatch):
+    snapshot.exportar_snapshot(base)
+    _agregar_pagos(base)
+    consultas = []
+    _sin_sql(monkeypatch, consultas)
+
+    assert snapshot.snapshot_vigente(base) is None
+    federacion._resumen('pagos_resumen', base)()
+    federacion._resumen('abonos_alumno', base)(desde_num_pago=0)
+    assert consultas == ['pagos_resumen', 'abonos_alumno']
+
+
+def test_dashboard_igual_con_y_sin_snapshot(base):
+    version = federacion.get_data_version([base])
+    data_cache.limpiar()
+    sin_snapshot = federacion.cargar(version)
+    snapshot.exportar_snapshot(base)
+    data_cache.limpiar()
+    con_snapshot = federacion.cargar(version)
+
+    for clave in ('pagos', 'cartera', 'alumnos_curso'):
+        pd.testing.assert_frame_equal(con_snapshot[clave], sin_snapshot[clave])
+
+
+def test_snapshot_tipado_sin_copias(base):
+    snapshot.exportar_snapshot(base)
+    cargos = snapshot.cargar_snapshot(base, ['cargos_alumno'])['cargos_alumno']
+
+    assert isinstance(cargos['Cod_alumno'].dtype, pd.CategoricalDtype)
+    assert cargos['Cargo'].dtype == np.int32
+    # Ya tipado: schema.tipar (lo que hace data_cache) no vuelve a copiar las columnas
+    tipado = schema.tipar(cargos)
+    assert np.shares_memory(tipado['Cargo'].to_numpy(), cargos['Cargo'].to_numpy())
+    assert np.shares_memory(tipado['Cod_alumno'].array.codes, cargos['Cod_alumno'].array.codes)